@@ -0,0 +1,70 @@
+from collections import defaultdict
+import sqlite3
+import threading
+
+import bio_networks.helpers as h
+from bio_networks.network_generator import DB_PATH, pair_participants, query_interactions, query_node_info
+
+_interactomes = dict()
+_interactomes_lock = threading.Lock()
+
+
+class Interactome:
+    """In-memory adjacency lists and node attributes of a strain's protein-protein interactions, so the neighbors of a
+    gene can be added to a network without querying PaintDB."""
+
+    def __init__(self, strain):
+        self.strain = strain
+        # Same queries as BioNetwork, over every protein-protein interaction of the strain
+        with sqlite3.connect(DB_PATH) as db_connection:
+            participants, sources = query_interactions(db_connection, strain, ['p-p'])
+            node_info = query_node_info(db_connection.cursor(), strain)
+
+        # Detection methods of each interaction (0 = not experimental, 1 = experimental, 2 = unknown detection)
+        detection_methods = defaultdict(set)
+        for interaction_id, is_experimental in zip(sources['id'], sources['experimental']):
+            detection_methods[interaction_id].add(int(is_experimental))
+
+        # Node -> list of (neighbor, interaction id, detection methods)
+        self.adjacency = defaultdict(list)
+        for interaction_id, (interactor1, interactor2, _) in pair_participants(participants).items():
+            if interactor1 == interactor2:
+                continue  # Self-loops are removed from BioNetwork networks too
+            methods = frozenset(detection_methods.get(interaction_id, ()))
+            self.adjacency[interactor1].append((interactor2, interaction_id, methods))
+            self.adjacency[interactor2].append((interactor1, interaction_id, methods))
+
+        # Same node attributes as BioNetwork networks
+        self.attributes = defaultdict(dict)
+        for protein_id, description in node_info['proteins']:
+            if protein_id in self.adjacency:
+                self.attributes[protein_id].update(h.remove_nones(dict(description=description)))
+        for interactor_id, short_name, interactor_type in node_info['short_names']:
+            if interactor_id in self.adjacency:
+                self.attributes[interactor_id].update(h.remove_nones(dict(shortName=short_name, type=interactor_type)))
+        for protein_id, localization in node_info['localization']:
+            if protein_id in self.adjacency:
+                self.attributes[protein_id]['localization'] = localization
+        for node, attributes in self.attributes.items():
+            # Genes without short names are labelled with their locus tag (see BioNetwork.add_locus_tags)
+            if attributes.get('shortName', 'NA') == 'NA':
+                attributes['shortName'] = node
+
+    def neighbors(self, node, detection_method=3):
+        """Returns the interactions of a node as (neighbor, edge attributes) pairs, using the same detection method
+        filter as BioNetwork (3 = all interactions)."""
+        return [(neighbor, dict(experimental=max(methods) if methods else None, id=interaction_id))
+                for neighbor, interaction_id, methods in self.adjacency.get(node, [])
+                if detection_method == 3 or detection_method in methods]
+
+    def node_attributes(self, node):
+        """Returns a copy of the attributes of a node."""
+        return dict(self.attributes.get(node, {'shortName': node}))
+
+
+def get_interactome(strain):
+    """Returns the (shared, read-only) interactome of a strain, loaded from PaintDB the first time it is needed."""
+    with _interactomes_lock:
+        if strain not in _interactomes:
+            _interactomes[strain] = Interactome(strain)
+        return _interactomes[strain]
@@ -9,6 +9,95 @@ import bio_networks.helpers as h
 DB_PATH = 'PaIntDB.db'
 
 
+def query_interactions(db_connection, strain, interaction_type, detection_method=3):
+    """Returns the participants of a strain's interactions of the given types (two (interactor, interaction id, type,
+    ...) rows per interaction) and a DataFrame of their sources, filtered by detection method (3 = all)."""
+    cursor = db_connection.cursor()
+    # Parameters for safe SQL querying
+    params = [strain, detection_method] + interaction_type
+    params_all = [strain] + interaction_type
+
+    if detection_method in [0, 1, 2]:
+        # Node info (lists to generate node attribute dictionaries later)
+        cursor.execute("""SELECT interactor_id, interaction.id, type, is_experimental
+                          FROM interaction_participants
+                          INNER JOIN interaction_sources
+                          USING (interaction_id)
+                          INNER JOIN interaction_source
+                          ON interaction_sources.data_source = interaction_source.id
+                          INNER JOIN interaction
+                          ON interaction_id = interaction.id
+                          WHERE strain = ?
+                          AND is_experimental = ?
+                          AND type IN (%s)""" % ', '.join('?'*len(interaction_type)), params)
+        participants = cursor.fetchall()
+
+        # Edge info (dataFrame to merge with the edge list dataFrame)
+        sources = pd.read_sql_query("""SELECT is_experimental, interaction_id
+                                       FROM interaction_source
+                                       INNER JOIN interaction_sources
+                                       ON interaction_source.id =
+                                       interaction_sources.data_source
+                                       WHERE is_experimental = ?""",
+                                    con=db_connection,
+                                    params=[detection_method])
+    # Use all interactions
+    else:
+        # Node info (lists to generate node attribute dictionaries later)
+        cursor.execute("""SELECT interactor_id, interaction_id, type
+                          FROM interaction_participants
+                          INNER JOIN interaction
+                          ON interaction_participants.interaction_id = interaction.id
+                          WHERE strain = ?
+                          AND type IN (%s)""" % ', '.join('?'*len(interaction_type)), params_all)
+        participants = cursor.fetchall()
+
+        # Edge info (dataFrames to merge with the edge list dataFrame)
+        sources = pd.read_sql_query("""SELECT is_experimental, interaction_id
+                                       FROM interaction_source
+                                       INNER JOIN interaction_sources
+                                       ON interaction_source.id =
+                                       interaction_sources.data_source""",
+                                    con=db_connection)
+
+    # Remove underscores from attribute names (don't work with GraphML)
+    sources.rename(columns={'is_experimental': 'experimental', 'interaction_id': 'id'}, inplace=True)
+    # Change sources ID's to numeric
+    sources.id = pd.to_numeric(sources.id, downcast='integer')
+    return participants, sources
+
+
+def query_node_info(cursor, strain):
+    """Returns the raw protein descriptions, short names and types, and localizations used as node attributes."""
+    node_info = dict()
+    cursor.execute("""SELECT id, product_name
+                      FROM protein
+                      WHERE strain = ?""",
+                   [strain])
+    node_info['proteins'] = cursor.fetchall()
+
+    cursor.execute('SELECT id, name, type FROM interactor')
+    node_info['short_names'] = cursor.fetchall()
+
+    cursor.execute("""SELECT protein_id, localization
+                      FROM localization
+                      INNER JOIN protein_localizations
+                      ON id = localization_id""")
+    node_info['localization'] = cursor.fetchall()
+    return node_info
+
+
+def pair_participants(interaction_participants):
+    """Returns a dictionary edge list (interaction id -> (1st interactor, 2nd interactor, interaction type)) from the
+    list of interaction participants (two rows per interaction)."""
+    interaction_edges = dict()
+    for i in range(0, len(interaction_participants), 2):
+        interaction_edges[interaction_participants[i][1]] = (interaction_participants[i][0],  # 1st interactor
+                                                             interaction_participants[i+1][0],  # 2nd interactor
+                                                             interaction_participants[i][2])  # interaction type
+    return interaction_edges
+
+
 class BioNetwork:
     """Creates NetworkX networks with additional biological attributes for use with PaintDB."""
 
@@ -33,6 +122,11 @@ class BioNetwork:
         if metabolites:
             self.mapped_metabolites = [node for node, attr in self.network.nodes(data=True) if attr['type'] == 'm']
 
+    def __getstate__(self):
+        # The raw query results are only needed to build the network, they are not pickled with it (e.g. when it is
+        # stored as a job result)
+        return dict(self.__dict__, _raw_info=dict())
+
     def query_db(self):
         """Queries PaintDB depending on the selected filters and adds the raw information to the network."""
         with sqlite3.connect(DB_PATH) as db_connection:
@@ -44,73 +138,9 @@ class BioNetwork:
             else:
                 interaction_type = ['p-p']
 
-            # Parameters for safe SQL querying
-            params = [self.strain, self.detection_method] + interaction_type
-            params_all = [self.strain] + interaction_type
-
-            if self.detection_method in [0, 1, 2]:
-                # Node info (lists to generate node attribute dictionaries later)
-                cursor.execute("""SELECT interactor_id, interaction.id, type, is_experimental
-                                  FROM interaction_participants
-                                  INNER JOIN interaction_sources
-                                  USING (interaction_id)
-                                  INNER JOIN interaction_source
-                                  ON interaction_sources.data_source = interaction_source.id
-                                  INNER JOIN interaction
-                                  ON interaction_id = interaction.id
-                                  WHERE strain = ?
-                                  AND is_experimental = ?
-                                  AND type IN (%s)""" % ', '.join('?'*len(interaction_type)), params)
-                self._raw_info['interaction_participants'] = cursor.fetchall()
-
-                # Edge info (dataFrame to merge with the edge list dataFrame)
-                self._raw_info['sources'] = pd.read_sql_query("""SELECT is_experimental, interaction_id
-                                                  FROM interaction_source 
-                                                  INNER JOIN interaction_sources
-                                                  ON interaction_source.id = 
-                                                  interaction_sources.data_source
-                                                  WHERE is_experimental = ?""",
-                                                              con=db_connection,
-                                                              params=[self.detection_method])
-            # Use all interactions
-            elif self.detection_method == 3:
-                # Node info (lists to generate node attribute dictionaries later)
-                cursor.execute("""SELECT interactor_id, interaction_id, type
-                                  FROM interaction_participants 
-                                  INNER JOIN interaction
-                                  ON interaction_participants.interaction_id = interaction.id 
-                                  WHERE strain = ?
-                                  AND type IN (%s)""" % ', '.join('?'*len(interaction_type)), params_all)
-                self._raw_info['interaction_participants'] = cursor.fetchall()
-
-                # Edge info (dataFrames to merge with the edge list dataFrame)
-                self._raw_info['sources'] = pd.read_sql_query("""SELECT is_experimental, interaction_id
-                                                                 FROM interaction_source 
-                                                                 INNER JOIN interaction_sources
-                                                                 ON interaction_source.id = 
-                                                                 interaction_sources.data_source""",
-                                                              con=db_connection)
-            cursor.execute("""SELECT id, product_name
-                              FROM protein
-                              WHERE strain = ?""",
-                           [self.strain])
-            self._raw_info['proteins'] = cursor.fetchall()
-
-            cursor.execute('SELECT id, name, type FROM interactor')
-            self._raw_info['short_names'] = cursor.fetchall()
-
-            cursor.execute("""SELECT protein_id, localization
-                              FROM localization
-                              INNER JOIN protein_localizations
-                              ON id = localization_id""")
-            self._raw_info['localization'] = cursor.fetchall()
-
-        # Remove underscores from attribute names (don't work with GraphML)
-        self._raw_info['sources'].rename(columns={'is_experimental': 'experimental', 'interaction_id': 'id'},
-                                         inplace=True)
-        # Change sources ID's to numeric
-        self._raw_info['sources'].id = pd.to_numeric(self._raw_info['sources'].id,
-                                                     downcast='integer')
+            self._raw_info['interaction_participants'], self._raw_info['sources'] = query_interactions(
+                db_connection, self.strain, interaction_type, self.detection_method)
+            self._raw_info.update(query_node_info(cursor, self.strain))
 
     def format_attribute_dictionaries(self):
         """Returns nested dictionaries of node attributes that can be added directly to a NetworkX graph."""
@@ -174,13 +204,8 @@ class BioNetwork:
         """Returns a Pandas edge list dataFrame that can be directly used to generate a network with NetworkX, and
         filters the genes of interest. Adds metabolites of interest if needed."""
         interaction_participants = self._raw_info['interaction_participants']
-        interaction_edges = dict()
+        interaction_edges = pair_participants(interaction_participants)
         interactions_of_interest = []
-        # Create a dictionary edge list from the list of interactions (two rows per interaction)
-        for i in range(0, len(interaction_participants), 2):
-            interaction_edges[interaction_participants[i][1]] = (interaction_participants[i][0],  # 1st interactor
-                                                                 interaction_participants[i+1][0],  # 2nd interactor
-                                                                 interaction_participants[i][2])  # interaction type
 
         if self.order == 0:
             # Get interaction id's if both interactors are in input
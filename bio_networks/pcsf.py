@@ -0,0 +1,165 @@
+from collections import Counter
+import copy
+import io
+import itertools
+import multiprocessing
+import os
+import threading
+
+import networkx as nx
+import numpy as np
+
+INTERACTOME_PATH = os.path.join('data', '{}_interactome.tsv')  # Interactomes with edge costs, by strain
+DEFAULT_PARAMS = {'b': 10,  # b > 1 results in more terminal nodes in sub_network
+                  'g': 0}  # g = 0 = disable degree cost correction
+# Parameter values scanned by robustness sweeps (w = cost of the edges connecting trees, more trees if larger)
+SWEEP_PARAM_GRID = {'b': [5, 10, 20],
+                    'g': [0, 3],
+                    'w': [2, 5]}
+NOISE_REPLICATES = 3  # Runs with randomly perturbed edge costs per parameter combination
+EDGE_NOISE = 0.1  # Standard deviation of the edge cost noise
+CONSENSUS_THRESHOLD = 0.5  # Minimum fraction of runs including a node to keep it in the consensus subnetwork
+
+_graphs = dict()
+_graphs_lock = threading.Lock()
+_graph_stats = {'hits': 0, 'misses': 0}
+
+
+def get_graph(strain):
+    """Returns the OmicsIntegrator Graph object for a strain's interactome, with the default PCSF parameters. Graphs
+    are parsed once and shared between requests, so they must not be modified (see _copy_graph)."""
+    from OmicsIntegrator import Graph  # Imported on first use, it is slow to import and only needed for subnetworks
+
+    with _graphs_lock:
+        if strain in _graphs:
+            _graph_stats['hits'] += 1
+        else:
+            _graph_stats['misses'] += 1
+            _graphs[strain] = Graph(INTERACTOME_PATH.format(strain), dict(DEFAULT_PARAMS))
+        return _graphs[strain]
+
+
+def _copy_graph(strain, params=None):
+    """Returns a shallow copy of a strain's parsed graph, with other PCSF parameters if given. The interactome is
+    shared with the cached graph, but prizes, parameters and costs set on the copy don't affect other requests."""
+    graph = copy.copy(get_graph(strain))
+    if params:
+        # OmicsIntegrator only takes parameters when parsing an interactome, which takes longer than solving the
+        # PCSF. Its own parameter searches reuse a parsed graph with this private method instead, which only rebinds
+        # the parameter-dependent attributes (e.g. costs) of the copy. Keep every call to it here.
+        graph._reset_hyperparameters(dict(DEFAULT_PARAMS, **params))
+    return graph
+
+
+def graph_cache_stats():
+    """Returns the number of cached graphs and the lookup counts."""
+    with _graphs_lock:
+        return dict(_graph_stats, size=len(_graphs))
+
+
+def make_prizes(network_df, queried_nodes, network_type):
+    """Returns a DataFrame of node prizes for the selected (terminal) nodes, depending on the network type."""
+    if network_type == 'gene_list':
+        # If there is no expression data, all prizes = 1
+        terminal_prizes = network_df.loc[network_df.index.isin(queried_nodes), []].assign(prize=1)
+    elif network_type == 'rna_seq' or network_type == 'combined':
+        # Set prizes to expression values
+        terminal_prizes = network_df.loc[network_df.index.isin(queried_nodes), ['log2FoldChange']]
+        # The bigger the fold change, the bigger the prize
+        terminal_prizes.log2FoldChange = abs(terminal_prizes.log2FoldChange)
+        terminal_prizes = terminal_prizes.rename(columns={'log2FoldChange': 'prize'})
+        if network_type == 'combined':
+            # Set TnSeq prizes to the max prize
+            terminal_prizes.loc[network_df['significanceSource'] == 'TnSeq', :] = terminal_prizes['prize'].max()
+    return terminal_prizes
+
+
+def run_pcsf(strain, prizes, params=None):
+    """Runs the prize-collecting Steiner forest (PCSF) algorithm with the given node prizes and returns the forest and
+    the augmented forest (including all interactome edges between forest nodes) as NetworkX graphs."""
+    graph = _copy_graph(strain, params)
+    # Prizes are passed in memory, in the tab-separated format read by OmicsIntegrator
+    graph.prepare_prizes(io.StringIO(prizes.to_csv(sep='\t')))
+    vertex_indices, edge_indices = graph.pcsf()
+    return graph.output_forest_as_networkx(vertex_indices, edge_indices)
+
+
+def _pool_context():
+    """Returns the multiprocessing context of sweep pools. Pools are forked when possible, so that their processes
+    share the interactome already parsed by this process (e.g. preloaded by a dash_app.processes worker). Processes
+    running other threads can't be forked safely, since the copy could inherit locks held by those threads: their
+    pools are started by a forkserver, and each pool process parses the interactome again."""
+    methods = multiprocessing.get_all_start_methods()
+    if 'fork' in methods and threading.active_count() == 1:
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def _sweep_run(run):
+    """Runs a single PCSF solve of a parameter sweep, with randomly perturbed edge costs if noise > 0. Returns the
+    forest nodes (with their attributes) and edges and the augmented forest edges."""
+    strain, prizes_tsv, params, noise, seed = run
+    graph = _copy_graph(strain, params)
+    graph.prepare_prizes(io.StringIO(prizes_tsv))
+    if noise > 0:
+        graph.costs = np.clip(np.random.default_rng(seed).normal(graph.costs, noise), 0.0001, None)
+    vertex_indices, edge_indices = graph.pcsf()
+    forest, augmented_forest = graph.output_forest_as_networkx(vertex_indices, edge_indices)
+    return list(forest.nodes(data=True)), list(forest.edges), list(augmented_forest.edges)
+
+
+def run_sweep(strain, prizes, param_grid=None, noise_replicates=NOISE_REPLICATES, noise=EDGE_NOISE,
+              threshold=CONSENSUS_THRESHOLD, processes=None, progress=None):
+    """Runs PCSF for every combination of parameters in the grid, each with several randomized edge noise
+    replicates, in a pool of `processes` processes (one per CPU by default). Returns a consensus forest and augmented
+    forest with the nodes and edges found in at least `threshold` of the runs, with their frequency (fraction of runs)
+    as an attribute. `progress` is called with the number of finished and total runs. If it raises an exception, the
+    pool is terminated and the exception is raised right away. Sweeps are meant to run in a worker process (see
+    dash_app.processes), which can be stopped with its pool."""
+    param_grid = param_grid or SWEEP_PARAM_GRID
+    names = sorted(param_grid)
+    prizes_tsv = prizes.to_csv(sep='\t')
+    runs = [(strain, prizes_tsv, dict(zip(names, values)), noise if replicate else 0, replicate)
+            for values in itertools.product(*(param_grid[name] for name in names))
+            for replicate in range(noise_replicates + 1)]  # Replicate 0 uses the unperturbed edge costs
+
+    node_counts, edge_counts, augmented_edge_counts = Counter(), Counter(), Counter()
+    node_attributes = dict()
+    get_graph(strain)  # Parsed before the pool processes are forked, so they share it
+    with _pool_context().Pool(processes) as pool:  # Terminated when leaving the block, even on errors
+        for finished, (nodes, edges, augmented_edges) in enumerate(pool.imap_unordered(_sweep_run, runs), 1):
+            for node, attributes in nodes:
+                node_attributes.setdefault(node, attributes)
+            node_counts.update(node for node, _ in nodes)
+            edge_counts.update(tuple(sorted(edge)) for edge in edges)
+            augmented_edge_counts.update(tuple(sorted(edge)) for edge in augmented_edges)
+            if progress is not None:
+                progress(finished, len(runs))
+
+    node_frequencies = {node: count / len(runs) for node, count in node_counts.items()
+                        if count / len(runs) >= threshold}
+    consensus = nx.Graph()
+    consensus.add_nodes_from((node, node_attributes[node]) for node in node_frequencies)
+    consensus.add_edges_from((u, v, dict(frequency=count / len(runs))) for (u, v), count in edge_counts.items()
+                             if u in node_frequencies and v in node_frequencies)
+    # Edges only found in augmented forests are weighted by the fraction of runs whose augmented forest includes them
+    augmented_consensus = consensus.copy()
+    augmented_consensus.add_edges_from((u, v, dict(frequency=count / len(runs)))
+                                       for (u, v), count in augmented_edge_counts.items()
+                                       if u in node_frequencies and v in node_frequencies
+                                       and not consensus.has_edge(u, v))
+    for graph in (consensus, augmented_consensus):
+        nx.set_node_attributes(graph, node_frequencies, 'frequency')
+        graph.remove_nodes_from(list(nx.isolates(graph)))
+    return consensus, augmented_consensus
+
+
+def find_subnetwork(job, strain, prizes, robust):
+    """Background job (see dash_app.jobs) running PCSF with the user-selected nodes as terminals. Robust subnetworks
+    are the consensus of a parameter sweep, with node/edge frequencies used for styling. PCSF runs in a worker
+    process, which starts with the parsed interactome and is stopped if the job is cancelled."""
+    if robust:
+        return job.run_in_process(run_sweep, strain, prizes, progress=lambda finished, total: job.report(
+            'Running PCSF parameter sweep ({}/{})'.format(finished, total), finished / total))
+    job.report('Running PCSF', 0.2)
+    return job.run_in_process(run_pcsf, strain, prizes)
@@ -0,0 +1,292 @@
+"""REST API for scripts, served under /api/v1:
+
+    POST /api/v1/networks                                   Builds a network from a gene list
+    GET  /api/v1/networks/<network_id>                      Returns a built network
+    POST /api/v1/networks/<network_id>/enrichment           Runs the GO term enrichment of a network
+    GET  /api/v1/networks/<network_id>/enrichment/<job_id>  Returns the overrepresented terms
+    POST /api/v1/networks/<network_id>/subnetwork           Computes the PCSF subnetwork of selected genes
+    GET  /api/v1/networks/<network_id>/subnetwork/<job_id>  Returns the subnetwork
+
+Computations run in the background job queue, so requests never wait for them: POST requests answer 202 (Accepted)
+with the job status, a Location header giving the URL of the result and a Retry-After header. Result URLs answer the
+same way until the job is done, then stream the results as NDJSON (one JSON object per line). Networks can also be
+streamed as Parquet (?format=parquet, edge or node table with ?table=edges|nodes), one row group at a time.
+
+API jobs run in their own queue, so scripts never hold up the app's users, and at most MAX_ACTIVE_JOBS of them can be
+queued or running at once (429 errors past that). Network ids are the ids of the build jobs, whose results are kept for
+API_JOB_TTL seconds after they are computed: done jobs report the seconds left in their "expires_in" field. Expired
+networks have to be built again (410 errors).
+"""
+from flask import Blueprint, jsonify, request, Response, url_for
+import networkx as nx
+import pandas as pd
+
+from bio_networks.network_generator import BioNetwork, DENetwork, CombinedNetwork
+import bio_networks.pcsf as pcsf
+from dash_app import exports
+from dash_app.app import server
+from dash_app.jobs import DONE, EXPIRED, FINISHED, JobQueue, POLL_INTERVAL
+from dash_app.metrics import observe_job, observe_network
+from go_enrichment.go_enrichment import enrich_network
+
+STRAINS = ('PAO1', 'PA14')
+ORDERS = (0, 1)
+DETECTION_METHODS = (0, 1, 2, 3)  # 0 = not experimental, 1 = experimental, 2 = unknown detection, 3 = all
+NDJSON_MIMETYPE = 'application/x-ndjson'
+MAX_GENES = 2000  # Genes of interest per network
+API_JOB_WORKERS = 2
+API_JOB_TTL = 60 * 60  # API results are kept for an hour (in seconds)
+MAX_ACTIVE_JOBS = 16
+RETRY_AFTER = max(1, POLL_INTERVAL // 1000)  # Seconds clients should wait before polling unfinished jobs again
+
+# Background jobs of API requests, in their own queue of the job database
+job_queue = JobQueue('api', max_workers=API_JOB_WORKERS, ttl=API_JOB_TTL)
+job_queue.listeners.append(observe_job)
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+class ApiError(Exception):
+    """Invalid API request, returned as a JSON error message."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class JobPending(Exception):
+    """Result of an unfinished job, returned as the job status with a 202 (Accepted) code."""
+
+    def __init__(self, status, location):
+        super().__init__(status['status'])
+        self.status = status
+        self.location = location
+
+
+@api.errorhandler(ApiError)
+def api_error(error):
+    return jsonify({'error': error.message}), error.status
+
+
+@api.errorhandler(JobPending)
+def job_pending(pending):
+    return _accepted(pending.status, pending.location)
+
+
+def _accepted(status, location):
+    """Returns the status of an unfinished job, with the URL of its result."""
+    response = jsonify(status)
+    response.status_code = 202
+    response.headers['Location'] = location
+    response.headers['Retry-After'] = str(RETRY_AFTER)
+    return response
+
+
+def _parameter(body, name, default, choices):
+    value = body.get(name, default)
+    if value not in choices:
+        raise ApiError('"{}" must be one of {}.'.format(name, ', '.join(str(choice) for choice in choices)))
+    return value
+
+
+def _gene_list(body, name, required=True):
+    genes = body.get(name)
+    if genes is None and not required:
+        return None
+    if not isinstance(genes, list) or not genes or not all(isinstance(gene, str) for gene in genes):
+        raise ApiError('"{}" must be a non-empty list of locus tags.'.format(name))
+    return genes
+
+
+def build_api_network(job, genes, strain, order, detection_method, metabolites, de_genes, tnseq_genes):
+    """Background job building a network from an API request."""
+    job.report('Querying PaIntDB and building network', 0.1)
+    if de_genes is None:
+        bio_network = BioNetwork(gene_list=genes, strain=strain, order=order, detection_method=detection_method,
+                                 metabolites=metabolites)
+    elif tnseq_genes is None:
+        bio_network = DENetwork(gene_list=genes, de_genes_df=de_genes, strain=strain, order=order,
+                                detection_method=detection_method, metabolites=metabolites)
+    else:
+        bio_network = CombinedNetwork(gene_list=genes, de_genes_df=de_genes, tnseq_gene_list=tnseq_genes,
+                                      strain=strain, order=order, detection_method=detection_method,
+                                      metabolites=metabolites)
+    observe_network('network', bio_network.network)
+    return bio_network
+
+
+def _ndjson(record):
+    return exports.to_json(record) + '\n'
+
+
+def _submit(key, function, *args, description=''):
+    """Queues an API job, unless too many are already queued or running."""
+    if job_queue.active() >= MAX_ACTIVE_JOBS:
+        raise ApiError('Too many API jobs are running, please try again later.', 429)
+    return job_queue.submit(key, function, *args, description=description)
+
+
+def network_records(network):
+    """Yields the nodes and edges of a network as NDJSON lines, in chunks."""
+    yield from exports.join_chunks(network.nodes(data=True), lambda node: _ndjson(
+        dict(node[1], type='node', id=node[0])))
+    yield from exports.join_chunks(network.edges(data=True), lambda edge: _ndjson(
+        dict(edge[2], type='edge', source=edge[0], target=edge[1])))
+
+
+def _job_result(job_id, location, result_type):
+    """Returns the result of a done job. Raises JobPending while the job is queued or running, a 404 error if the job
+    is unknown (or computes something else than `result_type`), a 410 error if its result expired and a 500 error if
+    it failed."""
+    status = job_queue.status(job_id)
+    if status is None:
+        raise ApiError('Unknown job.', 404)
+    if status['status'] not in FINISHED:
+        raise JobPending(status, location)
+    if status['status'] == EXPIRED:
+        raise ApiError('The result expired, please submit the request again.', 410)
+    if status['status'] != DONE:
+        raise ApiError(status['error'] or 'The job was {}.'.format(status['status']), 500)
+    result = job_queue.result(job_id)
+    if not isinstance(result, result_type):
+        raise ApiError('Unknown job.', 404)
+    return result
+
+
+def _network_response(network, summary=None):
+    """Streams a network as NDJSON, preceded by an optional summary line, or as Parquet."""
+    file_format = request.args.get('format', 'ndjson')
+    if file_format == 'parquet':
+        if not exports.PARQUET_AVAILABLE:
+            raise ApiError('Parquet responses require pyarrow on the server.', 501)
+        table = request.args.get('table', 'edges')
+        if table not in ('edges', 'nodes'):
+            raise ApiError('"table" must be edges or nodes.')
+        return Response(exports.parquet_chunks(exports.node_table(network) if table == 'nodes'
+                                               else nx.to_pandas_edgelist(network)),
+                        mimetype='application/octet-stream')
+    if file_format != 'ndjson':
+        raise ApiError('"format" must be ndjson or parquet.')
+
+    def ndjson_chunks():
+        if summary is not None:
+            yield _ndjson(dict(summary, type='summary'))
+        yield from network_records(network)
+    return Response(ndjson_chunks(), mimetype=NDJSON_MIMETYPE)
+
+
+def _network_summary(bio_network):
+    return {'strain': bio_network.strain, 'network_type': bio_network.network_type,
+            'nodes': bio_network.network.number_of_nodes(), 'edges': bio_network.network.number_of_edges(),
+            'genes': len(bio_network.genes_of_interest), 'mapped_genes': len(bio_network.mapped_genes)}
+
+
+def _get_network(network_id):
+    """Returns a built network. Raises a 409 error while it is being built, and a 404 error if it was never built,
+    failed or expired."""
+    try:
+        return _job_result(network_id, url_for('api.get_network', network_id=network_id), BioNetwork)
+    except JobPending:
+        raise ApiError('The network is still being built.', 409)
+    except ApiError as error:
+        if error.status == 500:  # The build failed
+            raise
+        raise ApiError('Unknown or expired network, build it again.', 404)
+
+
+@api.route('/networks', methods=['POST'])
+def build_network():
+    """Builds a network. JSON body: genes (list of locus tags), strain (PAO1 or PA14), order (0 or 1),
+    detection_method (0-3, default 3 = all), metabolites (boolean), optional de_genes (records with gene,
+    log2FoldChange and padj, for DE networks) and tnseq_genes (list, for combined networks)."""
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        raise ApiError('The request body must be a JSON object.')
+    strain = _parameter(body, 'strain', 'PAO1', STRAINS)
+    order = _parameter(body, 'order', 0, ORDERS)
+    detection_method = _parameter(body, 'detection_method', 3, DETECTION_METHODS)
+    metabolites = bool(body.get('metabolites', False))
+    de_genes = body.get('de_genes')
+    if de_genes is not None:
+        try:
+            de_genes = pd.DataFrame.from_records(de_genes, columns=['gene', 'log2FoldChange', 'padj'])
+        except (TypeError, ValueError):
+            raise ApiError('"de_genes" must be a list of records with gene, log2FoldChange and padj.')
+        genes = de_genes['gene'].tolist()
+    else:
+        genes = _gene_list(body, 'genes')
+    tnseq_genes = _gene_list(body, 'tnseq_genes', required=False)
+    if tnseq_genes is not None and de_genes is None:
+        raise ApiError('Combined networks need both "de_genes" and "tnseq_genes".')
+    if len(set(genes).union(tnseq_genes or [])) > MAX_GENES:
+        raise ApiError('Networks are limited to {} genes.'.format(MAX_GENES), 413)
+
+    key = ('api-network', tuple(genes), strain, order, detection_method, metabolites,
+           None if de_genes is None else de_genes.to_json(), None if tnseq_genes is None else tuple(tnseq_genes))
+    job_id = _submit(key, build_api_network, genes, strain, order, detection_method, metabolites, de_genes,
+                     tnseq_genes, description='API network build')
+    return _accepted(job_queue.status(job_id), url_for('api.get_network', network_id=job_id))
+
+
+@api.route('/networks/<network_id>', methods=['GET'])
+def get_network(network_id):
+    """Streams a built network (202 while it is being built)."""
+    bio_network = _job_result(network_id, url_for('api.get_network', network_id=network_id), BioNetwork)
+    return _network_response(bio_network.network, _network_summary(bio_network))
+
+
+@api.route('/networks/<network_id>/enrichment', methods=['POST'])
+def run_enrichment(network_id):
+    """Runs the GO term enrichment of the genes of interest (genes=all, default) or of the network genes
+    (genes=network)."""
+    bio_network = _get_network(network_id)
+    body = request.get_json(silent=True) or dict()
+    gene_list = _parameter(body, 'genes', 'all', ('all', 'network'))
+    enrichment_genes = bio_network.genes_of_interest if gene_list == 'all' else bio_network.network.nodes
+    job_id = _submit(('api-enrichment', network_id, gene_list), enrich_network, bio_network.strain,
+                     list(enrichment_genes), list(bio_network.network.nodes), description='API GO term enrichment')
+    return _accepted(job_queue.status(job_id), url_for('api.get_enrichment', network_id=network_id, job_id=job_id))
+
+
+@api.route('/networks/<network_id>/enrichment/<job_id>', methods=['GET'])
+def get_enrichment(network_id, job_id):
+    """Streams the overrepresented terms of an enrichment as NDJSON (202 while it runs)."""
+    enrichment_results = _job_result(job_id, url_for('api.get_enrichment', network_id=network_id, job_id=job_id),
+                                     pd.DataFrame)
+    records = enrichment_results.drop(columns='node_indices').to_dict('records')
+    return Response(exports.join_chunks(records, lambda record: _ndjson(dict(record, type='term'))),
+                    mimetype=NDJSON_MIMETYPE)
+
+
+@api.route('/networks/<network_id>/subnetwork', methods=['POST'])
+def compute_subnetwork(network_id):
+    """Computes the PCSF subnetwork connecting selected genes of a network. JSON body: genes (terminal genes),
+    robust (boolean, consensus of a parameter sweep) and low_confidence (boolean, include the edges between the
+    subnetwork genes that are not in the PCSF forest, also a parameter of the result URL)."""
+    bio_network = _get_network(network_id)
+    body = request.get_json(silent=True) or dict()
+    terminals = [gene for gene in _gene_list(body, 'genes') if gene in bio_network.network]
+    if not terminals:
+        raise ApiError('None of the genes are in the network.')
+    robust = bool(body.get('robust', False))
+    low_confidence = bool(body.get('low_confidence', False))
+    prizes = pcsf.make_prizes(bio_network.network_df, terminals, bio_network.network_type)
+    job_id = _submit(('api-pcsf', network_id, tuple(sorted(terminals)), robust), pcsf.find_subnetwork,
+                     bio_network.strain, prizes, robust, description='API sub-network')
+    return _accepted(job_queue.status(job_id), url_for('api.get_subnetwork', network_id=network_id, job_id=job_id,
+                                                       low_confidence=int(low_confidence)))
+
+
+@api.route('/networks/<network_id>/subnetwork/<job_id>', methods=['GET'])
+def get_subnetwork(network_id, job_id):
+    """Streams a subnetwork (202 while it is computed), with the low confidence edges if low_confidence=1."""
+    low_confidence = request.args.get('low_confidence', '0') in ('1', 'true')
+    forest, augmented_forest = _job_result(job_id, url_for('api.get_subnetwork', network_id=network_id,
+                                                           job_id=job_id, low_confidence=int(low_confidence)), tuple)
+    sub_network = augmented_forest if low_confidence else forest
+    observe_network('subnetwork', sub_network)
+    return _network_response(sub_network)
+
+
+server.register_blueprint(api)
@@ -1,6 +1,15 @@
 import dash
 import dash_bootstrap_components as dbc
 
+from dash_app.jobs import JobQueue
+from dash_app.session_store import SessionStore
+
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], suppress_callback_exceptions=True,
                 title='PaIntDB', update_title='Loading...')
 server = app.server
+
+# Server-side storage for networks, DataFrames and Cytoscape elements shared across callbacks and pages
+session_store = SessionStore()
+
+# Background executor for long computations, polled by the callbacks that submit them
+job_queue = JobQueue()
@@ -0,0 +1,53 @@
+// Clientside callbacks of the vis page, run in the browser without a server round-trip.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    vis: {
+        // Swaps the network stylesheet and legend for the selected color mapping, adding node labels if selected.
+        change_stylesheet: function (colorMap, showLabels, legendUrls) {
+            var stylesheets = window.PAINTDB_STYLESHEETS;
+            var stylesheet = stylesheets.fold_change;
+            var legend = legendUrls.regulation;
+            if (colorMap === 'experiment') {
+                stylesheet = stylesheets.combined;
+                legend = legendUrls.experiment;
+            }
+            if (showLabels && showLabels.length) {
+                stylesheet = stylesheet.concat(stylesheets.labels);
+            }
+            return [stylesheet, legend];
+        },
+
+        // Sets the selected flag of the nodes in the selected ids. Uses the new elements sent by the server if the
+        // displayed graph changed, the current elements otherwise. Unchanged nodes are reused as is. Elements of
+        // expanded neighborhoods are appended to the current elements, and the nodes they connect to are updated.
+        apply_selection: function (networkElements, selectedIds, addedElements, currentElements) {
+            var triggered = dash_clientside.callback_context.triggered.map(function (trigger) {
+                return trigger.prop_id;
+            });
+            var elements = currentElements;
+            if (networkElements && triggered.indexOf('network-elements.data') !== -1) {
+                elements = networkElements;
+            }
+            if (!elements) {
+                return dash_clientside.no_update;
+            }
+            if (addedElements && triggered.indexOf('added-elements.data') !== -1) {
+                // Nodes connected to the new ones get their new data (e.g. degree)
+                var updated = {};
+                (addedElements.updated || []).forEach(function (node) {
+                    updated[node.data.id] = node.data;
+                });
+                elements = {nodes: elements.nodes.map(function (node) {
+                                return updated[node.data.id] ? Object.assign({}, node, {data: updated[node.data.id]})
+                                                             : node;
+                            }).concat(addedElements.nodes),
+                            edges: elements.edges.concat(addedElements.edges)};
+            }
+            var selected = new Set(selectedIds || []);
+            var nodes = elements.nodes.map(function (node) {
+                var isSelected = selected.has(node.data.id);
+                return node.selected === isSelected ? node : Object.assign({}, node, {selected: isSelected});
+            });
+            return {nodes: nodes, edges: elements.edges};
+        }
+    }
+});
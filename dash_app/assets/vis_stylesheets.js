@@ -0,0 +1,224 @@
+// Generated by `python -m dash_app.vis_stylesheets` from vis_stylesheets.py, do not edit.
+window.PAINTDB_STYLESHEETS = {
+  "default": [
+    {
+      "selector": "node",
+      "style": {
+        "border-width": 1,
+        "border-color": "black",
+        "width": "mapData(degree, 1, 15, 10, 30)",
+        "height": "mapData(degree, 1, 15, 10, 30)",
+        "padding": "10%",
+        "font-size": 22
+      }
+    },
+    {
+      "selector": "node[frequency]",
+      "style": {
+        "opacity": "mapData(frequency, 0, 1, 0.3, 1)"
+      }
+    },
+    {
+      "selector": ":selected",
+      "style": {
+        "border-width": 4,
+        "label": "data(label)",
+        "border-color": "black",
+        "border-opacity": 1,
+        "opacity": 1,
+        "font-weight": "bold",
+        "z-index": 9999
+      }
+    },
+    {
+      "selector": "edge",
+      "style": {
+        "width": "2"
+      }
+    },
+    {
+      "selector": "edge[frequency]",
+      "style": {
+        "width": "mapData(frequency, 0, 1, 1, 5)"
+      }
+    },
+    {
+      "selector": ".supernode",
+      "style": {
+        "width": "mapData(size, 1, 500, 30, 150)",
+        "height": "mapData(size, 1, 500, 30, 150)",
+        "background-color": "#c2c2c2",
+        "label": "data(label)",
+        "text-valign": "center"
+      }
+    },
+    {
+      "selector": "edge[weight]",
+      "style": {
+        "width": "mapData(weight, 1, 50, 1, 10)"
+      }
+    }
+  ],
+  "fold_change": [
+    {
+      "selector": "node",
+      "style": {
+        "border-width": 1,
+        "border-color": "black",
+        "width": "mapData(degree, 1, 15, 10, 30)",
+        "height": "mapData(degree, 1, 15, 10, 30)",
+        "padding": "10%",
+        "font-size": 22
+      }
+    },
+    {
+      "selector": "node[frequency]",
+      "style": {
+        "opacity": "mapData(frequency, 0, 1, 0.3, 1)"
+      }
+    },
+    {
+      "selector": ":selected",
+      "style": {
+        "border-width": 4,
+        "label": "data(label)",
+        "border-color": "black",
+        "border-opacity": 1,
+        "opacity": 1,
+        "font-weight": "bold",
+        "z-index": 9999
+      }
+    },
+    {
+      "selector": "edge",
+      "style": {
+        "width": "2"
+      }
+    },
+    {
+      "selector": "edge[frequency]",
+      "style": {
+        "width": "mapData(frequency, 0, 1, 1, 5)"
+      }
+    },
+    {
+      "selector": ".supernode",
+      "style": {
+        "width": "mapData(size, 1, 500, 30, 150)",
+        "height": "mapData(size, 1, 500, 30, 150)",
+        "background-color": "#c2c2c2",
+        "label": "data(label)",
+        "text-valign": "center"
+      }
+    },
+    {
+      "selector": "edge[weight]",
+      "style": {
+        "width": "mapData(weight, 1, 50, 1, 10)"
+      }
+    },
+    {
+      "selector": "[significanceSource = \"TnSeq\"]",
+      "style": {
+        "background-color": "#a6a6a6"
+      }
+    },
+    {
+      "selector": "[log2FoldChange < 0]",
+      "style": {
+        "background-color": "#0037ff"
+      }
+    },
+    {
+      "selector": "[log2FoldChange > 0]",
+      "style": {
+        "background-color": "#ff0000"
+      }
+    }
+  ],
+  "combined": [
+    {
+      "selector": "node",
+      "style": {
+        "border-width": 1,
+        "border-color": "black",
+        "width": "mapData(degree, 1, 15, 10, 30)",
+        "height": "mapData(degree, 1, 15, 10, 30)",
+        "padding": "10%",
+        "font-size": 22
+      }
+    },
+    {
+      "selector": "node[frequency]",
+      "style": {
+        "opacity": "mapData(frequency, 0, 1, 0.3, 1)"
+      }
+    },
+    {
+      "selector": ":selected",
+      "style": {
+        "border-width": 4,
+        "label": "data(label)",
+        "border-color": "black",
+        "border-opacity": 1,
+        "opacity": 1,
+        "font-weight": "bold",
+        "z-index": 9999
+      }
+    },
+    {
+      "selector": "edge",
+      "style": {
+        "width": "2"
+      }
+    },
+    {
+      "selector": "edge[frequency]",
+      "style": {
+        "width": "mapData(frequency, 0, 1, 1, 5)"
+      }
+    },
+    {
+      "selector": ".supernode",
+      "style": {
+        "width": "mapData(size, 1, 500, 30, 150)",
+        "height": "mapData(size, 1, 500, 30, 150)",
+        "background-color": "#c2c2c2",
+        "label": "data(label)",
+        "text-valign": "center"
+      }
+    },
+    {
+      "selector": "edge[weight]",
+      "style": {
+        "width": "mapData(weight, 1, 50, 1, 10)"
+      }
+    },
+    {
+      "selector": "[significanceSource = \"RNASeq\"]",
+      "style": {
+        "background-color": "#26e81c"
+      }
+    },
+    {
+      "selector": "[significanceSource = \"TnSeq\"]",
+      "style": {
+        "background-color": "#ff931f"
+      }
+    },
+    {
+      "selector": "[significanceSource = \"both\"]",
+      "style": {
+        "background-color": "#a01cff"
+      }
+    }
+  ],
+  "labels": [
+    {
+      "selector": "node",
+      "style": {
+        "label": "data(label)"
+      }
+    }
+  ]
+};
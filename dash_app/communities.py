@@ -0,0 +1,78 @@
+from collections import Counter, defaultdict
+
+LARGE_NETWORK_NODES = 1000  # Networks with more nodes are shown as communities
+MAX_EXPANDED_NODES = 500  # The first expanded communities are collapsed again past this number of expanded nodes
+SUPERNODE_PREFIX = 'community:'
+
+
+class CommunityView:
+    """Level-of-detail view of a large network: Louvain communities are shown as supernodes (sized by their number of
+    genes) joined by aggregated edges, and only the communities expanded by the user show their genes. The number of
+    elements sent to the browser is bounded by the number of communities and MAX_EXPANDED_NODES."""
+
+    def __init__(self, network, cyto_network, seed=0):
+        import community as community_louvain  # python-louvain, only imported once a large network is shown
+
+        self.partition = community_louvain.best_partition(network, random_state=seed)
+        self.members = defaultdict(list)
+        for node, community in self.partition.items():
+            self.members[community].append(node)
+        self.node_elements = {node['data']['id']: node for node in cyto_network['nodes']}
+        self.edge_elements = cyto_network['edges']
+
+        # Supernodes are placed at the center of their genes in the full network layout
+        self.supernodes = dict()
+        for community, members in self.members.items():
+            positions = [self.node_elements[node]['position'] for node in members]
+            self.supernodes[community] = {
+                'data': {'id': SUPERNODE_PREFIX + str(community),
+                         'label': '{} genes'.format(len(members)),
+                         'community': community,
+                         'size': len(members)},
+                'position': {'x': sum(position['x'] for position in positions) / len(positions),
+                             'y': sum(position['y'] for position in positions) / len(positions)},
+                'classes': 'supernode'
+            }
+
+    def _unit(self, node, expanded):
+        """Returns the id of the displayed element standing for a node."""
+        community = self.partition[node]
+        return node if community in expanded else SUPERNODE_PREFIX + str(community)
+
+    def elements(self, expanded=()):
+        """Returns the Cytoscape elements with the given communities expanded."""
+        expanded = set(expanded)
+        nodes = []
+        for community in sorted(self.members):
+            if community in expanded:
+                nodes.extend(self.node_elements[node] for node in self.members[community])
+            else:
+                nodes.append(self.supernodes[community])
+
+        edges = []
+        aggregated_edges = Counter()
+        for edge in self.edge_elements:
+            source = self._unit(edge['data']['source'], expanded)
+            target = self._unit(edge['data']['target'], expanded)
+            if source == edge['data']['source'] and target == edge['data']['target']:
+                edges.append(edge)
+            elif source != target:  # Edges inside collapsed communities are hidden
+                aggregated_edges[tuple(sorted((source, target)))] += 1
+        edges.extend({'data': {'id': '{}-{}'.format(source, target), 'source': source, 'target': target,
+                               'weight': weight}}
+                     for (source, target), weight in aggregated_edges.items())
+        return {'nodes': nodes, 'edges': edges}
+
+    def selected_ids(self, node_ids, expanded=()):
+        """Returns the displayed element ids standing for the selected nodes (their supernode if collapsed)."""
+        expanded = set(expanded)
+        return sorted({self._unit(node, expanded) for node in node_ids if node in self.partition})
+
+    def expand(self, expanded, community):
+        """Returns the expanded communities after expanding one, collapsing the first expanded communities if the
+        number of expanded genes exceeds MAX_EXPANDED_NODES."""
+        expanded = [expanded_community for expanded_community in expanded if expanded_community != community]
+        expanded.append(community)
+        while len(expanded) > 1 and sum(len(self.members[c]) for c in expanded) > MAX_EXPANDED_NODES:
+            expanded.pop(0)
+        return expanded
@@ -0,0 +1,258 @@
+import importlib.util
+import json
+import math
+from urllib.parse import urlencode
+from xml.sax.saxutils import escape, quoteattr
+import zlib
+
+from flask import abort, request, Response
+import networkx as nx
+import numpy as np
+import pandas as pd
+from werkzeug.utils import secure_filename
+
+from dash_app.app import app, server, session_store
+
+# Parquet downloads are only offered if pyarrow is installed. It is imported on the first Parquet download.
+PARQUET_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+CHUNK_ROWS = 1000  # Nodes, edges or table rows written per streamed chunk
+GZIP_LEVEL = 6
+
+# Downloadable session objects and their formats (extension -> MIME type)
+NETWORK_FORMATS = {'graphml': 'application/xml',
+                   'tsv': 'text/tab-separated-values',  # Edge list
+                   'cyjs': 'application/json',  # Cytoscape JSON
+                   'parquet': 'application/octet-stream'}  # Node table
+TABLE_FORMATS = {'csv': 'text/csv',
+                 'parquet': 'application/octet-stream'}
+DOWNLOADS = {'network': ('displayed_network', NETWORK_FORMATS),
+             'table': ('filtered_node_details', TABLE_FORMATS),
+             'enrichment': ('enrichment_results', TABLE_FORMATS)}
+
+
+def _graphml_type(value):
+    """Returns the GraphML type of an attribute value."""
+    if isinstance(value, (bool, np.bool_)):
+        return 'boolean'
+    if isinstance(value, (int, np.integer)):
+        return 'int'
+    if isinstance(value, (float, np.floating)):
+        return 'double'
+    return 'string'
+
+
+def _graphml_key_type(types):
+    """Returns the GraphML type of an attribute from the types of all its values. Integers and floats are written as
+    doubles, other mixed types as strings."""
+    if len(types) == 1:
+        return next(iter(types))
+    return 'double' if types == {'int', 'double'} else 'string'
+
+
+def _graphml_value(value):
+    return str(value).lower() if isinstance(value, (bool, np.bool_)) else escape(str(value))
+
+
+def join_chunks(items, to_text):
+    """Joins items converted to text into chunks of CHUNK_ROWS items."""
+    chunk = []
+    for item in items:
+        chunk.append(to_text(item))
+        if len(chunk) == CHUNK_ROWS:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def graphml_chunks(network):
+    """Writes a network as GraphML, element by element instead of building the whole XML document in memory."""
+    # Attribute keys need to be declared before the nodes and edges that use them
+    types = dict()  # (name, scope) -> GraphML types of the values
+    for scope, attributes in (('node', (data for _, data in network.nodes(data=True))),
+                              ('edge', (data for _, _, data in network.edges(data=True)))):
+        for data in attributes:
+            for name, value in data.items():
+                if value is not None:
+                    types.setdefault((name, scope), set()).add(_graphml_type(value))
+    keys = {name_scope: ('d{}'.format(i), _graphml_key_type(key_types))
+            for i, (name_scope, key_types) in enumerate(types.items())}
+
+    yield ('<?xml version="1.0" encoding="utf-8"?>\n'
+           '<graphml xmlns="http://graphml.graphdrawing.org/xmlns" '
+           'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+           'xsi:schemaLocation="http://graphml.graphdrawing.org/xmlns '
+           'http://graphml.graphdrawing.org/xmlns/1.0/graphml.xsd">\n')
+    for (name, scope), (key_id, key_type) in keys.items():
+        yield '  <key id="{}" for="{}" attr.name={} attr.type="{}" />\n'.format(key_id, scope, quoteattr(name),
+                                                                              key_type)
+    yield '  <graph edgedefault="{}">\n'.format('directed' if network.is_directed() else 'undirected')
+
+    def data_elements(data, scope):
+        return ''.join('      <data key="{}">{}</data>\n'.format(keys[(name, scope)][0], _graphml_value(value))
+                       for name, value in data.items() if value is not None)
+
+    yield from join_chunks(network.nodes(data=True), lambda node: '    <node id={}>\n{}    </node>\n'.format(
+        quoteattr(str(node[0])), data_elements(node[1], 'node')))
+    yield from join_chunks(network.edges(data=True), lambda edge: (
+        '    <edge source={} target={}>\n{}    </edge>\n'.format(quoteattr(str(edge[0])), quoteattr(str(edge[1])),
+                                                            data_elements(edge[2], 'edge'))))
+    yield '  </graph>\n</graphml>\n'
+
+
+def edge_list_chunks(network):
+    """Writes the edges of a network as a tab-separated edge list, with a column per edge attribute."""
+    attributes = sorted({name for _, _, data in network.edges(data=True) for name in data})
+    yield '\t'.join(['source', 'target'] + attributes) + '\n'
+    yield from join_chunks(network.edges(data=True), lambda edge: '\t'.join(
+        [str(edge[0]), str(edge[1])] + ['' if edge[2].get(name) is None else str(edge[2][name])
+                                        for name in attributes]) + '\n')
+
+
+def json_default(value):
+    """Converts the NumPy values found in node attributes to JSON."""
+    return value.item() if isinstance(value, np.generic) else str(value)
+
+
+def _finite(value):
+    """Replaces NaN and infinite floats (e.g. missing fold changes) by None in nested dictionaries and lists."""
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    if isinstance(value, (float, np.floating)) and not math.isfinite(value):
+        return None
+    return value
+
+
+def to_json(value):
+    """Returns a value as JSON, with null for NaN and infinite floats (which are not valid JSON)."""
+    return json.dumps(_finite(value), default=json_default, allow_nan=False)
+
+
+def cytoscape_json_chunks(network):
+    """Writes a network in Cytoscape JSON format (as nx.cytoscape_data), element by element."""
+    yield '{{"data": [], "directed": {}, "multigraph": {}, "elements": {{"nodes": ['.format(
+        json.dumps(network.is_directed()), json.dumps(network.is_multigraph()))
+    nodes = enumerate(network.nodes(data=True))
+    yield from join_chunks(nodes, lambda node: (',' if node[0] else '') + to_json(
+        {'data': dict(node[1][1], id=str(node[1][0]), value=node[1][0], name=str(node[1][0]))}))
+    yield '], "edges": ['
+    edges = enumerate(network.edges(data=True))
+    yield from join_chunks(edges, lambda edge: (',' if edge[0] else '') + to_json(
+        {'data': dict(edge[1][2], source=edge[1][0], target=edge[1][1])}))
+    yield ']}}\n'
+
+
+def csv_chunks(df):
+    """Writes a DataFrame as CSV, CHUNK_ROWS rows at a time."""
+    for start in range(0, max(len(df), 1), CHUNK_ROWS):
+        yield df.iloc[start:start + CHUNK_ROWS].to_csv(index=False, header=start == 0)
+
+
+class _ChunkSink:
+    """Write-only file object whose contents are taken out as they are written, to stream Parquet row groups."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def parquet_chunks(df):
+    """Writes a DataFrame as Parquet, one row group of CHUNK_ROWS rows at a time."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for start in range(0, len(df), CHUNK_ROWS):
+            writer.write_table(pa.Table.from_pandas(df.iloc[start:start + CHUNK_ROWS], schema=schema,
+                                                    preserve_index=False))
+            yield sink.take()
+    yield sink.take()
+
+
+def gzip_chunks(chunks):
+    """Compresses streamed chunks in gzip format."""
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31 = gzip header and trailer
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def node_table(network):
+    """Returns the node attributes of a network as a DataFrame."""
+    return pd.DataFrame.from_dict(dict(network.nodes(data=True)), orient='index').rename_axis('id').reset_index()
+
+
+def export_chunks(value, file_format):
+    """Returns the streamed chunks of a session object in the requested format."""
+    if isinstance(value, nx.Graph):
+        if file_format == 'graphml':
+            return graphml_chunks(value)
+        if file_format == 'tsv':
+            return edge_list_chunks(value)
+        if file_format == 'cyjs':
+            return cytoscape_json_chunks(value)
+        return parquet_chunks(node_table(value))
+    if 'node_indices' in value.columns:  # Enrichment results
+        value = value.drop(columns='node_indices')
+        value['study_items'] = value['study_items'].str.join(', ')
+    return csv_chunks(value) if file_format == 'csv' else parquet_chunks(value)
+
+
+def download_url(session_id, name, file_format, compress=False, filename=None):
+    """Returns the URL streaming a session object (see DOWNLOADS) in the given format, under the app's
+    requests_pathname_prefix so that downloads work when the app is served from a subpath."""
+    query = {'gzip': 1} if compress else dict()
+    if filename:
+        query['filename'] = filename
+    path = '/download/{}/{}.{}{}'.format(session_id, name, file_format, '?' + urlencode(query) if query else '')
+    return app.get_relative_path(path)
+
+
+@server.route('/download/<session_id>/<name>.<file_format>')
+def download(session_id, name, file_format):
+    """Streams a session object (the displayed network, the selected node details or the enrichment results) straight
+    from memory, so concurrent downloads never share files."""
+    if name not in DOWNLOADS or file_format not in DOWNLOADS[name][1]:
+        abort(404)
+    if file_format == 'parquet' and not PARQUET_AVAILABLE:
+        abort(501, 'Parquet downloads require pyarrow.')
+    store_name, formats = DOWNLOADS[name]
+    value = session_store.get(session_id, store_name)
+    if value is None:
+        abort(404, 'Nothing to download, your session may have expired.')
+
+    filename = '{}.{}'.format(secure_filename(request.args.get('filename', '')) or name, file_format)
+    chunks = export_chunks(value, file_format)
+    if request.args.get('gzip'):
+        chunks = gzip_chunks(chunks)
+        filename += '.gz'
+    response = Response(chunks, mimetype='application/gzip' if request.args.get('gzip') else formats[file_format])
+    response.headers['Content-Disposition'] = 'attachment; filename="{}"'.format(filename)
+    return response
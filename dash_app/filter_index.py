@@ -0,0 +1,100 @@
+import numpy as np
+
+# Node attributes that can be used to select nodes in the vis page
+ATTRIBUTES = ['localization', 'regulation', 'significanceSource']
+
+
+class FilterIndex:
+    """Precomputed bitsets for every node attribute value, enriched GO term and node name of a network. Nodes are
+    numbered by their position in the network DataFrame (the network node order), so combining filters is a bitwise
+    operation over packed bit arrays instead of a query over the whole DataFrame."""
+
+    def __init__(self, network_df, enrichment_results=None):
+        self.node_ids = network_df.index.to_numpy()
+        self.num_nodes = len(self.node_ids)
+        self.empty = np.zeros((self.num_nodes + 7) // 8, dtype=np.uint8)
+
+        # One bitset per attribute value
+        self.attributes = dict()
+        for attribute in ATTRIBUTES:
+            if attribute in network_df.columns:
+                self.attributes[attribute] = {value: self._to_bitset(positions)
+                                              for value, positions in network_df.groupby(attribute).indices.items()}
+
+        # One bitset per enriched term, from the prebuilt term -> node indices mapping
+        self.terms = dict()
+        if enrichment_results is not None:
+            for name, node_indices in zip(enrichment_results['name'], enrichment_results['node_indices']):
+                self.terms[name] = self._to_bitset(node_indices)
+
+        # Sorted values and node positions of numeric attributes, for range lookups with binary search
+        self.sorted_values = dict()
+        if 'log2FoldChange' in network_df.columns:
+            self._add_sorted_values('absLog2FoldChange', network_df['log2FoldChange'].abs().to_numpy(dtype=float))
+        if 'padj' in network_df.columns:
+            self._add_sorted_values('padj', network_df['padj'].to_numpy(dtype=float))
+
+        # Short names and locus tags point to node positions (names are sparse, so no bitsets are stored)
+        self.names = dict()
+        for position, (node_id, short_name) in enumerate(zip(self.node_ids, network_df['shortName'])):
+            self.names.setdefault(short_name, []).append(position)
+            if short_name != node_id:
+                self.names.setdefault(node_id, []).append(position)
+
+    def _to_bitset(self, positions):
+        """Returns a packed bitset with the bits at the given node positions set."""
+        mask = np.zeros(self.num_nodes, dtype=bool)
+        mask[np.asarray(positions, dtype=int)] = True
+        return np.packbits(mask)
+
+    def _add_sorted_values(self, attribute, values):
+        """Stores the sorted (non-missing) values of a numeric attribute with their node positions."""
+        valid = np.flatnonzero(~np.isnan(values))
+        order = valid[np.argsort(values[valid], kind='stable')]
+        self.sorted_values[attribute] = (values[order], order)
+
+    def _union(self, bitsets):
+        """Returns the bitwise OR of a list of bitsets."""
+        return np.bitwise_or.reduce(bitsets) if bitsets else self.empty
+
+    def any_value(self, attribute, values):
+        """Returns the bitset of nodes whose attribute has any of the given values."""
+        value_bitsets = self.attributes.get(attribute, dict())
+        return self._union([value_bitsets[value] for value in values if value in value_bitsets])
+
+    def any_term(self, terms):
+        """Returns the bitset of nodes associated with any of the given enriched terms."""
+        return self._union([self.terms[term] for term in terms if term in self.terms])
+
+    def bounds(self, attribute):
+        """Returns the minimum and maximum values of a numeric attribute."""
+        values = self.sorted_values[attribute][0]
+        return (values[0], values[-1]) if len(values) else (0, 0)
+
+    def in_range(self, attribute, low=None, high=None):
+        """Returns the bitset of nodes whose numeric attribute is between low and high (inclusive)."""
+        values, order = self.sorted_values[attribute]
+        start = 0 if low is None else np.searchsorted(values, low, side='left')
+        end = len(values) if high is None else np.searchsorted(values, high, side='right')
+        return self._to_bitset(order[start:end])
+
+    def any_name(self, names):
+        """Returns the bitset of nodes with any of the given short names or locus tags."""
+        return self._to_bitset([position for name in names for position in self.names.get(name, [])])
+
+    def to_ids(self, bitset):
+        """Returns the node ids of the bits set in a bitset."""
+        return self.node_ids[np.flatnonzero(np.unpackbits(bitset, count=self.num_nodes))].tolist()
+
+    def select(self, names=None, filters=None, ranges=None):
+        """Returns the ids of the nodes matching all the attribute filters (a dictionary of attribute -> accepted
+        values, or 'terms' -> enriched terms) and numeric ranges (a dictionary of attribute -> (low, high)), plus the
+        nodes selected by name."""
+        bitsets = [self.any_term(values) if attribute == 'terms' else self.any_value(attribute, values)
+                   for attribute, values in (filters or dict()).items() if values]
+        bitsets.extend(self.in_range(attribute, low, high) for attribute, (low, high) in (ranges or dict()).items()
+                       if attribute in self.sorted_values)
+        selection = np.bitwise_and.reduce(bitsets) if bitsets else self.empty
+        if names:
+            selection = selection | self.any_name(names)
+        return self.to_ids(selection)
@@ -0,0 +1,65 @@
+"""Reports the time spent importing each module when the app starts, e.g.:
+
+    python -m dash_app.import_report
+    python -m dash_app.import_report --module dash_app.wsgi --top 20
+
+The entry module is imported in a fresh interpreter with `python -X importtime`, so the report matches the start of a
+worker process.
+"""
+import argparse
+from collections import defaultdict
+import subprocess
+import sys
+import time
+
+DEFAULT_MODULE = 'dash_app.index'
+DEFAULT_TOP = 15
+
+
+def parse_import_times(output):
+    """Returns (module, self time, cumulative time, nesting level) tuples from `-X importtime` output, in seconds."""
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_time, cumulative_time, module = line[len('import time:'):].split('|')
+        level = (len(module) - len(module.lstrip())) // 2
+        imports.append((module.strip(), int(self_time) / 1e6, int(cumulative_time) / 1e6, level))
+    return imports
+
+
+def import_report(module=DEFAULT_MODULE, top=DEFAULT_TOP):
+    """Imports a module in a new interpreter and returns the report text."""
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)],
+                             stderr=subprocess.PIPE, universal_newlines=True)
+    wall_time = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError('Importing {} failed:\n{}'.format(module, process.stderr))
+    imports = parse_import_times(process.stderr)
+
+    # Self times add up to the total import time, grouped by top-level package
+    packages = defaultdict(float)
+    for name, self_time, _, _ in imports:
+        packages[name.split('.')[0]] += self_time
+    total = sum(packages.values())
+
+    lines = ['Importing {}: {:.2f} s of imports, {:.2f} s including interpreter startup'.format(
+        module, total, wall_time), '', 'Packages (self time of all their modules):']
+    for package, package_time in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        lines.append('  {:<30} {:>7.3f} s {:>5.1f} %'.format(package, package_time, 100 * package_time / total))
+    # Outermost imports of the app's own modules, with the time of everything they pulled in
+    lines += ['', 'Project modules (cumulative time):']
+    project_imports = [(name, cumulative_time) for name, _, cumulative_time, _ in imports
+                       if name.split('.')[0] in ('dash_app', 'bio_networks', 'go_enrichment')]
+    for name, cumulative_time in sorted(project_imports, key=lambda item: -item[1])[:top]:
+        lines.append('  {:<30} {:>7.3f} s'.format(name, cumulative_time))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reports the import time of the app modules and dependencies.')
+    parser.add_argument('--module', default=DEFAULT_MODULE, help='entry module to import')
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP, help='number of packages and modules listed')
+    arguments = parser.parse_args()
+    print(import_report(arguments.module, arguments.top))
@@ -1,109 +1,111 @@
 import json
+import uuid
 
 import dash_bootstrap_components as dbc
 import dash_core_components as dcc
 import dash_html_components as html
 from dash.dependencies import Input, Output, State
-from dash.dash import no_update
-from networkx.readwrite import json_graph
-import pandas as pd
 
-from dash_app.app import app, server
+from dash_app.app import app, server, session_store
+# Pages are imported when the server starts, not when they are first opened: Dash 1.x only serves the callbacks and
+# component libraries (e.g. dash_cytoscape) registered before the first request. Their slow dependencies
+# (OmicsIntegrator, goatools) are imported on first use instead, see `python -m dash_app.import_report`.
 from dash_app.pages import home, menu, vis, user_guide, about
+from dash_app import api  # Registers the REST API routes
 
-app.layout = html.Div([
-    dcc.Location(id='url', refresh=False),
-    dbc.Navbar(
-        id='top-bar',
-        color='#1a3775',
-        style={'height': '65px'},
-        children=[
-            dbc.Nav(
-                dbc.Row(
-                    [
-                        html.A(
-                            html.Img(src=app.get_asset_url('PaintDB-logo-small.png'),
-                                     id='legend',
-                                     height='60px',
-                                     ),
-                            href='/'),
-                        dbc.NavLink('Build Network', href='/menu', active='exact'),
-                        dbc.NavLink('Explore Network', href='/vis', id='explore', disabled=True),
-                        dbc.DropdownMenu(
-                            children=[
-                                dbc.DropdownMenuItem('User Guide', href='/user_guide'),
-                                dbc.DropdownMenuItem('About', href='/about'),
-                            ],
-                            nav=True,
-                            in_navbar=True,
-                            label='More'
-                        ),
-                    ],
-                    align='center')
-            )
-        ],
-    ),
-    # Different pages are shown here
-    html.Div(id='page-content'),
 
-    # Hidden divs to store and share JSON data across callbacks and pages
-    html.Div(id='hidden-bionetwork', style={'display': 'none'}),
-    html.Div(id='network-parameters', style={'display': 'none'}),
-    html.Div(id='node-details-df', style={'display': 'none'}),
-    html.Div(id='enrichment-results', style={'display': 'none'}),
-    html.Div(id='cyto-network', style={'display': 'none'}),
-    html.Div(id='genes-of-interest', style={'display': 'none'}),
-])
+def serve_layout():
+    """Generates the app layout on every page load, with a new session id to store the user's data server-side."""
+    return html.Div([
+        dcc.Location(id='url', refresh=False),
+        dbc.Navbar(
+            id='top-bar',
+            color='#1a3775',
+            style={'height': '65px'},
+            children=[
+                dbc.Nav(
+                    dbc.Row(
+                        [
+                            html.A(
+                                html.Img(src=app.get_asset_url('PaintDB-logo-small.png'),
+                                         id='legend',
+                                         height='60px',
+                                         ),
+                                href='/'),
+                            dbc.NavLink('Build Network', href='/menu', active='exact'),
+                            dbc.NavLink('Explore Network', href='/vis', id='explore', disabled=True),
+                            dbc.DropdownMenu(
+                                children=[
+                                    dbc.DropdownMenuItem('User Guide', href='/user_guide'),
+                                    dbc.DropdownMenuItem('About', href='/about'),
+                                ],
+                                nav=True,
+                                in_navbar=True,
+                                label='More'
+                            ),
+                        ],
+                        align='center')
+                )
+            ],
+        ),
+        # Different pages are shown here
+        html.Div(id='page-content'),
+
+        # Hidden divs to share small keys across callbacks and pages, the data itself is kept in the session store
+        html.Div(str(uuid.uuid4()), id='session-id', style={'display': 'none'}),
+        html.Div(id='network-key', style={'display': 'none'}),
+        html.Div(id='network-parameters', style={'display': 'none'}),
+        html.Div(id='enrichment-key', style={'display': 'none'}),
+    ])
+
+
+app.layout = serve_layout
 
 
 @app.callback(
     Output('explore', 'disabled'),
-    [Input('hidden-bionetwork', 'children'),
-     Input('enrichment-results', 'children')]
+    [Input('network-key', 'children'),
+     Input('enrichment-key', 'children')]
 )
-def enable_explore_tab(bio_network, enrichment=None):
+def enable_explore_tab(network_key, enrichment_key=None):
     """Disables Explore tab if there is no network to explore."""
-    return False if bio_network and enrichment else True
+    return False if network_key and enrichment_key == network_key else True
 
 
 @app.callback(
-    [Output('page-content', 'children'),
-     Output('cyto-network', 'children')],
+    Output('page-content', 'children'),
     [Input('url', 'pathname')],
-    [State('hidden-bionetwork', 'children'),
-     State('node-details-df', 'children'),
-     State('enrichment-results', 'children'),
+    [State('session-id', 'children'),
      State('network-parameters', 'children')]
 )
-def display_page(pathname, bio_network, json_df, json_enrichment_results, network_params):
+def display_page(pathname, session_id, network_params):
     """Navigates to the selected app page. Generates vis layout depending on BioNetwork type."""
     if pathname == '/':
-        return home.layout, no_update
+        return home.layout
     elif pathname == '/menu':
-        return menu.layout, no_update
+        return menu.layout
     elif pathname == '/vis':
-        if bio_network:
-            # Load JSON data
-            network = json_graph.node_link_graph(json.loads(bio_network))
-            network_df = pd.read_json(json_df)
-            enrichment_results = pd.read_json(json_enrichment_results)
+        network = session_store.get(session_id, 'network')
+        enrichment_results = session_store.get(session_id, 'enrichment_results')
+        if network is not None and enrichment_results is not None:
+            network_df = session_store.get(session_id, 'network_df')
             # Create cyto network for visualization
-            cyto_network = vis.make_cyto_elements(network)
+            cyto_network = vis.make_cyto_elements(network, json.loads(network_params)['strain'])
+            session_store.put(session_id, cyto_network=cyto_network, displayed_network=network)
             # Generate layout using generated data
-            vis_layout = vis.make_vis_layout(network_df, enrichment_results, cyto_network, network_params)
-            return vis_layout, json.dumps(cyto_network)
+            return vis.make_vis_layout(network_df, enrichment_results, cyto_network, network_params)
         else:
             return dbc.Alert('Warning: You need to build a network first.',
                              color='warning',
-                             style={'display': 'inline-block', 'margin': '10px'}), no_update
+                             style={'display': 'inline-block', 'margin': '10px'})
     elif pathname == '/user_guide':
-        return user_guide.layout, no_update
+        return user_guide.layout
     elif pathname == '/about':
-        return about.layout, no_update
+        return about.layout
     else:
         return dbc.Alert('Page not found.',
                          color='danger',
-                         style={'display': 'inline-block', 'margin': '10px'}), no_update
+                         style={'display': 'inline-block', 'margin': '10px'})
 
 
 if __name__ == '__main__':
@@ -0,0 +1,420 @@
+import hashlib
+import importlib
+import os
+import pickle
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from dash.dependencies import Output, Input
+import dash_bootstrap_components as dbc
+import dash_core_components as dcc
+import dash_html_components as html
+
+from dash_app import processes
+
+JOB_WORKERS = 4  # Jobs running at the same time in each server process, the rest wait in the queue
+JOB_TTL = 10 * 60  # Results of finished jobs are kept for ten minutes (in seconds)
+JOB_LOG_TTL = 7 * 24 * 60 * 60  # Finished jobs are forgotten after a week (in seconds)
+JOB_DB_PATH = os.environ.get('PAINTDB_JOB_DB', os.path.join('instance', 'jobs.db'))  # Shared by the server processes
+MAX_ATTEMPTS = 2  # Jobs interrupted by a server stop are run again once, then reported as interrupted
+CLAIM_INTERVAL = 1  # Time between checks for jobs queued by other server processes (in seconds)
+CANCEL_CHECK_INTERVAL = 0.5  # Minimum time between checks for the cancellation of a running job (in seconds)
+RESULT_CACHE_SIZE = 8  # Recently read job results kept unpickled by each server process
+POLL_INTERVAL = 1000  # Time between progress updates in the browser (in milliseconds)
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+INTERRUPTED = 'interrupted'  # Stopped by server restarts MAX_ATTEMPTS times
+EXPIRED = 'expired'  # Done, but the result is no longer kept
+FINISHED = (DONE, FAILED, CANCELLED, INTERRUPTED, EXPIRED)
+
+# Columns of the job table. Job databases of older versions are migrated by adding the missing columns.
+JOB_COLUMNS = [('id', 'TEXT PRIMARY KEY'),
+               ('queue', 'TEXT'),  # Name of the queue running the job
+               ('key', 'TEXT'),
+               ('description', 'TEXT'),
+               ('status', 'TEXT'),
+               ('stage', 'TEXT'),
+               ('progress', 'REAL'),
+               ('error', 'TEXT'),
+               ('created', 'REAL'),
+               ('updated', 'REAL'),
+               ('owner', 'TEXT'),  # host:pid of the server process running the job
+               ('function', 'TEXT'),  # module:name of the job function
+               ('arguments', 'BLOB'),  # Pickled (args, kwargs)
+               ('result', 'BLOB'),  # Pickled result of done jobs, until it expires
+               ('started', 'REAL'),
+               ('finished', 'REAL'),
+               ('attempts', 'INTEGER DEFAULT 0'),
+               ('cancel_requested', 'INTEGER DEFAULT 0')]
+
+
+def _process_alive(pid):
+    """Returns True if a process of this host is running."""
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':  # Signals can't probe processes on Windows, where the app runs as a single process
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # Running, as another user
+        return True
+    return True
+
+
+def _function_name(function):
+    """Returns the module:name reference used to find a job function in any server process."""
+    name = '{}:{}'.format(function.__module__, function.__qualname__)
+    if _resolve(name) is not function:
+        raise ValueError('Job functions must be module-level functions, not {!r}.'.format(function))
+    return name
+
+
+def _resolve(name):
+    module_name, _, qualname = name.partition(':')
+    value = importlib.import_module(module_name)
+    for attribute in qualname.split('.'):
+        value = getattr(value, attribute, None)
+    return value
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when its cancellation was requested."""
+
+
+class Job:
+    """A job being run by a server process. Jobs report their progress (and check for cancellation requests) between
+    stages with `report`, and run the steps that must stop as soon as they are cancelled with `run_in_process`."""
+
+    def __init__(self, queue, job_id, key, description, submitted):
+        self.queue = queue
+        self.id = job_id
+        self.key = key
+        self.description = description
+        self.status = RUNNING
+        self.stage = 'Starting'
+        self.progress = 0
+        self.error = None
+        self.submitted = submitted
+        self.started = time.time()
+        self.finished = None
+        self._cancel_checked = 0
+        self._cancelled = False
+
+    def cancelled(self):
+        """Returns True if the cancellation of the job was requested, by any server process."""
+        now = time.monotonic()
+        if not self._cancelled and now - self._cancel_checked >= CANCEL_CHECK_INTERVAL:
+            self._cancel_checked = now
+            self._cancelled = self.queue.cancel_requested(self.id)
+        return self._cancelled
+
+    def report(self, stage, progress=None):
+        """Updates the current stage and progress (between 0 and 1) of the job. Stops the job if it was cancelled."""
+        if self.cancelled():
+            raise JobCancelled
+        self.stage = stage
+        if progress is not None:
+            self.progress = progress
+        self.queue.update(self)
+
+    def run_in_process(self, function, *args, **kwargs):
+        """Calls `function(*args, **kwargs)` in a worker process (see processes.call), which is stopped as soon as
+        the job is cancelled."""
+        try:
+            return processes.call(function, *args, cancelled=self.cancelled, **kwargs)
+        except processes.Cancelled:
+            raise JobCancelled
+
+
+class JobQueue:
+    """Persistent background job queue for long computations (network builds, GO enrichment, PCSF) that would
+    otherwise block Dash callbacks past proxy timeouts. Callbacks submit jobs and poll their status.
+
+    Jobs, with their arguments and results, are stored in a SQLite database shared by every server process, so any
+    process can poll, cancel or read the result of a job, and each process runs up to `max_workers` queued jobs at a
+    time, whichever process submitted them. Queues with different names can share a database: each one only runs,
+    counts and recovers its own jobs. Identical jobs (same key) share a single execution while they are queued,
+    running or recently done. Queued jobs survive server restarts, and jobs left running by a stopped server process
+    are queued again, up to MAX_ATTEMPTS times. The database is opened on first use, not when the app is imported."""
+
+    def __init__(self, name='app', max_workers=JOB_WORKERS, db_path=JOB_DB_PATH, ttl=JOB_TTL):
+        self.name = name
+        self.max_workers = max_workers
+        self.db_path = db_path
+        self.ttl = ttl
+        self.listeners = []  # Called with every finished job, e.g. to record metrics
+        self._lock = threading.Lock()
+        self._pid = None  # Process whose runner threads were started (threads don't survive forks)
+        self._wakeup = threading.Event()
+        self._results = dict()  # Job id -> result, for the last RESULT_CACHE_SIZE results read
+
+    @property
+    def owner(self):
+        return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _open(self):
+        """Creates the job database and starts the runner threads of this process, the first time it is used."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if os.path.dirname(self.db_path):
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            with self._connect() as db_connection:
+                db_connection.execute('PRAGMA journal_mode=WAL')  # Status polls don't wait for running jobs' updates
+                db_connection.execute('CREATE TABLE IF NOT EXISTS job ({})'.format(
+                    ', '.join('{} {}'.format(name, column_type) for name, column_type in JOB_COLUMNS)))
+                columns = [column[1] for column in db_connection.execute('PRAGMA table_info(job)')]
+                for name, column_type in JOB_COLUMNS:
+                    if name not in columns:
+                        db_connection.execute('ALTER TABLE job ADD COLUMN {} {}'.format(name, column_type))
+                db_connection.execute('CREATE INDEX IF NOT EXISTS job_queue ON job (queue, status, created)')
+                db_connection.execute('CREATE INDEX IF NOT EXISTS job_key ON job (key)')
+                self._recover(db_connection)
+                db_connection.execute('DELETE FROM job WHERE updated < ?', (time.time() - JOB_LOG_TTL,))
+            self._results.clear()
+            for _ in range(self.max_workers):
+                threading.Thread(target=self._runner, name='job-runner', daemon=True).start()
+            self._pid = os.getpid()
+
+    def _recover(self, db_connection):
+        """Queues the jobs left running by stopped server processes of this host again, unless they were already
+        started MAX_ATTEMPTS times or cancelled. Jobs of running processes are left alone."""
+        host = socket.gethostname()
+        now = time.time()
+        rows = db_connection.execute('SELECT id, status, owner, attempts, function, cancel_requested FROM job '
+                                     'WHERE (queue = ? OR queue IS NULL) AND status IN (?, ?)',
+                                     (self.name, QUEUED, RUNNING)).fetchall()
+        for job_id, status, owner, attempts, function, cancel_requested in rows:
+            if function is None:  # Logged by an older version, which did not store job arguments
+                status, stage = INTERRUPTED, 'Interrupted'
+            elif status == QUEUED or (owner is not None and (owner.rsplit(':', 1)[0] != host
+                                                             or _process_alive(int(owner.rsplit(':', 1)[1])))):
+                continue  # Waiting for a runner, or running in a live process
+            elif cancel_requested:
+                status, stage = CANCELLED, 'Cancelled'
+            elif attempts >= MAX_ATTEMPTS:
+                status, stage = INTERRUPTED, 'Interrupted'
+            else:
+                status, stage = QUEUED, 'Waiting in queue (restarted)'
+            db_connection.execute('UPDATE job SET status = ?, stage = ?, owner = NULL, updated = ?, finished = ? '
+                                  'WHERE id = ?', (status, stage, now, None if status == QUEUED else now, job_id))
+
+    def _runner(self):
+        """Runs queued jobs, one at a time."""
+        while True:
+            try:
+                claimed = self._claim()
+            except sqlite3.OperationalError:  # Database locked for too long, try again later
+                claimed = None
+            if claimed is None:
+                self._wakeup.wait(CLAIM_INTERVAL)
+                self._wakeup.clear()
+            else:
+                self._run(*claimed)
+
+    def _claim(self):
+        """Marks the oldest queued job as run by this process. Returns the job, its function name and its pickled
+        arguments, or None if no job is queued."""
+        now = time.time()
+        with self._connect() as db_connection:
+            if db_connection.execute('SELECT 1 FROM job WHERE queue = ? AND status = ? LIMIT 1',
+                                     (self.name, QUEUED)).fetchone() is None:
+                return None
+            db_connection.execute('BEGIN IMMEDIATE')  # So that no other process claims the same job
+            row = db_connection.execute('SELECT id, key, description, created, function, arguments FROM job '
+                                        'WHERE queue = ? AND status = ? ORDER BY created LIMIT 1',
+                                        (self.name, QUEUED)).fetchone()
+            if row is None:
+                return None
+            db_connection.execute('UPDATE job SET status = ?, stage = ?, progress = 0, owner = ?, started = ?, '
+                                  'updated = ?, attempts = attempts + 1 WHERE id = ?',
+                                  (RUNNING, 'Starting', self.owner, now, now, row[0]))
+        job_id, key, description, created, function, arguments = row
+        return Job(self, job_id, key, description, created), function, arguments
+
+    def _run(self, job, function_name, arguments):
+        try:
+            args, kwargs = pickle.loads(arguments)
+            result = _resolve(function_name)(job, *args, **kwargs)
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+        except Exception as error:
+            self._finish(job, FAILED, error='{}: {}'.format(type(error).__name__, error))
+        else:
+            self._finish(job, DONE, result=result)
+
+    def _finish(self, job, status, error=None, result=None):
+        blob = None
+        if status == DONE:
+            try:
+                blob = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+            except Exception as pickling_error:
+                status, error = FAILED, 'The result could not be stored: {}'.format(pickling_error)
+        job.status = status
+        job.error = error
+        job.finished = time.time()
+        if status == DONE:
+            job.progress = 1
+            job.stage = 'Done'
+        elif status == CANCELLED:
+            job.stage = 'Cancelled'
+        with self._connect() as db_connection:
+            db_connection.execute('UPDATE job SET status = ?, stage = ?, progress = ?, error = ?, result = ?, '
+                                  'finished = ?, updated = ? WHERE id = ?',
+                                  (job.status, job.stage, job.progress, job.error, blob, job.finished, job.finished,
+                                   job.id))
+        for listener in self.listeners:
+            listener(job)
+
+    def update(self, job):
+        """Saves the stage and progress of a running job."""
+        with self._connect() as db_connection:
+            db_connection.execute('UPDATE job SET stage = ?, progress = ?, updated = ? WHERE id = ?',
+                                  (job.stage, job.progress, time.time(), job.id))
+
+    def cancel_requested(self, job_id):
+        """Returns True if the cancellation of a job was requested."""
+        with self._connect() as db_connection:
+            row = db_connection.execute('SELECT cancel_requested FROM job WHERE id = ?', (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def submit(self, key, function, *args, description='', **kwargs):
+        """Queues `function(job, *args, **kwargs)` and returns the job id. The function must be defined at the top
+        level of a module and its arguments must be picklable, so that any server process can run it. If an identical
+        job (same key) is already queued, running or done recently, its id is returned instead."""
+        self._open()
+        key = hashlib.sha1(repr(key).encode()).hexdigest()
+        function_name = _function_name(function)
+        arguments = pickle.dumps((args, kwargs), pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        with self._connect() as db_connection:
+            db_connection.execute('BEGIN IMMEDIATE')  # Identical submissions of other processes wait for this one
+            row = db_connection.execute('SELECT id FROM job WHERE key = ? AND queue = ? AND cancel_requested = 0 '
+                                        'AND (status IN (?, ?) OR (status = ? AND finished > ?)) '
+                                        'ORDER BY created DESC LIMIT 1',
+                                        (key, self.name, QUEUED, RUNNING, DONE, now - self.ttl)).fetchone()
+            if row is not None:
+                return row[0]
+            job_id = uuid.uuid4().hex
+            db_connection.execute('INSERT INTO job (id, queue, key, description, status, stage, progress, created, '
+                                  'updated, function, arguments) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                  (job_id, self.name, key, description, QUEUED, 'Waiting in queue', 0, now, now,
+                                   function_name, arguments))
+            # Expired results and the arguments of finished jobs are no longer needed
+            db_connection.execute('UPDATE job SET result = NULL, arguments = NULL WHERE status = ? AND finished < ? '
+                                  'AND (result IS NOT NULL OR arguments IS NOT NULL)', (DONE, now - self.ttl))
+        self._wakeup.set()
+        return job_id
+
+    def status(self, job_id):
+        """Returns the status, stage, progress and error message of a job (and the time left before the result expires
+        for done jobs), or None if the job is unknown to the queue."""
+        self._open()
+        with self._connect() as db_connection:
+            row = db_connection.execute('SELECT status, stage, progress, error, finished FROM job '
+                                        'WHERE id = ? AND queue = ?', (job_id, self.name)).fetchone()
+        if row is None:
+            return None
+        status = {'id': job_id, 'status': row[0], 'stage': row[1], 'progress': row[2], 'error': row[3]}
+        if status['status'] == DONE:
+            expires_in = self.ttl - (time.time() - row[4])
+            if expires_in > 0:  # Seconds before the result is dropped
+                status['expires_in'] = round(expires_in)
+            else:
+                status.update(status=EXPIRED, error='The result is no longer available.')
+        return status
+
+    def active(self):
+        """Returns the number of queued and running jobs of the queue, in all server processes."""
+        self._open()
+        with self._connect() as db_connection:
+            return db_connection.execute('SELECT COUNT(*) FROM job WHERE queue = ? AND status IN (?, ?)',
+                                         (self.name, QUEUED, RUNNING)).fetchone()[0]
+
+    def result(self, job_id):
+        """Returns the result of a done job, None if the job is unknown, unfinished, failed or expired."""
+        self._open()
+        with self._connect() as db_connection:
+            row = db_connection.execute('SELECT 1 FROM job WHERE id = ? AND queue = ? AND status = ? AND finished > ?',
+                                        (job_id, self.name, DONE, time.time() - self.ttl)).fetchone()
+            if row is None:
+                return None
+            with self._lock:
+                if job_id in self._results:
+                    return self._results[job_id]
+            blob = db_connection.execute('SELECT result FROM job WHERE id = ?', (job_id,)).fetchone()[0]
+        result = pickle.loads(blob)
+        with self._lock:
+            self._results[job_id] = result
+            while len(self._results) > RESULT_CACHE_SIZE:
+                del self._results[next(iter(self._results))]  # Oldest first
+        return result
+
+    def cancel(self, job_id):
+        """Requests the cancellation of a job. Queued jobs never start, running jobs are stopped by the server process
+        running them (see Job.cancelled)."""
+        self._open()
+        now = time.time()
+        with self._connect() as db_connection:
+            db_connection.execute('BEGIN IMMEDIATE')
+            db_connection.execute('UPDATE job SET status = ?, stage = ?, cancel_requested = 1, finished = ?, '
+                                  'updated = ? WHERE id = ? AND status = ?',
+                                  (CANCELLED, 'Cancelled', now, now, job_id, QUEUED))
+            # Identical submissions after a cancellation start a new job
+            db_connection.execute('UPDATE job SET stage = ?, cancel_requested = 1, updated = ? '
+                                  'WHERE id = ? AND status = ?', ('Cancelling', now, job_id, RUNNING))
+
+
+def job_progress(name):
+    """Returns the (initially hidden) progress bar, cancel button and polling timer of a kind of job."""
+    return html.Div(
+        id='{}-progress'.format(name),
+        style={'display': 'none'},
+        children=[
+            dbc.Progress(id='{}-bar'.format(name), value=0, striped=True, animated=True,
+                         style={'height': '20px', 'margin-top': '1vh'}),
+            dbc.Button('Cancel', id='{}-cancel'.format(name), color='link'),
+            dcc.Interval(id='{}-interval'.format(name), interval=POLL_INTERVAL, disabled=True),
+            html.Div(id='{}-id'.format(name), style={'display': 'none'})
+        ]
+    )
+
+
+def job_outputs(name):
+    """Callback outputs updating the progress components of a kind of job."""
+    return [Output('{}-progress'.format(name), 'style'),
+            Output('{}-bar'.format(name), 'value'),
+            Output('{}-bar'.format(name), 'children'),
+            Output('{}-interval'.format(name), 'disabled'),
+            Output('{}-id'.format(name), 'children')]
+
+
+def job_inputs(name):
+    """Callback inputs polling and cancelling a kind of job."""
+    return [Input('{}-interval'.format(name), 'n_intervals'),
+            Input('{}-cancel'.format(name), 'n_clicks')]
+
+
+def show_progress(status):
+    """Returns the values of the job outputs while a job is queued or running."""
+    return [{'display': 'block'}, int(100 * status['progress']), status['stage'], False, status['id']]
+
+
+def hide_progress():
+    """Returns the values of the job outputs when no job is running."""
+    return [{'display': 'none'}, 0, '', True, None]
@@ -0,0 +1,356 @@
+from collections import defaultdict, OrderedDict
+from functools import lru_cache
+import hashlib
+import json
+import os
+import threading
+import time
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from dash_app import processes
+
+LAYOUT_CACHE_SIZE = 128  # Number of layouts kept in memory
+# Directory used to persist layouts across restarts (disabled if not set)
+LAYOUT_CACHE_DIR = os.environ.get('PAINTDB_LAYOUT_CACHE_DIR')
+LAYOUT_ENGINE = 'graphviz'  # Default layout engine
+FALLBACK_ENGINE = 'concentric'  # Fastest engine, used when the default engine runs out of time or fails
+LAYOUT_TIMEOUT = 20  # Time budget for the layout worker process (in seconds)
+INLINE_LAYOUT_NODES = 50  # Networks smaller than this are laid out without a worker process
+FORCE_ITERATIONS = 50  # Iterations of the force-directed layout
+CHUNK_SIZE = 1024  # Nodes processed at once when approximating repulsion (bounds memory use)
+NODE_SPACING = 40  # Approximate distance between neighboring nodes in the output coordinates
+GLOBAL_LAYOUT_PATH = os.path.join('data', '{}_layout.tsv')  # Precomputed interactome layout, by strain
+RELAXATION_ITERATIONS = 10  # Force-directed iterations applied to the positions taken from the global layout
+REFINE_ITERATIONS = 20  # Iterations used to refine the position of new nodes in subnetworks
+
+
+
+def graph_hash(network, engine):
+    """Returns a canonical hash of the node and edge sets of a network and the layout engine, independent of the
+    order in which nodes and edges were added."""
+    digest = hashlib.sha1(engine.encode())
+    for node in sorted(str(node) for node in network.nodes):
+        digest.update(node.encode() + b'\0')
+    digest.update(b'\1')
+    for edge in sorted('\0'.join(sorted((str(u), str(v)))) for u, v in network.edges):
+        digest.update(edge.encode() + b'\1')
+    return digest.hexdigest()
+
+
+class LayoutCache:
+    """Least recently used cache of node positions keyed by graph hash, optionally persisted to disk as JSON files."""
+
+    def __init__(self, max_size=LAYOUT_CACHE_SIZE, cache_dir=LAYOUT_CACHE_DIR):
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        self._layouts = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, '{}.json'.format(key))
+
+    def _remember(self, key, positions):
+        """Adds positions to the in-memory cache, evicting the least recently used layouts."""
+        self._layouts[key] = positions
+        self._layouts.move_to_end(key)
+        while len(self._layouts) > self.max_size:
+            self._layouts.popitem(last=False)
+
+    def get(self, key):
+        """Returns the cached positions for a graph hash, or None."""
+        with self._lock:
+            positions = self._layouts.get(key)
+            if positions is None and self.cache_dir and os.path.exists(self._path(key)):
+                with open(self._path(key)) as layout_file:
+                    positions = {node: tuple(pos) for node, pos in json.load(layout_file).items()}
+            if positions is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, positions)
+            return positions
+
+    def put(self, key, positions):
+        """Stores the positions computed for a graph hash."""
+        positions = {node: (float(pos[0]), float(pos[1])) for node, pos in positions.items()}
+        with self._lock:
+            self._remember(key, positions)
+            if self.cache_dir:
+                # Write to a temporary file first, so other processes never read half-written layouts
+                tmp_path = '{}.{}.tmp'.format(self._path(key), os.getpid())
+                with open(tmp_path, 'w') as layout_file:
+                    json.dump(positions, layout_file)
+                os.replace(tmp_path, self._path(key))
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._layouts), 'hits': self.hits, 'misses': self.misses}
+
+
+layout_cache = LayoutCache()
+
+
+def graphviz_layout(nodes, edges):
+    """Graphviz (neato) layout through pygraphviz. Good quality, but slow past a few thousand nodes."""
+    network = nx.Graph()
+    network.add_nodes_from(nodes)
+    network.add_edges_from(edges)
+    return nx.nx_agraph.graphviz_layout(network)
+
+
+def _scale_positions(nodes, pos):
+    """Centers positions and scales them so neighboring nodes are roughly NODE_SPACING apart."""
+    pos = pos - pos.mean(axis=0)
+    span = np.abs(pos).max()
+    if span > 0:
+        pos = pos / span * NODE_SPACING * np.sqrt(len(nodes)) / 2
+    return {node: (float(x), float(y)) for node, (x, y) in zip(nodes, pos)}
+
+
+def _repulsion(pos, k, grid_size):
+    """Returns the Fruchterman-Reingold repulsive displacement of every node. Nodes are binned in a grid of cells with
+    the same number of nodes (columns by x quantiles, then rows by y quantiles within each column): nodes in the same
+    cell repel each other exactly, and every other cell acts as a single node with the cell's mass at its centroid
+    (Barnes-Hut style approximation). Equal-sized cells keep the exact part linear, even for dense hubs."""
+    num_nodes = len(pos)
+    num_cells = grid_size ** 2
+    column = np.empty(num_nodes, dtype=int)
+    column[np.argsort(pos[:, 0], kind='stable')] = np.arange(num_nodes) * grid_size // num_nodes
+    order = np.lexsort((pos[:, 1], column))
+    column_sizes = np.bincount(column, minlength=grid_size)
+    column_starts = np.cumsum(column_sizes) - column_sizes
+    sorted_columns = column[order]
+    row = np.empty(num_nodes, dtype=int)
+    row[order] = (np.arange(num_nodes) - column_starts[sorted_columns]) * grid_size // column_sizes[sorted_columns]
+    cell = column * grid_size + row
+    mass = np.bincount(cell, minlength=num_cells)
+    centroids = np.stack([np.bincount(cell, weights=pos[:, dim], minlength=num_cells) for dim in (0, 1)], axis=1)
+    centroids /= np.maximum(mass, 1)[:, None]
+    occupied = np.flatnonzero(mass)
+    displacement = np.zeros_like(pos)
+
+    # Far field: node -> cell centroid forces, sum_j w_ij (p_i - c_j) = p_i sum_j w_ij - W c, in chunks to bound
+    # memory use
+    centroids = centroids[occupied]
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    for start in range(0, num_nodes, CHUNK_SIZE):
+        chunk = slice(start, start + CHUNK_SIZE)
+        squared_distance = (pos[chunk] ** 2).sum(axis=1)[:, None] + centroid_norms[None, :] - \
+            2 * pos[chunk] @ centroids.T
+        weight = k ** 2 * mass[occupied] / np.maximum(squared_distance, 1e-12)
+        weight[cell[chunk, None] == occupied[None, :]] = 0  # Own cell is handled exactly below
+        displacement[chunk] += pos[chunk] * weight.sum(axis=1)[:, None] - weight @ centroids
+
+    # Near field: all pairs of nodes within the same cell
+    order = np.argsort(cell, kind='stable')
+    sorted_cells = cell[order]
+    group_sizes = mass[sorted_cells]
+    group_starts = np.searchsorted(sorted_cells, sorted_cells, side='left')
+    first = np.repeat(np.arange(num_nodes), group_sizes)
+    second = np.repeat(group_starts, group_sizes) + \
+        np.arange(len(first)) - np.repeat(np.cumsum(group_sizes) - group_sizes, group_sizes)
+    distinct = first != second
+    first, second = order[first[distinct]], order[second[distinct]]
+    delta = pos[first] - pos[second]
+    force = delta * (k ** 2 / np.maximum((delta ** 2).sum(axis=1), 1e-12))[:, None]
+    for dim in (0, 1):
+        displacement[:, dim] += np.bincount(first, weights=force[:, dim], minlength=num_nodes)
+    return displacement
+
+
+def force_directed_layout(nodes, edges, iterations=FORCE_ITERATIONS, initial_pos=None, temperature=0.1, seed=0,
+                          time_budget=None):
+    """Vectorized NumPy force-directed (Fruchterman-Reingold) layout, with approximate repulsion so that every
+    iteration costs O(nodes x cells) instead of O(nodes^2). Stops early once `time_budget` seconds have passed."""
+    deadline = None if time_budget is None else time.monotonic() + time_budget
+    nodes = list(nodes)
+    num_nodes = len(nodes)
+    if num_nodes < 2:
+        return {node: (0.0, 0.0) for node in nodes}
+    index = {node: i for i, node in enumerate(nodes)}
+    edge_array = np.array([(index[u], index[v]) for u, v in edges if u != v], dtype=int).reshape(-1, 2)
+    pos = np.random.default_rng(seed).random((num_nodes, 2)) if initial_pos is None else np.array(initial_pos, float)
+    # Work in a unit square
+    pos = (pos - pos.min(axis=0)) / np.maximum(np.ptp(pos, axis=0).max(), 1e-9)
+    k = np.sqrt(1 / num_nodes)  # Optimal distance between nodes
+    grid_size = int(np.clip(np.sqrt(num_nodes) / 4, 1, 32))
+    cooling = temperature / (iterations + 1)
+
+    for _ in range(iterations):
+        if deadline is not None and time.monotonic() > deadline:
+            break
+        displacement = _repulsion(pos, k, grid_size)
+        if len(edge_array):
+            delta = pos[edge_array[:, 0]] - pos[edge_array[:, 1]]
+            force = delta * (np.linalg.norm(delta, axis=1) / k)[:, None]
+            for dim in (0, 1):
+                displacement[:, dim] -= np.bincount(edge_array[:, 0], weights=force[:, dim], minlength=num_nodes)
+                displacement[:, dim] += np.bincount(edge_array[:, 1], weights=force[:, dim], minlength=num_nodes)
+        # Limit the displacement by the current temperature
+        length = np.maximum(np.linalg.norm(displacement, axis=1), 1e-9)
+        pos += displacement * (np.minimum(length, temperature) / length)[:, None]
+        temperature -= cooling
+    return _scale_positions(nodes, pos)
+
+
+def concentric_layout(nodes, edges):
+    """Places nodes on concentric rings sorted by degree, with hubs in the center. O(nodes log nodes)."""
+    degrees = dict.fromkeys(nodes, 0)
+    for u, v in edges:
+        degrees[u] += 1
+        degrees[v] += 1
+    positions = dict()
+    ring, ring_position, ring_capacity = 0, 0, 1
+    for node in sorted(degrees, key=lambda node: -degrees[node]):
+        angle = 2 * np.pi * ring_position / ring_capacity
+        positions[node] = (float(ring * NODE_SPACING * np.cos(angle)), float(ring * NODE_SPACING * np.sin(angle)))
+        ring_position += 1
+        if ring_position == ring_capacity:
+            # Rings fit as many nodes as their circumference allows
+            ring, ring_position = ring + 1, 0
+            ring_capacity = int(2 * np.pi * ring)
+    return positions
+
+
+def place_around(center, nodes, first_ring=2):
+    """Places nodes on concentric rings around a center position, e.g. the new neighbors of an expanded node."""
+    positions = dict()
+    ring, ring_position, ring_capacity = first_ring, 0, int(2 * np.pi * first_ring)
+    for node in nodes:
+        angle = 2 * np.pi * ring_position / ring_capacity
+        positions[node] = (float(center[0] + ring * NODE_SPACING * np.cos(angle)),
+                           float(center[1] + ring * NODE_SPACING * np.sin(angle)))
+        ring_position += 1
+        if ring_position == ring_capacity:
+            ring, ring_position = ring + 1, 0
+            ring_capacity = int(2 * np.pi * ring)
+    return positions
+
+
+@lru_cache(maxsize=None)
+def load_global_layout(strain):
+    """Returns the precomputed positions of every interactor of a strain, or None if they were not generated."""
+    path = GLOBAL_LAYOUT_PATH.format(strain)
+    if not os.path.exists(path):
+        return None
+    global_layout = pd.read_csv(path, sep='\t', index_col=0)
+    return dict(zip(global_layout.index, zip(global_layout['x'], global_layout['y'])))
+
+
+def _place_near_neighbors(nodes, edges, pos):
+    """Fills in missing (NaN) positions in place: nodes are put next to their already placed neighbors, starting with
+    the nodes closest to placed ones, or next to the center of the network if they are not connected to any."""
+    missing = np.isnan(pos[:, 0])
+    center = np.nanmean(pos, axis=0)
+    index = {node: i for i, node in enumerate(nodes)}
+    neighbors = defaultdict(list)
+    for u, v in edges:
+        neighbors[index[u]].append(index[v])
+        neighbors[index[v]].append(index[u])
+    jitter = np.random.default_rng(0).normal(scale=NODE_SPACING / 2, size=pos.shape)
+    pending = set(np.flatnonzero(missing))
+    while pending:
+        # Place every node with placed neighbors, breadth-first from the placed part of the network
+        ready = [i for i in pending if any(not missing[j] for j in neighbors[i])]
+        if not ready:
+            ready = list(pending)
+        for i in ready:
+            placed = [pos[j] for j in neighbors[i] if not missing[j]]
+            pos[i] = (np.mean(placed, axis=0) if placed else center) + jitter[i]
+        for i in ready:
+            missing[i] = False
+        pending.difference_update(ready)
+    return pos
+
+
+def global_layout(nodes, edges, strain, time_budget=None):
+    """Places nodes at their position in the precomputed interactome layout of the strain. Nodes missing from it
+    (e.g. metabolites) are placed next to their neighbors, then a short force-directed relaxation, cut short after
+    `time_budget` seconds, spreads the subnetwork out."""
+    nodes = list(nodes)
+    positions = load_global_layout(strain)
+    pos = np.array([positions.get(node, (np.nan, np.nan)) for node in nodes], dtype=float)
+    if np.isnan(pos[:, 0]).all():
+        return concentric_layout(nodes, edges)
+    _place_near_neighbors(nodes, edges, pos)
+    return force_directed_layout(nodes, edges, iterations=RELAXATION_ITERATIONS, initial_pos=pos, temperature=0.02,
+                                 time_budget=time_budget)
+
+
+def inherit_positions(nodes, edges, parent_positions, refine_iterations=REFINE_ITERATIONS):
+    """Reuses the positions of nodes already shown in a parent network, so that subnetworks keep the user's mental
+    map. New nodes are placed next to their neighbors, and only they are moved by a short force-directed refinement.
+    Returns None if no node has a parent position."""
+    nodes = list(nodes)
+    pos = np.array([parent_positions.get(node, (np.nan, np.nan)) for node in nodes], dtype=float)
+    new = np.isnan(pos[:, 0])
+    if new.all():
+        return None
+    if new.any():
+        _place_near_neighbors(nodes, edges, pos)
+        index = {node: i for i, node in enumerate(nodes)}
+        edge_array = np.array([(index[u], index[v]) for u, v in edges if u != v], dtype=int).reshape(-1, 2)
+        grid_size = int(np.clip(np.sqrt(len(nodes)) / 4, 1, 32))
+        temperature = NODE_SPACING / 2
+        for _ in range(refine_iterations):
+            # Forces in the output coordinates, with the node spacing as optimal distance
+            displacement = _repulsion(pos, NODE_SPACING, grid_size)
+            if len(edge_array):
+                delta = pos[edge_array[:, 0]] - pos[edge_array[:, 1]]
+                force = delta * (np.linalg.norm(delta, axis=1) / NODE_SPACING)[:, None]
+                for dim in (0, 1):
+                    displacement[:, dim] -= np.bincount(edge_array[:, 0], weights=force[:, dim], minlength=len(nodes))
+                    displacement[:, dim] += np.bincount(edge_array[:, 1], weights=force[:, dim], minlength=len(nodes))
+            length = np.maximum(np.linalg.norm(displacement[new], axis=1), 1e-9)
+            pos[new] += displacement[new] * (np.minimum(length, temperature) / length)[:, None]
+            temperature *= 0.9
+    return {node: (float(x), float(y)) for node, (x, y) in zip(nodes, pos)}
+
+
+LAYOUT_ENGINES = {
+    'graphviz': graphviz_layout,
+    'force_directed': force_directed_layout,
+    'concentric': concentric_layout,
+}
+
+
+def run_layout_engine(engine, nodes, edges, timeout=LAYOUT_TIMEOUT):
+    """Runs a layout engine in a worker process (see dash_app.processes) that is killed if it runs out of time.
+    Returns None if the layout could not be computed within the time budget, or if the engine failed."""
+    try:
+        return processes.call(LAYOUT_ENGINES[engine], nodes, edges, timeout=timeout)
+    except Exception:  # Timed out, raised an exception or the worker process died
+        return None
+
+
+def compute_layout(network, engine=None, strain=None, timeout=LAYOUT_TIMEOUT):
+    """Returns a dictionary of node positions, reusing cached positions if the same graph was already laid out.
+    Networks of a strain with a precomputed global layout are placed by lookup, and only relaxed for as long as the
+    time budget allows. Other layouts are computed in a worker process with a time budget (inline for small networks),
+    falling back to the fastest engine if they run out of time or fail."""
+    if engine is None:
+        engine = 'global' if strain and load_global_layout(strain) is not None else LAYOUT_ENGINE
+    key = graph_hash(network, engine if engine != 'global' else 'global:{}'.format(strain))
+    positions = layout_cache.get(key)
+    if positions is None:
+        nodes, edges = list(network.nodes), list(network.edges)
+        if engine == 'global':
+            positions = global_layout(nodes, edges, strain, time_budget=timeout)
+        elif len(nodes) < INLINE_LAYOUT_NODES:
+            try:
+                positions = LAYOUT_ENGINES[engine](nodes, edges)
+            except Exception:  # e.g. Graphviz is not installed
+                positions = None
+        else:
+            positions = run_layout_engine(engine, nodes, edges, timeout)
+        if positions is None:
+            positions = LAYOUT_ENGINES[FALLBACK_ENGINE](nodes, edges)
+        layout_cache.put(key, positions)
+    return positions
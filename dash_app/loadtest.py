@@ -0,0 +1,264 @@
+"""Load test replaying the Dash callback requests of simulated users against a running server, e.g.:
+
+    python -m dash_app.loadtest --url http://127.0.0.1:8050 --users 20 --ramp-up 10
+
+Every user loads the example data, builds a network, runs the GO term enrichment, opens the network, filters it and
+computes a subnetwork, polling background jobs like the browser does. Component values are taken from the layouts
+returned by the server, so the requests match the ones sent by the Dash front end. The report lists the throughput,
+latency percentiles and error rate of every callback.
+"""
+import argparse
+from collections import defaultdict
+import json
+import threading
+import time
+
+import numpy as np
+import requests
+
+from dash_app.jobs import POLL_INTERVAL
+
+DEFAULT_URL = 'http://127.0.0.1:8050'
+JOB_TIMEOUT = 10 * 60  # Time a simulated user waits for a background job before giving up (in seconds)
+REQUEST_TIMEOUT = 120  # In seconds
+
+
+def stringify_id(component_id):
+    """Returns the id of a component as written in Dash callback specifications (pattern-matching ids as JSON)."""
+    if isinstance(component_id, dict):
+        return json.dumps(component_id, sort_keys=True, separators=(',', ':'))
+    return component_id
+
+
+def parse_id(component_id):
+    """Returns the id of a component from a callback specification (pattern-matching ids as dictionaries)."""
+    return json.loads(component_id) if component_id.startswith('{') else component_id
+
+
+def _wildcard_match(pattern, component_id):
+    """Returns True if a component id matches a pattern-matching id with ALL wildcards."""
+    return (isinstance(component_id, dict) and set(component_id) == set(pattern)
+            and all(value == ['ALL'] or component_id[key] == value for key, value in pattern.items()))
+
+
+class Stats:
+    """Latencies and errors of the requests sent by all users, by callback."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def record(self, name, latency, error=False):
+        with self.lock:
+            self.latencies[name].append(latency)
+            if error:
+                self.errors[name] += 1
+
+    def report(self, duration):
+        lines = ['{:<24} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8} {:>7}'.format(
+            'Callback', 'Requests', 'Req/s', 'p50 (s)', 'p90 (s)', 'p99 (s)', 'Max (s)', 'Errors')]
+        with self.lock:
+            for name, latencies in sorted(self.latencies.items()):
+                p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+                lines.append('{:<24} {:>8} {:>8.2f} {:>8.3f} {:>8.3f} {:>8.3f} {:>8.3f} {:>6.1f}%'.format(
+                    name, len(latencies), len(latencies) / duration, p50, p90, p99, max(latencies),
+                    100 * self.errors[name] / len(latencies)))
+            total = sum(len(latencies) for latencies in self.latencies.values())
+            errors = sum(self.errors.values())
+        lines.append('{} requests in {:.1f} s ({:.2f} req/s), {} errors'.format(total, duration, total / duration,
+                                                                              errors))
+        return '\n'.join(lines)
+
+
+class SimulatedUser:
+    """A browser session: keeps the properties of the components on the page and sends the callback requests that
+    Dash would send when they change."""
+
+    def __init__(self, url, dependencies, stats):
+        self.url = url.rstrip('/')
+        self.dependencies = dependencies
+        self.stats = stats
+        self.http = requests.Session()
+        self.props = dict()  # (stringified id, property) -> value
+        self.ids = dict()  # Stringified id -> id
+
+    def _collect(self, component):
+        """Records the properties of every component of a layout tree."""
+        if isinstance(component, list):
+            for child in component:
+                self._collect(child)
+        elif isinstance(component, dict) and 'props' in component:
+            props = component['props']
+            if 'id' in props:
+                component_id = stringify_id(props['id'])
+                self.ids[component_id] = props['id']
+                for prop, value in props.items():
+                    self.props[(component_id, prop)] = value
+            for value in props.values():
+                self._collect(value)
+
+    def _get(self, name, path):
+        start = time.perf_counter()
+        try:
+            response = self.http.get(self.url + path, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+        except requests.RequestException:
+            self.stats.record(name, time.perf_counter() - start, error=True)
+            raise
+        self.stats.record(name, time.perf_counter() - start)
+        return response
+
+    def _values(self, specs):
+        """Returns the inputs or states of a callback request with the current property values."""
+        values = []
+        for spec in specs:
+            pattern = parse_id(spec['id'])
+            if isinstance(pattern, dict) and ['ALL'] in pattern.values():
+                values.append([{'id': self.ids[component_id], 'property': spec['property'],
+                                'value': self.props.get((component_id, spec['property']))}
+                               for component_id in self.ids if _wildcard_match(pattern, self.ids[component_id])])
+            else:
+                values.append({'id': pattern, 'property': spec['property'],
+                               'value': self.props.get((spec['id'], spec['property']))})
+        return values
+
+    def set(self, component_id, prop, value):
+        self.props[(stringify_id(component_id), prop)] = value
+
+    def fire(self, name, output, changed):
+        """Sends the request of the callback updating an output (e.g. 'page-content.children'), triggered by the
+        changed property, and applies the response. Returns the updated properties."""
+        dependency = self.dependencies[output]
+        output_string = dependency['output']
+        multi = output_string.startswith('..')
+        outputs = [{'id': parse_id(spec.rsplit('.', 1)[0]), 'property': spec.rsplit('.', 1)[1]}
+                   for spec in (output_string[2:-2].split('...') if multi else [output_string])]
+        changed_id = '{}.{}'.format(stringify_id(changed[0]), changed[1])
+        body = {'output': output_string,
+                'outputs': outputs if multi else outputs[0],
+                'inputs': self._values(dependency['inputs']),
+                'state': self._values(dependency['state']),
+                'changedPropIds': [changed_id]}
+
+        start = time.perf_counter()
+        try:
+            response = self.http.post(self.url + '/_dash-update-component', json=body, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+        except requests.RequestException:
+            self.stats.record(name, time.perf_counter() - start, error=True)
+            raise
+        self.stats.record(name, time.perf_counter() - start)
+        if response.status_code == 204:  # PreventUpdate
+            return dict()
+        updated = dict()
+        for component_id, props in response.json()['response'].items():
+            for prop, value in props.items():
+                self.props[(component_id, prop)] = value
+                updated[(component_id, prop)] = value
+                if prop == 'children':
+                    self._collect(value)
+        return updated
+
+    def click(self, name, output, button):
+        """Clicks a button triggering the callback updating an output."""
+        self.set(button, 'n_clicks', (self.props.get((button, 'n_clicks')) or 0) + 1)
+        return self.fire(name, output, (button, 'n_clicks'))
+
+    def wait_for_job(self, name, output, job):
+        """Polls a background job (see dash_app.jobs) until its progress interval is disabled."""
+        interval = '{}-interval'.format(job)
+        deadline = time.monotonic() + JOB_TIMEOUT
+        while self.props.get((interval, 'disabled')) is False:
+            if time.monotonic() > deadline:
+                self.stats.record(name, JOB_TIMEOUT, error=True)
+                raise TimeoutError('{} did not finish in time'.format(job))
+            time.sleep(POLL_INTERVAL / 1000)
+            self.set(interval, 'n_intervals', (self.props.get((interval, 'n_intervals')) or 0) + 1)
+            self.fire(name, output, (interval, 'n_intervals'))
+
+    def open_page(self, pathname):
+        self.set('url', 'pathname', pathname)
+        self.fire('display_page', 'page-content.children', ('url', 'pathname'))
+
+    def run(self, network_type, strain):
+        """Replays a full session."""
+        self._get('page load', '/')
+        self._collect(self._get('layout', '/_dash-layout').json())
+
+        self.open_page('/menu')
+        self.set('network-type', 'value', network_type)
+        self.set('strain', 'value', strain)
+        self.click('upload_message', 'data-upload-output.children', 'load-example')
+
+        self.click('build_network', 'network-key.children', 'make-network-btn')
+        self.wait_for_job('build_network (poll)', 'network-key.children', 'network-job')
+        if not self.props.get(('network-key', 'children')):
+            raise RuntimeError('The network was not built')
+
+        self.click('run_enrichment', 'enrichment-key.children', 'run-enrichment')
+        self.wait_for_job('run_enrichment (poll)', 'enrichment-key.children', 'enrichment-job')
+
+        self.open_page('/vis')
+        # Filter by the first localization, then compute the subnetwork of the selected genes
+        localization = {'type': 'filter', 'index': 1}
+        options = self.props.get((stringify_id(localization), 'options')) or []
+        self.set(localization, 'value', [options[0]['value']] if options else [])
+        self.fire('select_nodes', 'num-selected-nodes.children', (localization, 'value'))
+        self.click('select_nodes (subnetwork)', 'num-selected-nodes.children', 'make-subnetwork')
+        self.wait_for_job('select_nodes (poll)', 'num-selected-nodes.children', 'subnetwork-job')
+
+
+def load_dependencies(url):
+    """Returns the server callbacks by output (each output of multi-output callbacks points to the callback)."""
+    dependencies = dict()
+    for dependency in requests.get(url.rstrip('/') + '/_dash-dependencies', timeout=REQUEST_TIMEOUT).json():
+        if dependency.get('clientside_function'):
+            continue
+        output = dependency['output']
+        for spec in output[2:-2].split('...') if output.startswith('..') else [output]:
+            dependencies[spec] = dependency
+    return dependencies
+
+
+def run_load_test(url=DEFAULT_URL, users=10, ramp_up=0, iterations=1, network_type='DE', strain='PAO1'):
+    """Runs simulated users in parallel threads, started over `ramp_up` seconds. Returns the statistics, the number of
+    failed sessions and the duration of the test."""
+    dependencies = load_dependencies(url)
+    stats = Stats()
+    failures = []
+
+    def user_session(user_index):
+        time.sleep(ramp_up * user_index / users)
+        for _ in range(iterations):
+            try:
+                SimulatedUser(url, dependencies, stats).run(network_type, strain)
+            except Exception as error:
+                failures.append('{}: {}'.format(type(error).__name__, error))
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=user_session, args=(i,)) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats, failures, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replays Dash callback traffic of simulated users.')
+    parser.add_argument('--url', default=DEFAULT_URL, help='URL of the running PaIntDB server')
+    parser.add_argument('--users', type=int, default=10, help='number of concurrent users')
+    parser.add_argument('--ramp-up', type=float, default=0, help='seconds over which users are started')
+    parser.add_argument('--iterations', type=int, default=1, help='sessions run by each user')
+    parser.add_argument('--network-type', default='DE', choices=['basic', 'DE', 'combined'])
+    parser.add_argument('--strain', default='PAO1', choices=['PAO1', 'PA14'])
+    arguments = parser.parse_args()
+
+    stats, failures, duration = run_load_test(arguments.url, arguments.users, arguments.ramp_up, arguments.iterations,
+                                              arguments.network_type, arguments.strain)
+    print(stats.report(duration))
+    sessions = arguments.users * arguments.iterations
+    print('{} of {} sessions failed'.format(len(failures), sessions))
+    for failure in sorted(set(failures)):
+        print('  ' + failure)
@@ -0,0 +1,151 @@
+"""Prometheus metrics served at /metrics: Dash callback latencies and payload sizes, background job queue and run
+times, sizes of the networks built and cache statistics. Recording a request costs a dictionary lookup and a few
+additions, so metrics are always on. Since the slow computations run as background jobs, callback latencies mostly
+measure job submissions and polls: the job histograms measure the computations themselves."""
+from bisect import bisect_left
+from collections import defaultdict
+import threading
+import time
+
+from flask import g, request, Response
+
+import bio_networks.pcsf as pcsf
+from dash_app.app import app, job_queue, server, session_store
+from dash_app.layouts import layout_cache
+from dash_app.uploads import upload_cache
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)  # In seconds
+PAYLOAD_BUCKETS = (100, 1000, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7, 10 ** 8)  # In bytes
+NETWORK_SIZE_BUCKETS = (10, 30, 100, 300, 1000, 3000, 10 ** 4, 3 * 10 ** 4)  # In nodes or edges
+DASH_UPDATE_PATH = '/_dash-update-component'
+
+
+class Histogram:
+    """Prometheus histogram with one series per label value."""
+
+    def __init__(self, name, description, label, buckets):
+        self.name = name
+        self.description = description
+        self.label = label
+        self.buckets = buckets
+        self._counts = defaultdict(lambda: [0] * (len(buckets) + 1))  # Per bucket (not cumulative), then +Inf
+        self._sums = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        with self._lock:
+            self._counts[label_value][bisect_left(self.buckets, value)] += 1
+            self._sums[label_value] += value
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.description), '# TYPE {} histogram'.format(self.name)]
+        with self._lock:
+            series = [(label_value, list(counts), self._sums[label_value])
+                      for label_value, counts in sorted(self._counts.items())]
+        for label_value, counts, total in series:
+            label = '{}="{}"'.format(self.label, label_value)
+            cumulative = 0
+            for bound, count in zip(list(self.buckets) + ['+Inf'], counts):
+                cumulative += count
+                lines.append('{}_bucket{{{},le="{}"}} {}'.format(self.name, label, bound, cumulative))
+            lines.append('{}_sum{{{}}} {}'.format(self.name, label, total))
+            lines.append('{}_count{{{}}} {}'.format(self.name, label, cumulative))
+        return lines
+
+
+callback_latency = Histogram('paintdb_callback_latency_seconds', 'Time spent handling Dash callback requests.',
+                             'callback', LATENCY_BUCKETS)
+request_bytes = Histogram('paintdb_callback_request_bytes', 'Size of Dash callback request payloads.', 'callback',
+                          PAYLOAD_BUCKETS)
+response_bytes = Histogram('paintdb_callback_response_bytes', 'Size of Dash callback response payloads.', 'callback',
+                           PAYLOAD_BUCKETS)
+job_wait = Histogram('paintdb_job_wait_seconds', 'Time background jobs spent in the queue.', 'job',
+                     LATENCY_BUCKETS + (60, 120, 300))
+job_duration = Histogram('paintdb_job_duration_seconds', 'Time spent running background jobs (network builds, GO '
+                         'enrichments, PCSF).', 'job', LATENCY_BUCKETS + (60, 120, 300, 600))
+network_nodes = Histogram('paintdb_network_nodes', 'Number of nodes of the networks built.', 'kind',
+                          NETWORK_SIZE_BUCKETS)
+network_edges = Histogram('paintdb_network_edges', 'Number of edges of the networks built.', 'kind',
+                          NETWORK_SIZE_BUCKETS)
+
+
+def observe_network(kind, network):
+    """Records the size of a built network ('network' or 'subnetwork')."""
+    network_nodes.observe(kind, network.number_of_nodes())
+    network_edges.observe(kind, network.number_of_edges())
+
+
+def observe_job(job):
+    """Records the queue and run times of a finished job, by job description."""
+    if job.started is not None:
+        job_wait.observe(job.description, job.started - job.submitted)
+        job_duration.observe(job.description, job.finished - job.started)
+
+
+job_queue.listeners.append(observe_job)
+
+_callback_names = dict()  # Dash output id -> callback function name
+
+
+def callback_name(output):
+    """Returns the name of the callback function updating an output (as sent in callback requests)."""
+    name = _callback_names.get(output)
+    if name is None:
+        callback = app.callback_map.get(output, dict()).get('callback')
+        name = getattr(callback, '__name__', 'unknown')
+        _callback_names[output] = name
+    return name
+
+
+@server.before_request
+def start_timer():
+    if request.path == DASH_UPDATE_PATH:
+        g.metrics_start = time.perf_counter()
+
+
+@server.after_request
+def record_callback(response):
+    start = g.pop('metrics_start', None)
+    if start is not None:
+        body = request.get_json(silent=True)  # Already parsed (and cached) by Dash
+        output = body.get('output') if isinstance(body, dict) else None
+        name = callback_name(output) if isinstance(output, str) else 'unknown'
+        callback_latency.observe(name, time.perf_counter() - start)
+        request_bytes.observe(name, request.content_length or 0)
+        response_bytes.observe(name, response.calculate_content_length() or 0)
+    return response
+
+
+def _cache_lines():
+    """Returns gauges and counters for the caches (sessions, layouts, uploads and PCSF graphs)."""
+    caches = {'session_store': session_store.stats(),
+              'layout_cache': layout_cache.stats(),
+              'upload_cache': upload_cache.stats(),
+              'pcsf_graphs': pcsf.graph_cache_stats()}
+    lines = ['# HELP paintdb_cache_hits_total Cache lookups that found a value.',
+             '# TYPE paintdb_cache_hits_total counter']
+    lines += ['paintdb_cache_hits_total{{cache="{}"}} {}'.format(cache, stats['hits'])
+              for cache, stats in caches.items()]
+    lines += ['# HELP paintdb_cache_misses_total Cache lookups that did not find a value.',
+              '# TYPE paintdb_cache_misses_total counter']
+    lines += ['paintdb_cache_misses_total{{cache="{}"}} {}'.format(cache, stats['misses'])
+              for cache, stats in caches.items()]
+    lines += ['# HELP paintdb_cache_entries Number of cached values (sessions for the session store).',
+              '# TYPE paintdb_cache_entries gauge']
+    lines += ['paintdb_cache_entries{{cache="{}"}} {}'.format(cache, stats.get('size', stats.get('sessions')))
+              for cache, stats in caches.items()]
+    lines += ['# HELP paintdb_session_store_bytes Size of the pickled session data in the session database.',
+              '# TYPE paintdb_session_store_bytes gauge',
+              'paintdb_session_store_bytes {}'.format(caches['session_store']['bytes'])]
+    return lines
+
+
+@server.route('/metrics')
+def metrics():
+    """Serves the metrics of this process in the Prometheus text format."""
+    lines = []
+    for histogram in (callback_latency, request_bytes, response_bytes, job_wait, job_duration, network_nodes,
+                      network_edges):
+        lines += histogram.render()
+    lines += _cache_lines()
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
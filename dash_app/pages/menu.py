@@ -1,23 +1,22 @@
-import base64
-import io
 import json
 import os
+import uuid
 
+from dash import callback_context, no_update
 from dash.dependencies import Output, Input, State
 from dash.exceptions import PreventUpdate
-from dash_extensions import Download
-from dash_extensions.snippets import send_file
 import dash_bootstrap_components as dbc
 import dash_core_components as dcc
 import dash_html_components as html
 import dash_table
-import networkx as nx
-import pandas as pd
-import sigfig
 
 from bio_networks.network_generator import BioNetwork, DENetwork, CombinedNetwork
-from dash_app.app import app  # Loads app variable from app script
-from go_enrichment.go_enrichment import run_go_enrichment
+from dash_app.app import app, job_queue, session_store  # Loads app variable from app script
+from dash_app.exports import download_url
+from dash_app.jobs import FAILED, FINISHED, hide_progress, job_inputs, job_outputs, job_progress, show_progress
+from dash_app.metrics import observe_network
+from dash_app.uploads import read_example, read_upload
+from go_enrichment.go_enrichment import enrich_network
 
 layout = dbc.Container(
     [
@@ -36,7 +35,8 @@ layout = dbc.Container(
                             ],
                             value='basic'),
                         html.Br(),
-                        html.P('Your genes must be in the first column of a CSV file.'),
+                        html.P('Your genes must be in the first column of a CSV, TSV (optionally gzipped) or Excel '
+                               'file.'),
                         dcc.Upload(
                             id='gene-list-upload',
                             children=dbc.Button(
@@ -137,6 +137,7 @@ layout = dbc.Container(
         html.Br(),
         dbc.Button('2. Make Network', id='make-network-btn', color='primary'),
         html.Br(),
+        job_progress('network-job'),
         dcc.Loading(id='loading',
                     children=html.Div(id='make-network-message'),
                     type='dot'),
@@ -148,7 +149,7 @@ layout = dbc.Container(
                 html.Br(),
                 dbc.Button('3. Run GO Term Enrichment', id='run-enrichment', color='primary'),
                 dbc.Button('Download enrichment results (.csv)',
-                           id='download-btn', color='link',
+                           id='download-btn', color='link', external_link=True,
                            style={'margin-top': '1vh',
                                   'display': 'none'}),
             ],
@@ -156,10 +157,10 @@ layout = dbc.Container(
             style={'display': 'none'}
         ),
         html.Br(),
+        job_progress('enrichment-job'),
         dcc.Loading(id='loading',
                     children=html.Div(id='enrichment-loading'),
                     type='dot'),
-        Download(id='enrichment-download'),
         html.Br(),
         dbc.Button('4. Explore Network', id='explore-btn', href='/vis', color='primary', block=False,
                    style={'display': 'none'}),
@@ -171,28 +172,19 @@ layout = dbc.Container(
 )
 
 
-def parse_gene_list(contents, network_type, example_data=False):
+def parse_gene_list(contents, filename, network_type, example_data=False):
     """Parses the uploaded gene list, returns a Bootstrap table and a Pandas DataFrame."""
 
     if example_data is True:
-        genes_df = pd.read_csv(os.path.join('data', 'example_diff_expr.csv'))
+        genes_df = read_example(os.path.join('data', 'example_diff_expr.csv'))
     else:
-        content_type, content_string = contents.split(',')
-        decoded = base64.b64decode(content_string)
-        genes_df = pd.read_csv(io.StringIO(decoded.decode('utf-8')))
-
-    cols = [col for col in genes_df.columns if col not in ['pvalue', 'padj']]  # select all columns except p-values
-    # Round columns to significant values
-    genes_df.loc[:, cols] = genes_df[cols].round(2)
+        genes_df = read_upload(contents, filename)  # Parsed once per upload, numbers rounded for display
 
     if network_type == 'DE' or network_type == 'combined':
         # Check RNASeq headers are there
         if not {'log2FoldChange', 'padj'}.issubset(genes_df.columns):
             return dbc.Alert('Check your header names. They should include "log2FoldChange" and "padj"',
                              color='danger', style={'display': 'inline-block'}), []
-        # if genes_df['pvalue']:
-        #     genes_df['pvalue'] = [sigfig.round(n, sigfigs=3) for n in genes_df['pvalue']]
-        genes_df['padj'] = [sigfig.round(n, sigfigs=3) for n in genes_df['padj']]
 
     small_df = genes_df.head()  # smaller df to display on app
     table = dash_table.DataTable(
@@ -220,11 +212,9 @@ def parse_gene_list(contents, network_type, example_data=False):
 def parse_tnseq_list(contents, filename, example_data=False):
     """Parses the uploaded TnSeq gene list"""
     if example_data is True:
-        tnseq_df = pd.read_csv(os.path.join('data', 'tn_seq_example.csv'))
+        tnseq_df = read_example(os.path.join('data', 'tn_seq_example.csv'))
     else:
-        content_type, content_string = contents.split(',')
-        decoded = base64.b64decode(content_string)
-        tnseq_df = pd.read_csv(io.StringIO(decoded.decode('utf-8')))
+        tnseq_df = read_upload(contents, filename)
     tnseq_genes = tnseq_df.iloc[:, 0].tolist()
     upload_msg = html.Div(['Your TnSeq genes were uploaded successfully!',
                            filename])
@@ -265,34 +255,61 @@ def show_make_network_btn(contents, tnseq_contents, network_type, example_data):
     Output('data-upload-output', 'children'),
     [Input('gene-list-upload', 'contents'),
      Input('load-example', 'n_clicks')],
-    [State('network-type', 'value')]
+    [State('network-type', 'value'),
+     State('gene-list-upload', 'filename')]
 )
-def upload_message(contents, load_example, network_type):
+def upload_message(contents, load_example, network_type, filename):
     """Returns a successful message after file was uploaded."""
     if contents:
         try:
-            small_table, genes_df = parse_gene_list(contents, network_type)
+            small_table, genes_df = parse_gene_list(contents, filename, network_type)
             return small_table
         except ValueError:
             return dbc.Alert('There was a problem uploading your file. Check that it is the correct format.',
                              color='danger', style={'display': 'inline-block'})
     elif load_example:
-        small_table, genes_df = parse_gene_list(contents, network_type, example_data=True)
+        small_table, genes_df = parse_gene_list(contents, filename, network_type, example_data=True)
         return small_table
 
 
+def make_bio_network(job, network_type, strain, order, detection_method, example_data, rnaseq_contents,
+                     tnseq_contents, rnaseq_filename, tnseq_filename):
+    """Background job building a network from the uploaded gene lists."""
+    job.report('Reading gene list', 0.1)
+    upload_msg, genes_df = parse_gene_list(rnaseq_contents, rnaseq_filename, network_type, example_data)
+    if isinstance(genes_df, list):  # Missing DE columns
+        raise ValueError('The gene list is missing the "log2FoldChange" and "padj" columns.')
+
+    genes_df.rename(columns={genes_df.columns[0]: 'gene'}, inplace=True)
+    gene_list = genes_df.gene.tolist()
+    job.report('Querying PaIntDB and building network', 0.3)
+    if network_type == 'basic':
+        bio_network = BioNetwork(gene_list=gene_list, strain=strain, order=order, detection_method=detection_method)
+    elif network_type == 'DE':
+        bio_network = DENetwork(gene_list=gene_list, strain=strain, order=order, detection_method=detection_method,
+                                de_genes_df=genes_df)
+    elif network_type == 'combined':
+        upload_msg, tnseq_genes = parse_tnseq_list(tnseq_contents, tnseq_filename, example_data)
+        bio_network = CombinedNetwork(gene_list=gene_list, strain=strain, order=order,
+                                      detection_method=detection_method,
+                                      de_genes_df=genes_df, tnseq_gene_list=tnseq_genes)
+    else:
+        bio_network = None
+    return bio_network
+
+
 @app.callback(
     [Output('enrichment-btns', 'style'),
      Output('enrichment-options', 'options'),
      Output('enrichment-options', 'value'),
      Output('make-network-message', 'children'),
-     # Hidden divs to share data across callbacks
-     Output('hidden-bionetwork', 'children'),
-     Output('node-details-df', 'children'),
-     Output('network-parameters', 'children'),
-     Output('genes-of-interest', 'children')],
-    [Input('make-network-btn', 'n_clicks')],
-    [State('network-type', 'value'),
+     # Hidden divs to share keys across callbacks
+     Output('network-key', 'children'),
+     Output('network-parameters', 'children')] + job_outputs('network-job'),
+    [Input('make-network-btn', 'n_clicks')] + job_inputs('network-job'),
+    [State('network-job-id', 'children'),
+     State('session-id', 'children'),
+     State('network-type', 'value'),
      State('strain', 'value'),
      State('order', 'value'),
      State('detection-method', 'value'),
@@ -302,30 +319,40 @@ def upload_message(contents, load_example, network_type):
      State('gene-list-upload', 'filename'),
      State('tnseq-gene-list-upload', 'filename')]
 )
-def build_network(n_clicks, network_type, strain, order, detection_method, example_data_clicks, rnaseq_contents,
-                  tnseq_contents, rnaseq_filename, tnseq_filename):
-    """Generates a network every time the make network button is clicked. Serializes results to JSON
-    and stores them in hidden divs. Shows download and explore network button."""
+def build_network(n_clicks, n_intervals, cancel_clicks, job_id, session_id, network_type, strain, order,
+                  detection_method, example_data_clicks, rnaseq_contents, tnseq_contents, rnaseq_filename,
+                  tnseq_filename):
+    """Submits a network build every time the make network button is clicked, then polls it. Stores results in the
+    session store and shares a new network key. Shows download and explore network button."""
     if n_clicks is None:
         raise PreventUpdate
 
-    example_data = True if example_data_clicks else False
-    upload_msg, genes_df = parse_gene_list(rnaseq_contents, rnaseq_filename, example_data)
-
-    genes_df.rename(columns={genes_df.columns[0]: 'gene'}, inplace=True)
-    gene_list = genes_df.gene.tolist()
-    if network_type == 'basic':
-        bio_network = BioNetwork(gene_list=gene_list, strain=strain, order=order, detection_method=detection_method)
-    elif network_type == 'DE':
-        bio_network = DENetwork(gene_list=gene_list, strain=strain, order=order, detection_method=detection_method,
-                                de_genes_df=genes_df)
-    elif network_type == 'combined':
-        upload_msg, tnseq_genes = parse_tnseq_list(tnseq_contents, tnseq_filename, example_data)
-        bio_network = CombinedNetwork(gene_list=gene_list, strain=strain, order=order,
-                                      detection_method=detection_method,
-                                      de_genes_df=genes_df, tnseq_gene_list=tnseq_genes)
-    else:
-        bio_network = None
+    trigger = callback_context.triggered[0]['prop_id']
+    if trigger == 'make-network-btn.n_clicks':
+        if job_id is not None:
+            job_queue.cancel(job_id)
+        example_data = True if example_data_clicks else False
+        # Repeated clicks with the same inputs reuse the running (or just finished) build
+        job_id = job_queue.submit(('network', session_id, network_type, strain, order, detection_method, example_data,
+                                   rnaseq_contents, tnseq_contents),
+                                  make_bio_network, network_type, strain, order, detection_method, example_data,
+                                  rnaseq_contents, tnseq_contents, rnaseq_filename, tnseq_filename,
+                                  description='Network build')
+    elif job_id is None:
+        raise PreventUpdate
+    elif trigger == 'network-job-cancel.n_clicks':
+        job_queue.cancel(job_id)
+
+    status = job_queue.status(job_id)
+    if status is None or status['status'] not in FINISHED:
+        return [no_update] * 6 + show_progress(status or {'id': job_id, 'stage': '', 'progress': 0})
+    bio_network = job_queue.result(job_id)
+    if bio_network is None:
+        error_msg = 'Network build {}.'.format(status['status']) if status['status'] != FAILED else \
+            'The network could not be built. Check your input files.'
+        return ([{'display': 'none'}, no_update, no_update,
+                 dbc.Alert(error_msg, color='warning', style={'display': 'inline-block'}), no_update, no_update]
+                + hide_progress())
 
     if len(bio_network.network) == 0:
         mapping_msg = dbc.Alert('The network is empty. Ensure that you uploaded a list of P. aeruginosa locus tags and '
@@ -344,66 +371,85 @@ def build_network(n_clicks, network_type, strain, order, detection_method, examp
             {'label': 'Genes mapped to network ({} genes)'.format(len(bio_network.mapped_genes)), 'value': 'network'},
         ]
 
-    json_network = json.dumps(nx.node_link_data(bio_network.network))
-    network_df = bio_network.network_df
-    genes_of_interest = bio_network.genes_of_interest
-    network_params = {'strain': bio_network.strain, 'type': bio_network.network_type}
+    observe_network('network', bio_network.network)
+    network_params = {'strain': bio_network.strain, 'type': bio_network.network_type,
+                      'detection_method': bio_network.detection_method}
+    # Replace any previous network (and its enrichment results) in the session
+    network_key = uuid.uuid4().hex
+    session_store.clear(session_id)
+    session_store.put(session_id,
+                      network_key=network_key,
+                      network=bio_network.network,
+                      network_df=bio_network.network_df,
+                      genes_of_interest=bio_network.genes_of_interest)
 
-    return enrichment_btns_display, enrichment_options, 'all', mapping_msg, json_network, \
-           network_df.to_json(), json.dumps(network_params), json.dumps(genes_of_interest)
+    return ([enrichment_btns_display, enrichment_options, 'all', mapping_msg, network_key, json.dumps(network_params)]
+            + hide_progress())
 
 
 @app.callback(
-    Output('enrichment-download', 'data'),
-    [Input('download-btn', 'n_clicks')],
-    [State('gene-list-upload', 'filename'),
-     State('enrichment-results', 'children')]
+    Output('download-btn', 'href'),
+    [Input('gene-list-upload', 'filename')],
+    [State('session-id', 'children')]
 )
-def download_enrichment_results(n_clicks, filename, enrichment_results):
-    """Generates and sends a csv file of enrichment results for download."""
-    if n_clicks:
-        # Create downloads directory if there isn't one
-        downloads_dir = os.path.join(os.getcwd(), 'downloads')
-        if not os.path.exists(downloads_dir):
-            os.mkdir(downloads_dir)
-        rel_filename = os.path.join('downloads', '{}_enrichment.csv'.format(filename[:-4]))
-        abs_filename = os.path.join(os.getcwd(), rel_filename)
-        enrichment = pd.read_json(enrichment_results)
-        enrichment.to_csv(abs_filename, index=False)
-        return send_file(abs_filename)
+def set_enrichment_download_link(filename, session_id):
+    """Points the download button to the route streaming the enrichment results."""
+    return download_url(session_id, 'enrichment', 'csv',
+                        filename='{}_enrichment'.format(os.path.splitext(filename)[0] if filename else 'example'))
 
 
 @app.callback(
-    [Output('enrichment-results', 'children'),
+    [Output('enrichment-key', 'children'),
      Output('enrichment-loading', 'children'),
-     Output('download-btn', 'style')],
-    [Input('run-enrichment', 'n_clicks')],
-    [State('network-parameters', 'children'),
-     State('genes-of-interest', 'children'),
-     State('enrichment-options', 'value'),
-     State('hidden-bionetwork', 'children')]
+     Output('download-btn', 'style')] + job_outputs('enrichment-job'),
+    [Input('run-enrichment', 'n_clicks')] + job_inputs('enrichment-job'),
+    [State('enrichment-job-id', 'children'),
+     State('session-id', 'children'),
+     State('network-key', 'children'),
+     State('network-parameters', 'children'),
+     State('enrichment-options', 'value')]
 )
-def run_enrichment(n_clicks, network_params, genes_of_interest, gene_list, json_network):
+def run_enrichment(n_clicks, n_intervals, cancel_clicks, job_id, session_id, network_key, network_params, gene_list):
     if n_clicks is None:
         raise PreventUpdate
-    # Load JSON data
-    network_params = json.loads(network_params)
-    strain = network_params['strain']
-    network = nx.node_link_graph(json.loads(json_network))
-    # Use full gene list or genes mapped to network depending on user selection
-    enrichment_genes = json.loads(genes_of_interest) if gene_list == 'all' else network.nodes
-    # Run enrichment
-    enrichment_results, goea_results = run_go_enrichment(strain, enrichment_genes)
-    # Keep only overrepresented terms (remove underrepresented)
-    enrichment_results = enrichment_results.loc[enrichment_results['enrichment'] == 'e', :]
+    network = session_store.get(session_id, 'network')
+    if network is None or session_store.get(session_id, 'network_key') != network_key:
+        return [None, dbc.Alert('Your session expired. Please make the network again.', color='warning',
+                                style={'display': 'inline-block'}), {'display': 'none'}] + hide_progress()
+    strain = json.loads(network_params)['strain']
+
+    trigger = callback_context.triggered[0]['prop_id']
+    if trigger == 'run-enrichment.n_clicks':
+        if job_id is not None:
+            job_queue.cancel(job_id)
+        # Use full gene list or genes mapped to network depending on user selection
+        enrichment_genes = session_store.get(session_id, 'genes_of_interest') if gene_list == 'all' else network.nodes
+        # The network revision changes when genes are added to the network (see vis.expand_neighbors)
+        network_revision = session_store.get(session_id, 'network_revision', 0)
+        job_id = job_queue.submit(('enrichment', network_key, network_revision, gene_list), enrich_network, strain,
+                                  list(enrichment_genes), list(network.nodes), description='GO term enrichment')
+    elif job_id is None:
+        raise PreventUpdate
+    elif trigger == 'enrichment-job-cancel.n_clicks':
+        job_queue.cancel(job_id)
+
+    status = job_queue.status(job_id)
+    if status is None or status['status'] not in FINISHED:
+        return [no_update] * 3 + show_progress(status or {'id': job_id, 'stage': '', 'progress': 0})
+    enrichment_results = job_queue.result(job_id)
+    if enrichment_results is None:
+        return [None, dbc.Alert('GO term enrichment {}.'.format(status['status']), color='warning',
+                                style={'display': 'inline-block'}), {'display': 'none'}] + hide_progress()
+    session_store.put(session_id, enrichment_results=enrichment_results)
+    session_store.delete(session_id, 'filter_index')  # Filter bitsets include the previous enriched terms
     enrichment_msg = 'Found {} enriched GO terms.'.format(len(enrichment_results))
-    return enrichment_results.to_json(), enrichment_msg, {'display': 'inline-block'}
+    return [network_key, enrichment_msg, {'display': 'inline-block'}] + hide_progress()
 
 
 @app.callback(
     Output('explore-btn', 'style'),
-    [Input('enrichment-results', 'children')]
+    [Input('enrichment-key', 'children')]
 )
-def show_explore_network_btn(enrichment_results):
+def show_explore_network_btn(enrichment_key):
     """Shows explore network button after enrichment is done."""
-    return {'display': 'inline-block'} if enrichment_results else {'display': 'none'}
+    return {'display': 'inline-block'} if enrichment_key else {'display': 'none'}
@@ -15,13 +15,14 @@ data_upload_tab = dbc.Card(
             dcc.Markdown(
                 '#### 1. Data upload\n'
                 'PaIntDB takes a list of  of *Pseudomonas aeruginosa* locus tags, which must be in the first column'
-                ' of a .csv file. The three upload options work as follows:\n'
+                ' of a .csv, .tsv (which can be gzipped, e.g. .csv.gz) or Excel file. The three upload options work as '
+                'follows:\n'
                 '- Gene list: any additional columns are ignored.\n'
                 '- Differentially-expressed gene list: the column with fold changes must be named '
                 '\'log2FoldChange\' and the column with p-values must be named \'padj\'. Any additional columns are '
                 'ignored. \n'
                 '- Combined: A differentially-expressed gene list, with the same requirements as above, and '
-                'another .csv file with locus tags in the first column.\n'
+                'another file with locus tags in the first column.\n'
                 '#### 2. Network generation options\n'
                 'Choose the parameters to generate the network.\n'
                 '- Strain: *P. aeruginosa* PAO1 or  PA14, depending on your data.\n'
@@ -66,10 +67,13 @@ explore_tab = dbc.Card(
                 '#### B. Select nodes\n'
                 'Nodes can be selected according to their cellular location or the enriched GO terms containing them. '
                 'If differential expression data is included, then it is possible to select up-regulated or '
-                'down-regulated genes, and if a Tn-Seq dataset is included, there is another filter to select genes '
+                'down-regulated genes, or genes within a range of absolute log2 fold changes and below an adjusted '
+                'p-value threshold using the sliders. If a Tn-Seq dataset is included, there is another filter to '
+                'select genes '
                 'according to the experiment in which they were identified. All filters can be combined to fine-tune '
                 'the selected nodes as desired. Individual genes of '
-                'interest can also be added by name or locus tag to the query.\n\n'
+                'interest can also be added by name or locus tag to the query (type part of a name, locus tag or '
+                'gene description to search for them).\n\n'
                 'Once you select your genes of interest with the filters, you can click on the button to generate a '
                 'subnetwork connecting these genes.\n'
                 'You can download the network as a '
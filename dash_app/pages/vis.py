@@ -1,5 +1,5 @@
+import hashlib
 import json
-import os
 import sqlite3
 
 import dash_bootstrap_components as dbc
@@ -8,29 +8,49 @@ import dash_cytoscape as cyto
 import dash_html_components as html
 import dash_table
 import networkx as nx
+import numpy as np
 import pandas as pd
-from OmicsIntegrator import Graph
+from dash import callback_context
 from dash.dash import no_update
-from dash.dependencies import Output, Input, State, ALL
-from dash_extensions import Download
-from dash_extensions.snippets import send_file
+from dash.dependencies import ClientsideFunction, Output, Input, State, ALL
+from dash.exceptions import PreventUpdate
 
+from bio_networks.interactome import get_interactome
+import bio_networks.pcsf as pcsf
 import dash_app.vis_stylesheets as stylesheets
-import go_enrichment.go_enrichment as goe
-from dash_app.app import app  # Loads app variable from app script
-
-
-def make_cyto_elements(network):
+from dash_app import exports
+from dash_app.app import app, job_queue, session_store  # Loads app variable from app script
+from dash_app.communities import CommunityView, LARGE_NETWORK_NODES
+from dash_app.filter_index import FilterIndex
+from dash_app.jobs import FINISHED, hide_progress, job_inputs, job_outputs, job_progress, show_progress
+from dash_app.layouts import compute_layout, inherit_positions, place_around
+from dash_app.metrics import observe_network
+from dash_app.search_index import SearchIndex
+
+PADJ_FLOOR = 1e-300  # Adjusted p-values of 0 are shown as this value in the p-value slider
+MAX_EXPANDED_PARENTS = 20  # Maximum number of clicked genes whose interactors are added at once
+# Values of the interactors added to a network: they are not seeds of first-order networks, and are neither
+# differentially expressed nor TnSeq hits. Other missing attributes (e.g. localization) are NaN, as in BioNetwork.
+EXPANDED_NODE_VALUES = {'seed': 0, 'log2FoldChange': 0.0, 'padj': 1.0, 'regulation': None,
+                        'significanceSource': 'none'}
+
+
+def make_cyto_elements(network, strain=None, parent_positions=None):
     """Takes a networkx network and outputs Cytoscape elements that can be visualized with Dash. Also creates selector
-    classes according to the attributes and the layout coordinates."""
+    classes according to the attributes and the layout coordinates. Nodes keep their positions in the parent network
+    if given."""
     # Get node degrees
     nx.set_node_attributes(network, dict(network.degree()), 'degree')
 
     # Convert nx network to cytoscape JSON
     json_elements = nx.readwrite.json_graph.cytoscape_data(network)['elements']
 
-    # Make layout (much faster than default Cytoscape layouts)
-    layout = nx.nx_agraph.graphviz_layout(network)
+    # Make layout (much faster than default Cytoscape layouts), cached by graph structure
+    layout = None
+    if parent_positions:
+        layout = inherit_positions(network.nodes, network.edges, parent_positions)
+    if layout is None:
+        layout = compute_layout(network, strain=strain)
     nodes = json_elements['nodes']
     for node in nodes:
         node['data']['label'] = node['data']['shortName']  # Use short name as node label
@@ -44,9 +64,32 @@ def make_cyto_elements(network):
     return elements
 
 
+def make_node_details_table(network_df, network_type):
+    """Returns the display-ready table of node details shown (and downloaded) when nodes are selected."""
+    cols = ['shortName', 'description']
+    if network_type == 'rna_seq' or network_type == 'combined':
+        cols.extend(['log2FoldChange', 'padj'])
+    table_df = (network_df[cols]
+                .reset_index()
+                .rename(columns={'index': 'Locus Tag',
+                                 'shortName': 'Short Name',
+                                 'description': 'Description',
+                                 'log2FoldChange': 'Log2 Fold Change',
+                                 'padj': 'Adjusted p-value'
+                                 }
+                        )
+                )
+    if 'Log2 Fold Change' in table_df.columns:
+        table_df['Log2 Fold Change'] = table_df['Log2 Fold Change'].round(2)
+        # table_df['Adjusted p-value'] = [sigfig.round(n, sigfigs=3) for n in table_df['Adjusted p-value']]
+    return table_df
+
+
 def make_vis_layout(network_df, enrichment_results, cyto_network, network_params):
     """Generates a custom layout depending on the network type."""
     network_params = json.loads(network_params)
+    # Large networks are shown as communities, their elements are sent by select_nodes
+    large_network = len(cyto_network['nodes']) > LARGE_NETWORK_NODES
 
     # This filter is only used with RNASeq/Combined networks
     regulation_filter = html.Details(
@@ -69,6 +112,55 @@ def make_vis_layout(network_df, enrichment_results, cyto_network, network_params
         ],
     )
 
+    # These filters are only used with RNASeq/Combined networks, values are updated while the sliders are dragged
+    if 'log2FoldChange' in network_df.columns:
+        max_fold_change = float(np.ceil(network_df['log2FoldChange'].abs().max() * 10) / 10)
+        max_neg_log_padj = float(np.ceil(-np.log10(network_df['padj'].clip(lower=PADJ_FLOOR)).max()))
+    else:
+        max_fold_change, max_neg_log_padj = 0, 0
+    fold_change_filter = html.Details(
+        id='fold-change-details',
+        open=True,
+        children=[
+            html.Summary('By |log2 fold change|'),
+            dcc.RangeSlider(
+                # ID type for pattern matching callback
+                id={
+                    'type': 'filter',
+                    'index': 5
+                },
+                min=0,
+                max=max_fold_change,
+                step=0.1,
+                value=[0, max_fold_change],
+                marks={0: '0', max_fold_change: str(max_fold_change)},
+                tooltip={'placement': 'bottom'},
+                updatemode='drag'
+            )
+        ],
+    )
+    padj_filter = html.Details(
+        id='padj-details',
+        open=True,
+        children=[
+            html.Summary('By adjusted p-value (-log10 threshold)'),
+            dcc.Slider(
+                # ID type for pattern matching callback
+                id={
+                    'type': 'filter',
+                    'index': 6
+                },
+                min=0,
+                max=max_neg_log_padj,
+                step=0.5,
+                value=0,
+                marks={0: '1', max_neg_log_padj: '1e-{:g}'.format(max_neg_log_padj)},
+                tooltip={'placement': 'bottom'},
+                updatemode='drag'
+            )
+        ],
+    )
+
     # This filter is only used with Combined networks
     source_filter = html.Details(
         id='source-details',
@@ -103,11 +195,9 @@ def make_vis_layout(network_df, enrichment_results, cyto_network, network_params
                         'type': 'filter',
                         'index': 0
                     },
-                    # Allow search by both short name and locus tag (index)
-                    options=[{'label': term, 'value': term}
-                             for term in network_df['shortName']] +
-                            [{'label': term, 'value': term}
-                             for term in network_df.index],
+                    # Options matching the typed short name, locus tag or description are sent by search_names
+                    options=[],
+                    placeholder='Type a name, locus tag or description',
                     multi=True,
                     optionHeight=50
                 )
@@ -156,7 +246,7 @@ def make_vis_layout(network_df, enrichment_results, cyto_network, network_params
 
     # Add extra filters for DE/Combined networks
     if network_params['type'] == 'rna_seq' or network_params['type'] == 'combined':
-        sidebar_filters.extend([regulation_filter, html.Br()])
+        sidebar_filters.extend([regulation_filter, html.Br(), fold_change_filter, padj_filter, html.Br()])
         if network_params['type'] == 'combined':
             sidebar_filters.extend([source_filter])
 
@@ -228,8 +318,35 @@ def make_vis_layout(network_df, enrichment_results, cyto_network, network_params
                                 children=sidebar_filters
                             ),
                             html.P(id='num-selected-nodes', style={'padding-top': '5px'}),
+                            dbc.Button('Add interactors of clicked genes', id='expand-neighbors', color='link'),
+                            html.Abbr('Help',
+                                      title=(('Add the interactors of the genes clicked in the network (hold Shift to '
+                                              'click several genes) from PaIntDB, next to them.')),
+                                      ),
+                            html.Div(
+                                style={'display': 'block' if large_network else 'none'},
+                                children=[
+                                    html.P('This network is large, so groups of closely connected genes are shown as '
+                                           'single nodes. Click on a group to show its genes.'),
+                                    dbc.Button('Collapse groups', id='collapse-communities', color='link'),
+                                ]
+                            ),
+                            dcc.Store(id='expanded-communities', data=[]),
+                            dbc.Checklist(id='robust-subnetwork',
+                                          options=[
+                                              {'label': 'Robust sub-network', 'value': 1}
+                                          ],
+                                          switch=True,
+                                          value=[]
+                                          ),
+                            html.Abbr('Help',
+                                      title=(('Compute the sub-network with several parameter values and randomized '
+                                              'interaction scores, keeping the genes found in most runs. Slower, '
+                                              'fainter genes and thinner interactions were found less often.')),
+                                      ),
                             dbc.Button('Make Sub-Network', id='make-subnetwork', color='primary',
-                                       style={'display': 'none'})
+                                       style={'display': 'none'}),
+                            job_progress('subnetwork-job')
                         ]
                     ),
                     html.Div(
@@ -278,19 +395,39 @@ def make_vis_layout(network_df, enrichment_results, cyto_network, network_params
                         direction='right',
                         children=[
                             dbc.DropdownMenuItem('Network (.graphml)',
-                                                 id='download-network'),
+                                                 id='download-network', external_link=True),
+                            dbc.DropdownMenuItem('Network edge list (.tsv)',
+                                                 id='download-network-tsv', external_link=True),
+                            dbc.DropdownMenuItem('Network (Cytoscape .cyjs)',
+                                                 id='download-network-cyjs', external_link=True),
+                            dbc.DropdownMenuItem('Network node table (.parquet)',
+                                                 id='download-network-parquet', external_link=True,
+                                                 style={'display': 'block' if exports.PARQUET_AVAILABLE else 'none'}),
                             dbc.DropdownMenuItem('Network Image (.png)',
                                                  id='download-network-img'),
-                            dbc.DropdownMenuItem('Table (.csv)',
-                                                 id='download-table',
-                                                 style={'display': 'none'})
+                            html.Div(
+                                id='download-table',
+                                style={'display': 'none'},
+                                children=[
+                                    dbc.DropdownMenuItem('Table (.csv)',
+                                                         id='download-table-csv', external_link=True),
+                                    dbc.DropdownMenuItem('Table (.parquet)',
+                                                         id='download-table-parquet', external_link=True,
+                                                         style={'display': ('block' if exports.PARQUET_AVAILABLE
+                                                                            else 'none')})
+                                ]
+                            ),
+                            dbc.DropdownMenuItem(divider=True),
+                            dbc.Checklist(id='download-gzip',
+                                          options=[
+                                              {'label': 'Compress (.gz)', 'value': 1}
+                                          ],
+                                          switch=True,
+                                          value=[],
+                                          style={'padding-left': '1.5rem'}
+                                          ),
                         ]
                     ),
-                    Download(id='graphml-download'),
-                    Download(id='csv-download'),
-                    # Hidden Divs to store node details and subnetwork for download
-                    html.Div(id='filtered-node-details', style={'display': 'none'}),
-                    html.Div(id='hidden-subnetwork', style={'display': 'none'})
                 ],
             ),
             html.Div(
@@ -315,10 +452,20 @@ def make_vis_layout(network_df, enrichment_results, cyto_network, network_params
                                         minZoom=0.3,
                                         zoom=1,
                                         layout={'name': 'preset'},
-                                        elements=cyto_network,
+                                        elements=[] if large_network else cyto_network,
                                         boxSelectionEnabled=True
                                     )
                                 ),
+                                # Elements are only sent when the displayed graph changes, filter changes only send
+                                # the selected node ids (merged in the browser, see assets/vis_callbacks.js)
+                                dcc.Store(id='network-elements'),
+                                dcc.Store(id='elements-key', data=None if large_network else 'network'),
+                                dcc.Store(id='selected-ids'),
+                                dcc.Store(id='added-elements'),
+                                # Legend image of every color mapping, for the clientside stylesheet callback
+                                dcc.Store(id='legend-urls',
+                                          data={'regulation': app.get_asset_url('de_legend.svg'),
+                                                'experiment': app.get_asset_url('sig_source_legend.svg')}),
                             ]
                         ),
                         dbc.Row(
@@ -335,99 +482,105 @@ def make_vis_layout(network_df, enrichment_results, cyto_network, network_params
     )
 
 
-@app.callback(
+# Stylesheets are static, so they are switched in the browser (see assets/vis_callbacks.js and vis_stylesheets.js)
+app.clientside_callback(
+    ClientsideFunction(namespace='vis', function_name='change_stylesheet'),
     [Output('main-view', 'stylesheet'),
      Output('legend', 'src')],
     [Input('color-map', 'value'),
-     Input('show-labels', 'value')]
+     Input('show-labels', 'value')],
+    [State('legend-urls', 'data')]
 )
-def change_stylesheet(color_map, show_labels):
-    if color_map == 'experiment':
-        legend = app.get_asset_url('sig_source_legend.svg')
-        stylesheet = stylesheets.combined
-    else:
-        legend = app.get_asset_url('de_legend.svg')
-        stylesheet = stylesheets.fold_change
-    if show_labels:
-        return stylesheets.add_labels(stylesheet), legend
-    else:
-        return stylesheet, legend
+
+
+@app.callback(
+    Output({'type': 'filter', 'index': 0}, 'options'),
+    [Input({'type': 'filter', 'index': 0}, 'search_value')],
+    [State({'type': 'filter', 'index': 0}, 'value'),
+     State('session-id', 'children'),
+     State('network-key', 'children')]
+)
+def search_names(search_value, selected_names, session_id, network_key):
+    """Returns the name dropdown options matching the typed text, from a search index built once per network."""
+    if not search_value:
+        raise PreventUpdate
+    network_df = session_store.get(session_id, 'network_df')
+    if network_df is None:
+        raise PreventUpdate
+    search_index = session_store.memoize(session_id, 'search_index', network_key, lambda: SearchIndex(network_df))
+    # Selected names must stay in the options, or the dropdown removes them
+    selected_options = [{'label': name, 'value': name} for name in selected_names or []]
+    return selected_options + [option for option in search_index.search(search_value)
+                               if option['value'] not in (selected_names or [])]
 
 
 @app.callback(
     [Output('full-network-panel', 'style'),
      Output('subnetwork-btns', 'style'),
-     Output('main-view', 'elements'),
-     Output('hidden-subnetwork', 'children'),
+     Output('network-elements', 'data'),
+     Output('elements-key', 'data'),
+     Output('selected-ids', 'data'),
      Output('num-selected-nodes', 'children'),
-     Output('make-subnetwork', 'style')],
+     Output('make-subnetwork', 'style')] + job_outputs('subnetwork-job'),
     [Input({'type': 'filter', 'index': ALL}, 'value'),  # Pattern-matching all callbacks with filter type
      Input('make-subnetwork', 'n_clicks'),
      Input('include-low-confidence', 'value'),
-     Input('include-extra-genes', 'value')],
-    [State('node-details-df', 'children'),
-     State('enrichment-results', 'children'),
+     Input('include-extra-genes', 'value')] + job_inputs('subnetwork-job') +
+    [Input('expanded-communities', 'data')],
+    [State('session-id', 'children'),
+     State('network-key', 'children'),
      State('network-parameters', 'children'),
-     State('cyto-network', 'children'),
-     State('hidden-bionetwork', 'children')]
+     State('robust-subnetwork', 'value'),
+     State('subnetwork-job-id', 'children'),
+     State('elements-key', 'data')]
 )
-def select_nodes(values, subnetwork_clicks, low_confidence, extra_genes, node_details, enrichment_results,
-                 network_params, cyto_network, bio_network):
+def select_nodes(values, subnetwork_clicks, low_confidence, extra_genes, n_intervals, cancel_clicks,
+                 expanded_communities, session_id, network_key, network_params, robust, job_id, elements_key):
     """Select nodes according to user selected filters. Creates subnetwork with selected nodes."""
-    cyto_network = json.loads(cyto_network)
-    enrichment_results = pd.read_json(enrichment_results)
+    cyto_network = session_store.get(session_id, 'cyto_network')
+    if cyto_network is None:
+        return [no_update] * 5 + [dbc.Alert('Your session expired. Please make the network again.',
+                                            color='warning'), {'display': 'none'}] + hide_progress()
+    enrichment_results = session_store.get(session_id, 'enrichment_results')
+    network_df = session_store.get(session_id, 'network_df')
     nodes = cyto_network['nodes']
     # edges = cyto_network['edges']
-    network_df = pd.read_json(node_details)
     network_params = json.loads(network_params)
     strain = network_params['strain']
     network_type = network_params['type']
-    query = []  # Query to filter nodes
-
-    # Get selected filter input values
-    short_name = values[0]
-    location = values[1]
-    enriched_terms = values[2]
-    if network_type == 'rna_seq' or network_params['type'] == 'combined':
-        regulation = values[3]
-        if network_params['type'] == 'combined':
-            significance_source = values[4]
-        else:
-            significance_source = []
-    else:
-        regulation, significance_source = [], []
-
-    # Add queries depending on GUI filter selections
-    if location:
-        query.append('localization in @location')
-    if enriched_terms:
-        # Get genes associated with selected GO term(s)
-        genes_in_term = enrichment_results.loc[enrichment_results['name'].isin(enriched_terms), 'study_items']
-        total_genes = [gene for term in genes_in_term for gene in term.split(', ')]  # Unnest genes in term
-        if strain == 'PA14':
-            total_genes = goe.map_pao1_genes(total_genes)
-        query.append('index in @total_genes')
-    if significance_source:
-        significance_source.append('both')
-        query.append('significanceSource in @significance_source')
-    if regulation:
-        query.append('regulation in @regulation')
-    query_str = ' & '.join(query)  # Join all queries
-    if short_name:
-        if not query:
-            query_str += 'shortName in @short_name | index in @short_name'
-        else:
-            query_str += '| shortName in @short_name | index in @short_name'
-
-    # Use query to select nodes
-    if query_str:
-        queried_nodes = network_df.query(query_str).index.tolist()
-    else:
-        queried_nodes = []
 
-    # Select nodes
-    for node in nodes:
-        node['selected'] = True if node['data']['id'] in queried_nodes else False
+    # Get selected filter input values by filter index (not all filters are shown for every network type)
+    filter_values = {item['id']['index']: item.get('value') for item in callback_context.inputs_list[0]}
+    short_name = filter_values.get(0)
+    location = filter_values.get(1)
+    enriched_terms = filter_values.get(2)
+    regulation = filter_values.get(3)
+    significance_source = filter_values[4] + ['both'] if filter_values.get(4) else []
+    fold_change_range = filter_values.get(5)
+    padj_threshold = filter_values.get(6)
+
+    # Combine the precomputed bitsets of the GUI filter selections. Nodes selected by name are added to the other
+    # filters' selection.
+    filter_index = session_store.memoize(session_id, 'filter_index', network_key,
+                                         lambda: FilterIndex(network_df, enrichment_results))
+    # Range sliders only filter nodes when they are moved away from the full range
+    ranges = dict()
+    if fold_change_range:
+        min_fold_change, max_fold_change = filter_index.bounds('absLog2FoldChange')
+        if fold_change_range[0] > min_fold_change or fold_change_range[1] < max_fold_change:
+            ranges['absLog2FoldChange'] = tuple(fold_change_range)
+    if padj_threshold:
+        ranges['padj'] = (None, 10 ** -padj_threshold)
+    queried_nodes = filter_index.select(names=short_name,
+                                        filters={'localization': location,
+                                                 'terms': enriched_terms,
+                                                 'significanceSource': significance_source,
+                                                 'regulation': regulation},
+                                        ranges=ranges)
+
+    def show_elements(key, make_elements):
+        """Returns the elements and key outputs, sending the elements only if a different graph is displayed."""
+        return [no_update, no_update] if key == elements_key else [make_elements(), key]
 
     selected_msg = 'Selected {} out of {} nodes'.format(len(queried_nodes), len(nodes))
 
@@ -436,64 +589,186 @@ def select_nodes(values, subnetwork_clicks, low_confidence, extra_genes, node_de
 
     # Generate subnetwork when button is clicked.
     if subnetwork_clicks:
-        cyto_sub_network, json_sub_network = make_subnetwork(queried_nodes, network_df, bio_network, strain,
-                                                             network_type, low_confidence, extra_genes)
+        network = session_store.get(session_id, 'network')
+        # PCSF runs once per selection: the forest/augmented forest and extra genes switches only choose between
+        # views of the same result, which are also rendered once.
+        terminals_key = (network_key, tuple(sorted(queried_nodes)), bool(robust))
+        pcsf_result = session_store.lookup(session_id, 'pcsf_result', terminals_key)
+        if pcsf_result is None:
+            # PCSF runs in the background. Submitting again while it runs returns the same job, so polls only check
+            # its progress.
+            previous_job_id = job_id
+            job_id = job_queue.submit(('pcsf', terminals_key), pcsf.find_subnetwork, strain,
+                                      pcsf.make_prizes(network_df, queried_nodes, network_type), robust,
+                                      description='Sub-network')
+            if previous_job_id not in (None, job_id):
+                job_queue.cancel(previous_job_id)  # The selection changed while computing
+            status = job_queue.status(job_id)
+            if status['status'] not in FINISHED:
+                return [no_update] * 5 + [selected_msg, btn_display] + show_progress(status)
+            pcsf_result = job_queue.result(job_id)
+            if pcsf_result is None:
+                selected_msg = dbc.Alert('Could not compute subnetwork ({}). Please try again.'
+                                         .format(status['error'] or status['status']), color='warning')
+                return [no_update] * 5 + [selected_msg, btn_display] + hide_progress()
+            session_store.memoize(session_id, 'pcsf_result', terminals_key, lambda: pcsf_result)
+        subnetwork_views = session_store.lookup(session_id, 'subnetwork_views', terminals_key, dict())
+        view_key = (bool(low_confidence), bool(extra_genes))
+        if view_key not in subnetwork_views:
+            # Subnetwork nodes keep their position in the full network
+            parent_positions = {node['data']['id']: (node['position']['x'], node['position']['y']) for node in nodes}
+            view = make_subnetwork(pcsf_result, network, strain, low_confidence, extra_genes, parent_positions)
+            if view[1] is not None:
+                observe_network('subnetwork', view[1])
+            # Stored again with the new view so that the session store counts its size
+            subnetwork_views = dict(subnetwork_views)
+            subnetwork_views[view_key] = view
+            session_store.put(session_id, subnetwork_views=(terminals_key, subnetwork_views))
+        cyto_sub_network, sub_network = subnetwork_views[view_key]
         # Throws warning if subnetwork is empty.
-        if json_sub_network is None:
+        if sub_network is None:
             selected_msg = dbc.Alert('Could not compute subnetwork using the selected nodes. Try selecting more nodes.',
                                      color='warning')
-            cyto_sub_network = no_update
-            json_sub_network = no_update
+            elements = [no_update, no_update]
         # Return subnetwork
         else:
+            session_store.put(session_id, displayed_network=sub_network)  # For downloading
             selected_msg = ''
-        return {'display': 'none'}, {'display': 'block'}, cyto_sub_network, json_sub_network, selected_msg, \
-               btn_display
-    # Return full network
-    return {'display': 'block'}, {'display': 'none'}, cyto_network, bio_network, selected_msg, btn_display
+            subnetwork_key = hashlib.sha1(repr((terminals_key, view_key)).encode()).hexdigest()
+            elements = show_elements('subnetwork:' + subnetwork_key, lambda: cyto_sub_network)
+        # Nodes are not highlighted in subnetworks
+        return ([{'display': 'none'}, {'display': 'block'}] + elements + [[], selected_msg, btn_display]
+                + hide_progress())
+    # Return full network, stopping any subnetwork computation (e.g. cancelled by the user)
+    if job_id is not None:
+        job_queue.cancel(job_id)
+    network = session_store.get(session_id, 'network')
+    session_store.put(session_id, displayed_network=network)
+    if len(nodes) > LARGE_NETWORK_NODES:
+        # Only the expanded communities show their genes, selected genes in collapsed communities select them
+        community_view = session_store.memoize(session_id, 'community_view', network_key,
+                                               lambda: CommunityView(network, cyto_network))
+        expanded = expanded_communities or []
+        elements = show_elements('network:' + ','.join(map(str, expanded)), lambda: community_view.elements(expanded))
+        selected_ids = community_view.selected_ids(queried_nodes, expanded)
+    else:
+        elements = show_elements('network', lambda: cyto_network)
+        selected_ids = queried_nodes
+    return ([{'display': 'block'}, {'display': 'none'}] + elements + [selected_ids, selected_msg, btn_display]
+            + hide_progress())
+
+
+@app.callback(
+    Output('expanded-communities', 'data'),
+    [Input('main-view', 'tapNodeData'),
+     Input('collapse-communities', 'n_clicks')],
+    [State('expanded-communities', 'data'),
+     State('session-id', 'children'),
+     State('network-key', 'children')]
+)
+def expand_community(node_data, collapse_clicks, expanded_communities, session_id, network_key):
+    """Shows the genes of a community when its node is clicked, collapses all communities with the button."""
+    if callback_context.triggered[0]['prop_id'] == 'collapse-communities.n_clicks':
+        return []
+    community_view = session_store.lookup(session_id, 'community_view', network_key)
+    if not node_data or 'community' not in node_data or community_view is None:
+        raise PreventUpdate
+    return community_view.expand(expanded_communities or [], node_data['community'])
+
+
+# Highlights the selected nodes in the displayed elements, or in new elements if the displayed graph changed. Also
+# appends the elements of expanded neighborhoods.
+app.clientside_callback(
+    ClientsideFunction(namespace='vis', function_name='apply_selection'),
+    Output('main-view', 'elements'),
+    [Input('network-elements', 'data'),
+     Input('selected-ids', 'data'),
+     Input('added-elements', 'data')],
+    [State('main-view', 'elements')]
+)
+
+
+@app.callback(
+    Output('added-elements', 'data'),
+    [Input('expand-neighbors', 'n_clicks')],
+    [State('main-view', 'selectedNodeData'),
+     State('session-id', 'children'),
+     State('network-parameters', 'children')]
+)
+def expand_neighbors(n_clicks, node_data, session_id, network_params):
+    """Adds the interactome neighbors of the clicked nodes to the network. Only the new elements are sent, placed
+    around the node they were added for, with the updated data of the nodes they are connected to. The session's
+    network objects are replaced, not modified, since derived values (indexes, subnetworks) may still use them."""
+    network = session_store.get(session_id, 'network')
+    cyto_network = session_store.get(session_id, 'cyto_network')
+    network_df = session_store.get(session_id, 'network_df')
+    if not n_clicks or not node_data or network is None or cyto_network is None or network_df is None:
+        raise PreventUpdate
+    network_params = json.loads(network_params)
+    interactome = get_interactome(network_params['strain'])
+    detection_method = network_params.get('detection_method', 3)
+
+    positions = {node['data']['id']: node['position'] for node in cyto_network['nodes']}
+    new_nodes = dict()  # New node -> position
+    for node_id in [node['id'] for node in node_data if node['id'] in network][:MAX_EXPANDED_PARENTS]:
+        neighbors = [neighbor for neighbor, _ in interactome.neighbors(node_id, detection_method)
+                     if neighbor not in network and neighbor not in new_nodes]
+        parent_position = positions[node_id]
+        new_nodes.update(place_around((parent_position['x'], parent_position['y']), neighbors))
+    if not new_nodes:
+        raise PreventUpdate
+
+    # New nodes are connected to every node of the network they interact with
+    network = network.copy()
+    new_values = {column: value for column, value in EXPANDED_NODE_VALUES.items() if column in network_df.columns}
+    network.add_nodes_from((node, dict(interactome.node_attributes(node), **new_values)) for node in new_nodes)
+    new_edges = [(node, neighbor, attributes) for node in new_nodes
+                 for neighbor, attributes in interactome.neighbors(node, detection_method)
+                 if neighbor in network and not (neighbor in new_nodes and neighbor < node)]
+    network.add_edges_from(new_edges)
+    touched_nodes = set(new_nodes).union(neighbor for _, neighbor, _ in new_edges)
+    for node in touched_nodes:
+        network.nodes[node]['degree'] = network.degree(node)
+
+    def node_data_of(node):
+        return dict(network.nodes[node], id=node, value=node, name=node, label=network.nodes[node]['shortName'])
+
+    added_elements = {'nodes': [{'data': node_data_of(node), 'position': {'x': x, 'y': y}}
+                                for node, (x, y) in new_nodes.items()],
+                      'edges': [{'data': dict(attributes, source=source, target=target)}
+                                for source, target, attributes in new_edges],
+                      'updated': [{'data': node_data_of(node)} for node in touched_nodes if node not in new_nodes]}
+    updated_data = {node['data']['id']: node['data'] for node in added_elements['updated']}
+    cyto_network = {'nodes': [dict(node, data=updated_data[node['data']['id']])
+                              if node['data']['id'] in updated_data else node for node in cyto_network['nodes']]
+                    + added_elements['nodes'],
+                    'edges': cyto_network['edges'] + added_elements['edges']}
+    new_rows = pd.DataFrame([network.nodes[node] for node in new_nodes], index=list(new_nodes))
+    network_df = pd.concat([network_df, new_rows.reindex(columns=network_df.columns)])
+    if 'degree' in network_df.columns:
+        network_df['degree'] = pd.Series(dict(network.degree()))
+    session_store.put(session_id, network=network, network_df=network_df, cyto_network=cyto_network,
+                      network_revision=session_store.get(session_id, 'network_revision', 0) + 1)
+    # Values derived from the network are computed again with the new nodes
+    session_store.delete(session_id, 'filter_index', 'search_index', 'node_details_table', 'node_details_rows',
+                         'community_view', 'pcsf_result', 'subnetwork_views')
+    return added_elements
 
 
 @app.callback(
     Output('make-subnetwork', 'n_clicks'),
-    [Input('reset-network', 'n_clicks')])
-def reset_subnetwork_clicks(n_clicks):
+    [Input('reset-network', 'n_clicks'),
+     Input('subnetwork-job-cancel', 'n_clicks')])
+def reset_subnetwork_clicks(n_clicks, cancel_clicks):
     """Reset subnetwork clicks to cycle through full network/subnetwork view."""
     return 0
 
 
-def make_subnetwork(queried_nodes, network_df, json_str_network, strain, network_type, low_confidence, extra_genes):
-    """Returns a subnetwork using the PCSF algorithm, using the user-selected nodes as terminals."""
-
-    def make_prize_file(network_df, queried_nodes, network_type):
-        """Generates .tsv file with node prizes for use with OmicsIntegrator."""
-        if network_type == 'gene_list':
-            # If there is no expression data, all prizes = 1
-            network_df['prize'] = 1
-            terminal_prizes = network_df.loc[network_df.index.isin(queried_nodes), 'prize']
-        elif network_type == 'rna_seq' or network_type == 'combined':
-            # Set prizes to expression values
-            terminal_prizes = network_df.loc[network_df.index.isin(queried_nodes), ['log2FoldChange']]
-            # The bigger the fold change, the bigger the prize
-            terminal_prizes.log2FoldChange = abs(terminal_prizes.log2FoldChange)
-            terminal_prizes = terminal_prizes.rename(columns={'log2FoldChange': 'prize'})
-            if network_type == 'combined':
-                # Set TnSeq prizes to the max prize
-                terminal_prizes.loc[network_df['significanceSource'] == 'TnSeq', :] = terminal_prizes['prize'].max()
-        terminal_prizes.to_csv('node_prizes.tsv', sep='\t')
-
-    network = nx.node_link_graph(json.loads(json_str_network))
-    # Make Graph object for prize-collecting Steiner forest (PCSF)
-    graph = Graph(os.path.join('data', '{}_interactome.tsv'.format(strain)),  # Get interactome with costs
-                  {'b': 10,  # b > 1 results in more terminal nodes in sub_network
-                   'g': 0}  # g = 0 = disable degree cost correction
-                  )
-    make_prize_file(network_df, queried_nodes, network_type)
-    graph.prepare_prizes('node_prizes.tsv')
-    os.remove('node_prizes.tsv')  # Delete prize file (not needed anymore after running PCSF)
-    vertex_indices, edge_indices = graph.pcsf()
-    forest, augmented_forest = graph.output_forest_as_networkx(vertex_indices, edge_indices)
-    # Include low confidence edges if selected by the user
-    sub_network = augmented_forest if low_confidence else forest
+def make_subnetwork(pcsf_result, network, strain, low_confidence, extra_genes, parent_positions=None):
+    """Returns a subnetwork view of a PCSF result (computed with the user-selected nodes as terminals)."""
+    forest, augmented_forest = pcsf_result
+    # Include low confidence edges if selected by the user. Copy, so the cached PCSF result is not modified.
+    sub_network = (augmented_forest if low_confidence else forest).copy()
     # If sub-network is empty, warning is shown
     if len(sub_network.nodes) == 0:
         return None, None
@@ -536,43 +811,38 @@ def make_subnetwork(queried_nodes, network_df, json_str_network, strain, network
 
     unfrozen_sub = nx.Graph(sub_network)  # Copy needed to remove orphan nodes
     unfrozen_sub.remove_nodes_from(list(nx.isolates(unfrozen_sub)))
-    cyto_sub_network = make_cyto_elements(unfrozen_sub)
-    json_sub_network = json.dumps(nx.node_link_data(unfrozen_sub))  # For downloading
-    return cyto_sub_network, json_sub_network
+    # Keep the sweep frequencies of robust subnetworks (lost when taking the subgraph of the full network)
+    nx.set_node_attributes(unfrozen_sub, nx.get_node_attributes(forest, 'frequency'), 'frequency')
+    nx.set_edge_attributes(unfrozen_sub, {edge: frequency for edge, frequency in
+                                          nx.get_edge_attributes(augmented_forest, 'frequency').items()
+                                          if unfrozen_sub.has_edge(*edge)}, 'frequency')
+    cyto_sub_network = make_cyto_elements(unfrozen_sub, strain, parent_positions)
+    return cyto_sub_network, unfrozen_sub
 
 
 @app.callback(
     [Output('node-details-table', 'children'),
-     Output('filtered-node-details', 'children'),
      Output('download-table', 'style')],
     [Input('main-view', 'selectedNodeData')],
-    [State('node-details-df', 'children'),
+    [State('session-id', 'children'),
+     State('network-key', 'children'),
      State('network-parameters', 'children')]
 )
-def show_node_details(node_data, node_details, network_params):
+def show_node_details(node_data, session_id, network_key, network_params):
     """Filters the network DataFrame with the user-selected nodes and returns a DataTable."""
-    if node_data:
-        # Columns to display
-        cols = ['shortName', 'description']
-        network_params = json.loads(network_params)
+    network_df = session_store.get(session_id, 'network_df')
+    if node_data and network_df is not None:
+        network_type = json.loads(network_params)['type']
+        # Details table and short name lookup are only built once per network
+        table_df = session_store.memoize(session_id, 'node_details_table', network_key,
+                                         lambda: make_node_details_table(network_df, network_type))
+        table_rows = session_store.memoize(session_id, 'node_details_rows', network_key,
+                                           lambda: table_df.groupby('Short Name').indices)
         # Get selected nodes
-        node_ids = [node['label'] for node in node_data]
-        network_df = pd.read_json(node_details)
-        if network_params['type'] == 'rna_seq' or network_params['type'] == 'combined':
-            cols.extend(['log2FoldChange', 'padj'])
-            network_df['log2FoldChange'] = network_df['log2FoldChange'].round(2)
-            # network_df['padj'] = [sigfig.round(n, sigfigs=3) for n in network_df['padj']]
-
-        filtered_df = (network_df.loc[network_df.shortName.isin(node_ids), cols]
-                       .reset_index()
-                       .rename(columns={'index': 'Locus Tag',
-                                        'shortName': 'Short Name',
-                                        'description': 'Description',
-                                        'log2FoldChange': 'Log2 Fold Change',
-                                        'padj': 'Adjusted p-value'
-                                        }
-                               )
-                       )
+        node_ids = {node['label'] for node in node_data}
+        positions = sorted(position for node_id in node_ids for position in table_rows.get(node_id, []))
+        filtered_df = table_df.iloc[positions]
+        session_store.put(session_id, filtered_node_details=filtered_df)  # For downloading
 
         nodes_table = [
             dash_table.DataTable(
@@ -601,42 +871,26 @@ def show_node_details(node_data, node_details, network_params):
                             }
             )
         ]
-        return nodes_table, filtered_df.to_json(), {'display': 'block'}
+        return nodes_table, {'display': 'block'}
     else:
-        return None, None, {'display': 'none'}
+        return None, {'display': 'none'}
 
 
 @app.callback(
-    Output('csv-download', 'data'),
-    [Input('download-table', 'n_clicks')],
-    [State('filtered-node-details', 'children')]
+    [Output('download-network', 'href'),
+     Output('download-network-tsv', 'href'),
+     Output('download-network-cyjs', 'href'),
+     Output('download-network-parquet', 'href'),
+     Output('download-table-csv', 'href'),
+     Output('download-table-parquet', 'href')],
+    [Input('download-gzip', 'value')],
+    [State('session-id', 'children')]
 )
-def download_nodes_csv(n_clicks, json_df):
-    if n_clicks:
-        downloads_dir = os.path.join(os.getcwd(), 'downloads')
-        if not os.path.exists(downloads_dir):
-            os.mkdir(downloads_dir)
-        nodes_df = pd.read_json(json_df)
-        abs_filename = os.path.join(downloads_dir, 'node_details.csv')
-        nodes_df.to_csv(abs_filename, index=False)
-        return send_file(abs_filename)
-
-
-@app.callback(
-    Output('graphml-download', 'data'),
-    Input('download-network', 'n_clicks'),
-    State('hidden-subnetwork', 'children')
-)
-def download_graphml(n_clicks, json_str_sub_network):
-    if n_clicks:
-        downloads_dir = os.path.join(os.getcwd(), 'downloads')
-        if not os.path.exists(downloads_dir):
-            os.mkdir(downloads_dir)
-        rel_filename = os.path.join('downloads', 'network.graphml')
-        abs_filename = os.path.join(os.getcwd(), rel_filename)
-        sub_network = nx.node_link_graph(json.loads(json_str_sub_network))
-        nx.write_graphml(sub_network, path=abs_filename)
-        return send_file(abs_filename)
+def set_download_links(compress, session_id):
+    """Points the download menu items to the routes streaming the displayed network and the node details table."""
+    return [exports.download_url(session_id, name, file_format, bool(compress))
+            for name, file_format in [('network', 'graphml'), ('network', 'tsv'), ('network', 'cyjs'),
+                                      ('network', 'parquet'), ('table', 'csv'), ('table', 'parquet')]]
 
 
 @app.callback(
@@ -0,0 +1,91 @@
+"""Worker processes for the CPU-heavy computations (layouts, PCSF, GO term enrichment), which can be stopped at any
+time, unlike threads.
+
+Workers are started by a forkserver instead of forked from the multithreaded server process, whose copy could inherit
+locks held by other threads (e.g. of the caches) and deadlock. Before forking any worker, the forkserver imports the
+PRELOAD_MODULES, which load the read-only data used by the computations (see dash_app.worker_data): every worker
+starts with that data, shared copy-on-write, instead of loading it again.
+"""
+import multiprocessing
+import os
+import signal
+import time
+
+# Modules imported by the forkserver before it forks workers (comma-separated, empty to load the data on first use)
+PRELOAD_MODULES = [name for name in os.environ.get('PAINTDB_WORKER_PRELOAD', 'dash_app.worker_data').split(',')
+                   if name]
+CANCEL_CHECK_INTERVAL = 0.25  # Time between cancellation checks while a worker is running (in seconds)
+
+if 'forkserver' in multiprocessing.get_all_start_methods():
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(PRELOAD_MODULES)
+else:  # Windows, where workers are spawned and load the data themselves
+    context = multiprocessing.get_context('spawn')
+
+
+class Cancelled(Exception):
+    """Raised when a computation is stopped because its cancellation was requested."""
+
+
+def _worker(function, args, kwargs, connection, relay_progress):
+    """Calls a function in a worker process and sends its progress and result (or exception) through a pipe."""
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()  # So that the processes started by the function are stopped with the worker (see _terminate)
+    try:
+        if relay_progress:
+            kwargs = dict(kwargs, progress=lambda *values: connection.send(('progress', values)))
+        connection.send(('result', function(*args, **kwargs)))
+    except Exception as error:
+        try:
+            connection.send(('error', error))
+        except Exception:  # Exceptions that can't be pickled
+            connection.send(('error', RuntimeError('{}: {}'.format(type(error).__name__, error))))
+    finally:
+        connection.close()
+
+
+def _terminate(worker):
+    """Kills a worker process and the processes it started (e.g. the process pool of a PCSF sweep)."""
+    if hasattr(os, 'killpg'):
+        try:
+            os.killpg(worker.pid, signal.SIGKILL)
+        except OSError:  # The worker had not created its process group yet
+            pass
+    worker.terminate()
+
+
+def call(function, *args, timeout=None, cancelled=None, progress=None, **kwargs):
+    """Calls `function(*args, **kwargs)` in a worker process and returns its result, or raises its exception. The
+    worker is killed if it runs for more than `timeout` seconds (raising TimeoutError) or as soon as `cancelled()`
+    returns True (raising Cancelled). If `progress` is given, the function is called with a `progress` argument
+    whose calls in the worker are relayed to it. Exceptions raised by `progress` also kill the worker."""
+    receiver, sender = context.Pipe(duplex=False)
+    worker = context.Process(target=_worker, args=(function, args, kwargs, sender, progress is not None))
+    worker.start()
+    sender.close()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    try:
+        while True:
+            wait = CANCEL_CHECK_INTERVAL
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    raise TimeoutError('The computation took more than {} seconds.'.format(timeout))
+            if receiver.poll(wait):
+                try:
+                    kind, value = receiver.recv()
+                except EOFError:  # The worker died without sending a result
+                    worker.join()
+                    raise RuntimeError('The worker process exited with code {}.'.format(worker.exitcode))
+                if kind == 'result':
+                    return value
+                if kind == 'error':
+                    raise value
+                progress(*value)
+            if cancelled is not None and cancelled():
+                raise Cancelled
+    finally:
+        receiver.close()
+        if worker.is_alive():
+            _terminate(worker)
+        worker.join()
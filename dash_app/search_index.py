@@ -0,0 +1,76 @@
+from bisect import bisect_left
+from collections import defaultdict
+
+SEARCH_LIMIT = 50  # Maximum number of options sent to the name dropdown
+MIN_TRIGRAM_QUERY = 3  # Shorter queries only match name prefixes
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    """Prefix and trigram index over the short names, locus tags and descriptions of a network's nodes, used to feed
+    the name dropdown a few matching options at a time instead of every name in the network."""
+
+    def __init__(self, network_df):
+        descriptions = network_df['description'] if 'description' in network_df.columns else [None] * len(network_df)
+        # Options are the short names and locus tags understood by the name filter (see FilterIndex.any_name)
+        self.options = []
+        self.descriptions = []
+        for locus_tag, short_name, description in zip(network_df.index, network_df['shortName'], descriptions):
+            description = description if isinstance(description, str) else ''
+            # Missing names (NaN) and non-string ids can't be searched as text, so they are left out of the options
+            for option in dict.fromkeys((short_name, locus_tag)):
+                if isinstance(option, str):
+                    self.options.append(option)
+                    self.descriptions.append(description)
+                    description = ''  # Descriptions are only searched (and shown) once per node
+
+        # Sorted lowercase names for prefix lookups with binary search
+        self.sorted_names = sorted((option.lower(), position) for position, option in enumerate(self.options))
+        # Name and description trigrams for substring lookups
+        self.name_trigrams = defaultdict(set)
+        self.description_trigrams = defaultdict(set)
+        for position, (option, description) in enumerate(zip(self.options, self.descriptions)):
+            for trigram in _trigrams(option.lower()):
+                self.name_trigrams[trigram].add(position)
+            for trigram in _trigrams(description.lower()):
+                self.description_trigrams[trigram].add(position)
+
+    def _prefix_matches(self, query):
+        start = bisect_left(self.sorted_names, (query,))
+        for name, position in self.sorted_names[start:]:
+            if not name.startswith(query):
+                break
+            yield position
+
+    def _substring_matches(self, query, trigram_index, texts):
+        """Returns the positions of the texts containing the query, narrowed down by their trigrams."""
+        candidates = set.intersection(*(trigram_index.get(trigram, set()) for trigram in _trigrams(query)))
+        return sorted(position for position in candidates if query in texts[position].lower())
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """Returns up to `limit` dropdown options matching a query: names starting with it first, then names and
+        descriptions containing it."""
+        query = (query or '').strip().lower()
+        if not query:
+            return []
+        matches = list(self._prefix_matches(query))
+        if len(query) >= MIN_TRIGRAM_QUERY:
+            matches.extend(self._substring_matches(query, self.name_trigrams, self.options))
+            matches.extend(self._substring_matches(query, self.description_trigrams, self.descriptions))
+
+        options, seen = [], set()
+        for position in matches:
+            option = self.options[position]
+            if option in seen:
+                continue
+            seen.add(option)
+            label = option
+            if query not in option.lower() and self.descriptions[position]:
+                label = '{} ({})'.format(option, self.descriptions[position])  # Matched by description
+            options.append({'label': label, 'value': option})
+            if len(options) == limit:
+                break
+        return options
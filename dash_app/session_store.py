@@ -0,0 +1,205 @@
+from collections import OrderedDict
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+SESSION_TTL = 2 * 60 * 60  # Idle sessions are discarded after two hours (in seconds)
+MAX_STORE_BYTES = 2 * 1024 ** 3  # Least recently used sessions are discarded past 2 GB
+SESSION_DB_PATH = os.environ.get('PAINTDB_SESSION_DB', os.path.join('instance', 'sessions.db'))
+LOCAL_CACHE_BYTES = 512 * 1024 ** 2  # Unpickled objects kept by each server process
+TOUCH_INTERVAL = 60  # Sessions are marked as used at most once a minute by each server process (in seconds)
+
+
+class SessionStore:
+    """Thread- and process-safe store that keeps live Python objects (graphs, DataFrames, Cytoscape elements) per
+    session id, so callbacks only exchange small keys with the browser. Objects are pickled into a SQLite database
+    shared by every server process (so the app can run several workers), and each process keeps the objects it read
+    last, unpickled, for as long as they are not replaced. Sessions expire after being idle for `ttl` seconds, and the
+    least recently used sessions are evicted when the store grows past `max_bytes`."""
+
+    def __init__(self, ttl=SESSION_TTL, max_bytes=MAX_STORE_BYTES, db_path=SESSION_DB_PATH,
+                 cache_bytes=LOCAL_CACHE_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.db_path = db_path
+        self.cache_bytes = cache_bytes
+        self._lock = threading.RLock()
+        self._pid = None  # Process that opened the database (cached objects are dropped after forks)
+        self._cache = OrderedDict()  # (session id, name) -> (version, size, object), least recently used first
+        self._cache_size = 0
+        self._touched = dict()  # Session id -> last time this process marked it as used
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _open(self):
+        """Creates the session database, the first time the store is used by a process."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if os.path.dirname(self.db_path):
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            with self._connect() as db_connection:
+                db_connection.execute('PRAGMA journal_mode=WAL')  # Reads don't wait for other processes' writes
+                db_connection.execute('CREATE TABLE IF NOT EXISTS session (id TEXT PRIMARY KEY, accessed REAL)')
+                db_connection.execute('CREATE TABLE IF NOT EXISTS item (session_id TEXT, name TEXT, version INTEGER, '
+                                      'value BLOB, size INTEGER, PRIMARY KEY (session_id, name))')
+                db_connection.execute('CREATE INDEX IF NOT EXISTS session_accessed ON session (accessed)')
+            self._cache.clear()
+            self._cache_size = 0
+            self._touched.clear()
+            self._pid = os.getpid()
+
+    def _touch(self, db_connection, session_id, now, create=False):
+        """Marks a session as recently used (creating it if needed), unless this process just did."""
+        if create:
+            db_connection.execute('INSERT OR REPLACE INTO session (id, accessed) VALUES (?, ?)', (session_id, now))
+        elif now - self._touched.get(session_id, 0) >= TOUCH_INTERVAL:
+            db_connection.execute('UPDATE session SET accessed = ? WHERE id = ? AND accessed > ?',
+                                  (now, session_id, now - self.ttl))
+        self._touched[session_id] = now
+
+    def _cache_put(self, cache_key, version, size, value):
+        with self._lock:
+            if cache_key in self._cache:
+                self._cache_size -= self._cache.pop(cache_key)[1]
+            self._cache[cache_key] = (version, size, value)
+            self._cache_size += size
+            while self._cache_size > self.cache_bytes and len(self._cache) > 1:
+                self._cache_size -= self._cache.popitem(last=False)[1][1]
+
+    def _cache_drop(self, session_id, names=None):
+        with self._lock:
+            for cache_key in [cache_key for cache_key in self._cache if cache_key[0] == session_id
+                              and (names is None or cache_key[1] in names)]:
+                self._cache_size -= self._cache.pop(cache_key)[1]
+
+    def _read(self, session_id, name):
+        """Returns (True, object) for a stored object, (False, None) if the session or the object do not exist
+        (anymore). Objects are only unpickled if this process has not read the same version before."""
+        self._open()
+        now = time.time()
+        cache_key = (session_id, name)
+        with self._connect() as db_connection:
+            row = db_connection.execute('SELECT item.version, item.size FROM item JOIN session '
+                                        'ON session.id = item.session_id WHERE item.session_id = ? AND item.name = ? '
+                                        'AND session.accessed > ?', (session_id, name, now - self.ttl)).fetchone()
+            if row is None:
+                return False, None
+            self._touch(db_connection, session_id, now)
+            with self._lock:
+                cached = self._cache.get(cache_key)
+                if cached is not None and cached[0] == row[0]:
+                    self._cache.move_to_end(cache_key)
+                    return True, cached[2]
+            blob = db_connection.execute('SELECT value FROM item WHERE session_id = ? AND name = ? AND version = ?',
+                                         (session_id, name, row[0])).fetchone()
+        if blob is None:  # Replaced by another process in the meantime
+            return self._read(session_id, name)
+        value = pickle.loads(blob[0])
+        self._cache_put(cache_key, row[0], row[1], value)
+        return True, value
+
+    def _evict(self, db_connection, now):
+        """Discards expired sessions, then least recently used sessions until the store fits in `max_bytes`."""
+        expired = [row[0] for row in db_connection.execute('SELECT id FROM session WHERE accessed <= ?',
+                                                            (now - self.ttl,))]
+        size = db_connection.execute('SELECT COALESCE(SUM(item.size), 0) FROM item JOIN session '
+                                     'ON session.id = item.session_id WHERE accessed > ?',
+                                     (now - self.ttl,)).fetchone()[0]
+        if size > self.max_bytes:
+            sessions = db_connection.execute('SELECT session.id, COALESCE(SUM(item.size), 0) FROM session '
+                                             'LEFT JOIN item ON item.session_id = session.id WHERE accessed > ? '
+                                             'GROUP BY session.id ORDER BY session.accessed',
+                                             (now - self.ttl,)).fetchall()
+            for session_id, session_size in sessions[:-1]:  # The most recently used session is kept
+                if size <= self.max_bytes:
+                    break
+                expired.append(session_id)
+                size -= session_size
+        for session_id in expired:
+            self._delete_session(db_connection, session_id)
+        for session_id in [session_id for session_id, touched in self._touched.items() if touched <= now - self.ttl]:
+            del self._touched[session_id]
+
+    def _delete_session(self, db_connection, session_id):
+        db_connection.execute('DELETE FROM item WHERE session_id = ?', (session_id,))
+        db_connection.execute('DELETE FROM session WHERE id = ?', (session_id,))
+        self._cache_drop(session_id)
+        self._touched.pop(session_id, None)
+
+    def get(self, session_id, name, default=None):
+        """Returns a stored object, or the default value if the session or the object do not exist (anymore)."""
+        found, value = self._read(session_id, name)
+        with self._lock:
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            return default
+
+    def put(self, session_id, **items):
+        """Stores objects in a session, replacing previous objects with the same names."""
+        self._open()
+        now = time.time()
+        blobs = {name: pickle.dumps(value, pickle.HIGHEST_PROTOCOL) for name, value in items.items()}
+        version = time.time_ns()
+        with self._connect() as db_connection:
+            db_connection.execute('BEGIN IMMEDIATE')
+            if db_connection.execute('SELECT 1 FROM session WHERE id = ? AND accessed <= ?',
+                                     (session_id, now - self.ttl)).fetchone() is not None:
+                self._delete_session(db_connection, session_id)  # Expired sessions start empty
+            self._touch(db_connection, session_id, now, create=True)
+            db_connection.executemany('INSERT OR REPLACE INTO item (session_id, name, version, value, size) '
+                                      'VALUES (?, ?, ?, ?, ?)', [(session_id, name, version, blob, len(blob))
+                                                                 for name, blob in blobs.items()])
+            self._evict(db_connection, now)
+        for name, value in items.items():
+            self._cache_put((session_id, name), version, len(blobs[name]), value)
+
+    def memoize(self, session_id, name, key, compute):
+        """Returns an object derived from the session data, calling `compute` only if the object is missing or was
+        derived for a different key (e.g. a previous network)."""
+        memo = self.get(session_id, name)
+        if memo is not None and memo[0] == key:
+            return memo[1]
+        value = compute()
+        self.put(session_id, **{name: (key, value)})
+        return value
+
+    def lookup(self, session_id, name, key, default=None):
+        """Returns an object stored by `memoize` for the given key, or the default value (nothing is computed)."""
+        memo = self.get(session_id, name)
+        return memo[1] if memo is not None and memo[0] == key else default
+
+    def delete(self, session_id, *names):
+        """Removes stored objects."""
+        self._open()
+        with self._connect() as db_connection:
+            db_connection.executemany('DELETE FROM item WHERE session_id = ? AND name = ?',
+                                      [(session_id, name) for name in names])
+        self._cache_drop(session_id, names)
+
+    def clear(self, session_id):
+        """Removes all the objects stored in a session."""
+        self._open()
+        with self._connect() as db_connection:
+            self._delete_session(db_connection, session_id)
+
+    def stats(self):
+        """Returns the number of live sessions and the bytes they use (in all server processes), and the lookup
+        counts of this process."""
+        self._open()
+        with self._connect() as db_connection:
+            sessions, size = db_connection.execute(
+                'SELECT COUNT(DISTINCT session.id), COALESCE(SUM(item.size), 0) FROM session '
+                'LEFT JOIN item ON item.session_id = session.id WHERE session.accessed > ?',
+                (time.time() - self.ttl,)).fetchone()
+        with self._lock:
+            return {'sessions': sessions, 'bytes': size, 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,99 @@
+import base64
+from collections import OrderedDict
+import hashlib
+import io
+import threading
+
+import numpy as np
+import pandas as pd
+
+UPLOAD_CACHE_SIZE = 32  # Number of parsed uploads kept in memory
+SIGNIFICANT_FIGURES = 3  # Significant figures shown for p-values
+EXCEL_EXTENSIONS = ('.xls', '.xlsx')
+TAB_EXTENSIONS = ('.tsv', '.tab', '.txt')
+
+
+def round_sigfigs(values, sigfigs=SIGNIFICANT_FIGURES):
+    """Rounds an array of numbers to a number of significant figures. Formatting in scientific notation and parsing
+    the result back gives the closest float to the rounded number, even for the tiny p-values of large datasets."""
+    values = np.asarray(values, dtype=float)
+    return np.char.mod('%.{}e'.format(sigfigs - 1), values).astype(float)
+
+
+def _read_table(data, filename):
+    """Reads a CSV, TSV (optionally gzip-compressed) or Excel file into a DataFrame."""
+    name = (filename or '').lower()
+    compression = None
+    if name.endswith('.gz'):
+        compression = 'gzip'
+        name = name[:-len('.gz')]
+    if name.endswith(EXCEL_EXTENSIONS):
+        return pd.read_excel(io.BytesIO(data))
+    return pd.read_csv(io.BytesIO(data), sep='\t' if name.endswith(TAB_EXTENSIONS) else ',',
+                       compression=compression)
+
+
+def _clean_table(df):
+    """Types the columns of a gene table: gene names as strings, numbers rounded for display."""
+    df[df.columns[0]] = df[df.columns[0]].astype(str).str.strip()
+    p_values = [col for col in df.columns if col in ['pvalue', 'padj']]
+    for col in p_values:
+        df[col] = round_sigfigs(pd.to_numeric(df[col], errors='coerce'))
+    others = [col for col in df.select_dtypes(include='number').columns if col not in p_values]
+    df[others] = df[others].round(2)
+    return df
+
+
+class UploadCache:
+    """Least recently used cache of parsed uploads keyed by a hash of their contents, so an upload is only decoded and
+    parsed once for the upload message and the network build."""
+
+    def __init__(self, max_size=UPLOAD_CACHE_SIZE):
+        self.max_size = max_size
+        self._tables = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, parse):
+        """Returns a copy of the table cached for a key, parsing it with `parse()` first if needed."""
+        with self._lock:
+            df = self._tables.get(key)
+            if df is not None:
+                self.hits += 1
+                self._tables.move_to_end(key)
+                return df.copy()
+            self.misses += 1
+        df = parse()  # Parsed outside of the lock, identical concurrent uploads are at worst parsed twice
+        with self._lock:
+            self._tables[key] = df
+            self._tables.move_to_end(key)
+            while len(self._tables) > self.max_size:
+                self._tables.popitem(last=False)
+        return df.copy()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._tables), 'hits': self.hits, 'misses': self.misses}
+
+
+upload_cache = UploadCache()
+
+
+def read_upload(contents, filename):
+    """Returns the gene table of an upload (a dcc.Upload data URL) as a DataFrame. Raises ValueError if the file can
+    not be read."""
+    content_string = contents.split(',', 1)[1]
+    key = hashlib.sha1('{}\0{}'.format(filename, content_string).encode()).hexdigest()
+
+    def parse():
+        try:
+            return _clean_table(_read_table(base64.b64decode(content_string), filename))
+        except Exception as error:  # Wrong encoding, compression or spreadsheet format
+            raise ValueError(str(error)) from error
+    return upload_cache.get(key, parse)
+
+
+def read_example(path):
+    """Returns the gene table of an example data file as a DataFrame."""
+    return upload_cache.get(path, lambda: _clean_table(pd.read_csv(path)))
@@ -1,3 +1,8 @@
+import json
+import os
+
+JS_ASSET_PATH = os.path.join(os.path.dirname(__file__), 'assets', 'vis_stylesheets.js')
+
 default = [
     {
         'selector': 'node',
@@ -10,6 +15,13 @@ default = [
             'font-size': 22,
         }
     },
+    {
+        # Robust subnetworks: nodes and edges found in fewer parameter sweep runs are fainter
+        'selector': 'node[frequency]',
+        'style': {
+            'opacity': 'mapData(frequency, 0, 1, 0.3, 1)'
+        }
+    },
     {
         'selector': ':selected',
         'style': {
@@ -28,6 +40,30 @@ default = [
         'style': {
             'width': '2'
         }
+    },
+    {
+        'selector': 'edge[frequency]',
+        'style': {
+            'width': 'mapData(frequency, 0, 1, 1, 5)'
+        }
+    },
+    {
+        # Collapsed communities of large networks, sized by their number of genes
+        'selector': '.supernode',
+        'style': {
+            'width': 'mapData(size, 1, 500, 30, 150)',
+            'height': 'mapData(size, 1, 500, 30, 150)',
+            'background-color': '#c2c2c2',  # gray
+            'label': 'data(label)',
+            'text-valign': 'center'
+        }
+    },
+    {
+        # Aggregated edges between communities, sized by their number of interactions
+        'selector': 'edge[weight]',
+        'style': {
+            'width': 'mapData(weight, 1, 50, 1, 10)'
+        }
     }
 ]
 
@@ -90,4 +126,18 @@ def add_labels(stylesheet):
     return new_stylesheet
 
 
+def write_js_asset(path=JS_ASSET_PATH):
+    """Writes the stylesheets as a JS asset, used by the clientside stylesheet callback (see assets/vis_callbacks.js).
+    Run after changing the stylesheets."""
+    stylesheets = {'default': default,
+                   'fold_change': fold_change,
+                   'combined': combined,
+                   'labels': add_labels([])}
+    with open(path, 'w') as js_file:
+        js_file.write('// Generated by `python -m dash_app.vis_stylesheets` from vis_stylesheets.py, do not edit.\n')
+        js_file.write('window.PAINTDB_STYLESHEETS = {};\n'.format(json.dumps(stylesheets, indent=2)))
+
+
+if __name__ == '__main__':
+    write_js_asset()
 
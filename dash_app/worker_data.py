@@ -0,0 +1,30 @@
+"""Read-only data used by the computations running in worker processes (see dash_app.processes). The forkserver
+imports this module before forking the workers, so the data is loaded once per server process and shared by every
+worker. Steps that fail are reported in `load_errors` and loaded again on first use."""
+import bio_networks.pcsf as pcsf
+from go_enrichment.go_enrichment import load_background_genes, load_go_data, load_ortholog_mapping
+
+STRAINS = ('PAO1', 'PA14')
+
+
+def _loading_steps():
+    """Yields (name, loader) pairs for the data used by the workers."""
+    yield 'GO data', load_go_data
+    yield 'ortholog map', load_ortholog_mapping
+    for strain in STRAINS:
+        yield '{} GO background'.format(strain), lambda strain=strain: load_background_genes(strain)
+        yield '{} PCSF graph'.format(strain), lambda strain=strain: pcsf.get_graph(strain)
+
+
+def load():
+    """Loads the worker data and returns the error messages of the steps that failed, by step name."""
+    errors = dict()
+    for name, loader in _loading_steps():
+        try:
+            loader()
+        except Exception as error:
+            errors[name] = '{}: {}'.format(type(error).__name__, error)
+    return errors
+
+
+load_errors = load()
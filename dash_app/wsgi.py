@@ -0,0 +1,70 @@
+"""Production entry point for WSGI servers, e.g.:
+
+    gunicorn --preload --workers 4 --threads 8 --timeout 120 --bind 0.0.0.0:8050 dash_app.wsgi:server
+
+User sessions (dash_app.session_store) and background jobs (dash_app.jobs) are kept in SQLite databases under
+instance/, shared by every worker process, so any worker can handle any request. Workers add concurrency on top of the
+threads, and the CPU-heavy work (layouts, PCSF, GO term enrichment) runs in separate processes (dash_app.processes).
+The shared read-only data (interactomes, node attributes, layouts and ortholog map) is loaded before the first
+request, or once by the gunicorn master with --preload, whose forked workers share it copy-on-write. The PCSF graphs
+and GO data are only loaded by the forkserver of each worker's computation processes (dash_app.worker_data).
+"""
+import os
+import threading
+import time
+
+from flask import jsonify
+
+from bio_networks.interactome import get_interactome
+from dash_app.index import app, server  # Registers the layout and callbacks
+from dash_app.layouts import load_global_layout
+from go_enrichment.go_enrichment import load_ortholog_mapping
+
+STRAINS = ('PAO1', 'PA14')
+# 'preload': load before serving (and before forking with --preload), 'background': load in a thread while serving
+# (earlier requests load what they need themselves), 'off': load on first use
+WARMUP = os.environ.get('PAINTDB_WARMUP', 'preload')
+
+_warmup_state = {'ready': False, 'seconds': None, 'errors': dict()}
+_warmup_lock = threading.Lock()
+
+
+def _warmup_steps():
+    """Yields (name, loader) pairs for the shared data used by the callbacks."""
+    yield 'ortholog map', load_ortholog_mapping
+    for strain in STRAINS:
+        yield '{} interactome'.format(strain), lambda strain=strain: get_interactome(strain)
+        yield '{} layout'.format(strain), lambda strain=strain: load_global_layout(strain)
+
+
+def warmup():
+    """Loads the shared data before requests arrive. Failed steps are reported by /ready and loaded again on first
+    use."""
+    with _warmup_lock:
+        if _warmup_state['ready']:
+            return
+        start = time.monotonic()
+        for name, loader in _warmup_steps():
+            try:
+                loader()
+            except Exception as error:
+                _warmup_state['errors'][name] = '{}: {}'.format(type(error).__name__, error)
+        _warmup_state['seconds'] = round(time.monotonic() - start, 1)
+        _warmup_state['ready'] = True
+
+
+@server.route('/ready')
+def ready():
+    """Readiness probe: 200 once the shared data is loaded, 503 before."""
+    return jsonify(_warmup_state), 200 if _warmup_state['ready'] else 503
+
+
+if WARMUP == 'preload':
+    warmup()
+elif WARMUP == 'background':
+    threading.Thread(target=warmup, name='warmup', daemon=True).start()
+else:
+    _warmup_state['ready'] = True
+
+if __name__ == '__main__':
+    app.run_server()
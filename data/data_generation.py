@@ -3,6 +3,7 @@ import json
 import os
 import pickle
 import sqlite3
+import sys
 
 import pandas as pd
 
@@ -80,3 +81,20 @@ def make_go_association_dict():
         pickle.dump(go_dict, f)
 
     return go_dict
+
+
+def make_global_layout(strain, iterations=200):
+    """Computes 2D coordinates for every interactor in the strain's interactome, so that the app can place the nodes
+    of any network by lookup instead of computing a new layout."""
+    # Imported here so that the rest of the script runs without the app's dependencies, even when it is started
+    # from inside data/.
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from dash_app.layouts import force_directed_layout
+
+    interactome_df = pd.read_csv(os.path.join('data', '{}_interactome.tsv'.format(strain)), sep='\t', index_col=0)
+    nodes = pd.unique(interactome_df[['protein1', 'protein2']].values.ravel()).tolist()
+    edges = list(zip(interactome_df['protein1'], interactome_df['protein2']))
+    positions = force_directed_layout(nodes, edges, iterations=iterations)
+    layout_df = pd.DataFrame.from_dict(positions, orient='index', columns=['x', 'y'])
+    layout_df.to_csv(os.path.join('data', '{}_layout.tsv'.format(strain)), sep='\t')
+    return layout_df
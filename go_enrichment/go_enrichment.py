@@ -1,12 +1,10 @@
 import pandas as pd
+import copy
 import csv
+from functools import lru_cache
 import os
 import pickle
 
-from goatools.base import download_go_basic_obo
-from goatools.obo_parser import GODag
-from goatools.goea.go_enrichment_ns import GOEnrichmentStudyNS
-
 
 def get_genes(path):
     """Returns a list of genes from a DE results table"""
@@ -20,51 +18,86 @@ def get_enrichment_results(enrichment_results):
     """Returns a dataFrame of the enrichment results."""
     fields = ['id', 'name', 'namespace', 'enrichment', 'ratio_in_study', 'ratio_in_pop', 'p_fdr_bh', 'study_count',
               'study_items']
-    enrichment_results = [go_term.get_field_values(fldnames=fields) for go_term in enrichment_results]
-    enrichment_results_df = pd.DataFrame.from_records(enrichment_results, columns=fields)
-    # enrichment_results_df.study_items = enrichment_results_df.study_items.str.split(", ")
+    enrichment_results_df = pd.DataFrame.from_records(
+        [go_term.get_field_values(fldnames=fields) for go_term in enrichment_results], columns=fields)
+    # Keep study items as lists instead of the comma-joined strings used for reports
+    enrichment_results_df['study_items'] = [sorted(go_term.study_items) for go_term in enrichment_results]
     return enrichment_results_df
 
 
-def map_pa14_genes(gene_list):
-    """Takes a list of PA14 genes and returns the corresponding PAO1 names."""
-    pao1_pa14_mapping = dict()
+@lru_cache(maxsize=None)
+def load_ortholog_mapping():
+    """Returns (PA14 -> PAO1, PAO1 -> PA14) ortholog dictionaries. The mapping file is only read once."""
+    pa14_to_pao1 = dict()
+    pao1_to_pa14 = dict()
     mapping_path = os.path.join(os.getcwd(), 'data', 'ortholuge_pa14_to_pao1_20190708.tsv')
     with open(mapping_path) as mapping:
         reader = csv.reader(mapping, delimiter='\t')
         for row in reader:
-            pao1_pa14_mapping[row[10]] = row[4]
+            pa14_to_pao1[row[10]] = row[4]
+            pao1_to_pa14[row[4]] = row[10]
+    return pa14_to_pao1, pao1_to_pa14
+
 
-    pao1_genes = [pao1_pa14_mapping[gene] for gene in gene_list if gene in pao1_pa14_mapping.keys()]
-    return pao1_genes
+def map_pa14_genes(gene_list):
+    """Takes a list of PA14 genes and returns the corresponding PAO1 names."""
+    pa14_to_pao1 = load_ortholog_mapping()[0]
+    return [pa14_to_pao1[gene] for gene in gene_list if gene in pa14_to_pao1]
 
 
 def map_pao1_genes(gene_list):
     """Takes a list of PAO1 genes and returns the corresponding PA14 names."""
-    pa14_pao1_mapping = dict()
-    mapping_path = os.path.join(os.getcwd(), 'data', 'ortholuge_pa14_to_pao1_20190708.tsv')
-    with open(mapping_path) as mapping:
-        reader = csv.reader(mapping, delimiter='\t')
-        for row in reader:
-            pa14_pao1_mapping[row[4]] = row[10]
-
-    pa14_genes = [pa14_pao1_mapping[gene] for gene in gene_list if gene in pa14_pao1_mapping.keys()]
-    return pa14_genes
-
+    pao1_to_pa14 = load_ortholog_mapping()[1]
+    return [pao1_to_pa14[gene] for gene in gene_list if gene in pao1_to_pa14]
+
+
+def map_terms_to_nodes(enrichment_results, strain, nodes):
+    """Returns a list with the network node indices (positions in the network's node order) of the study items of
+    every enriched term. Study items are PAO1 locus tags, so they are mapped to PA14 first if needed."""
+    node_indices = {node: i for i, node in enumerate(nodes)}
+    pao1_to_pa14 = load_ortholog_mapping()[1] if strain == 'PA14' else None
+    term_indices = []
+    for study_items in enrichment_results['study_items']:
+        if pao1_to_pa14 is not None:
+            study_items = [pao1_to_pa14[gene] for gene in study_items if gene in pao1_to_pa14]
+        term_indices.append(sorted(node_indices[gene] for gene in study_items if gene in node_indices))
+    return term_indices
+
+
+@lru_cache(maxsize=None)
+def load_go_data():
+    """Returns the GO term associations and the GO DAG. They are only read once and must not be modified."""
+    # goatools is imported on first use, so pages that don't run enrichments start faster
+    from goatools.base import download_go_basic_obo
+    from goatools.obo_parser import GODag
 
-def run_go_enrichment(strain, genes_of_interest, significant=True, cutoff=0.05,
-                      use_parent_terms=True):
     # Load GO term association dictionary
     with open(os.path.join('data', 'go_association.pickle'), 'rb') as handle:
         go_association = pickle.load(handle)
+    download_go_basic_obo()
+    obo_dag = GODag('go-basic.obo')
+    return go_association, obo_dag
 
+
+@lru_cache(maxsize=None)
+def load_background_genes(strain):
+    """Returns the (PAO1) background genes of a strain for GO term enrichment."""
     background_genes = get_genes(os.path.join('data', strain + '_all_genes.csv'))
-    obo_go_fname = download_go_basic_obo()
-    obo_dag = GODag('go-basic.obo')
+    if strain == 'PA14':
+        background_genes = map_pa14_genes(background_genes)
+    return tuple(background_genes)
+
+
+def run_go_enrichment(strain, genes_of_interest, significant=True, cutoff=0.05,
+                      use_parent_terms=True):
+    from goatools.goea.go_enrichment_ns import GOEnrichmentStudyNS
+
+    go_association, obo_dag = load_go_data()
+    go_association = copy.deepcopy(go_association)  # goatools adds the parent terms to the associations in place
+    background_genes = list(load_background_genes(strain))
 
     if strain == 'PA14':
         genes_of_interest = map_pa14_genes(genes_of_interest)
-        background_genes = map_pa14_genes(background_genes)
 
     goea_obj = GOEnrichmentStudyNS(background_genes, go_association, obo_dag,
                                    propagate_counts=use_parent_terms,
@@ -79,3 +112,20 @@ def run_go_enrichment(strain, genes_of_interest, significant=True, cutoff=0.05,
     return [enrichment_results, goea_results]
 
 
+
+
+def find_overrepresented_terms(strain, genes_of_interest):
+    """Returns the significantly overrepresented GO terms of a gene list (underrepresented terms are removed)."""
+    enrichment_results = run_go_enrichment(strain, genes_of_interest)[0]
+    return enrichment_results.loc[enrichment_results['enrichment'] == 'e', :].copy()
+
+
+def enrich_network(job, strain, enrichment_genes, network_nodes):
+    """Background job (see dash_app.jobs) running the GO term enrichment of a network. The enrichment runs in a worker
+    process, which starts with the GO data loaded and is stopped if the job is cancelled."""
+    job.report('Running GO term enrichment', 0.1)
+    enrichment_results = job.run_in_process(find_overrepresented_terms, strain, enrichment_genes)
+    # Prebuild the term -> node indices mapping used by the GO term filter
+    job.report('Mapping GO terms to network genes', 0.9)
+    enrichment_results['node_indices'] = map_terms_to_nodes(enrichment_results, strain, network_nodes)
+    return enrichment_results
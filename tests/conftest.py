@@ -0,0 +1,4 @@
+import os
+
+# Worker processes load their data on first use in tests, instead of preloading the app's data files
+os.environ.setdefault('PAINTDB_WORKER_PRELOAD', '')
@@ -0,0 +1,50 @@
+import json
+import threading
+import time
+
+import flask
+import pandas as pd
+import pytest
+
+pytest.importorskip('dash')
+
+from dash_app import api
+from dash_app.jobs import JobQueue
+
+released = threading.Event()
+
+
+def find_terms(job):
+    released.wait(10)
+    return pd.DataFrame({'GO_term': ['iron ion transport'], 'p_fdr_bh': [0.01], 'node_indices': [[0]]})
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, 'job_queue', JobQueue('api', db_path=str(tmp_path / 'jobs.db')))
+    server = flask.Flask(__name__)  # Without the Dash app, which needs its layout to serve requests
+    server.register_blueprint(api.api)
+    return server.test_client()
+
+
+def test_results_are_polled_until_the_job_is_done(client):
+    released.clear()
+    job_id = api.job_queue.submit('terms', find_terms)
+    url = '/api/v1/networks/network/enrichment/{}'.format(job_id)
+    response = client.get(url)
+    assert response.status_code == 202
+    assert response.headers['Location'].endswith(url) and int(response.headers['Retry-After']) >= 1
+    assert response.get_json()['id'] == job_id
+    released.set()
+    deadline = time.monotonic() + 10
+    while response.status_code == 202 and time.monotonic() < deadline:
+        time.sleep(0.05)
+        response = client.get(url)
+    assert response.status_code == 200 and response.mimetype == api.NDJSON_MIMETYPE
+    assert [json.loads(line) for line in response.get_data(as_text=True).splitlines()] == [
+        {'GO_term': 'iron ion transport', 'p_fdr_bh': 0.01, 'type': 'term'}]
+
+
+def test_unknown_jobs_and_networks(client):
+    assert client.get('/api/v1/networks/unknown').status_code == 404
+    assert client.post('/api/v1/networks/unknown/enrichment', json={}).status_code == 404
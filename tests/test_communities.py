@@ -0,0 +1,44 @@
+import networkx as nx
+import pytest
+
+from dash_app import communities
+from dash_app.communities import CommunityView, SUPERNODE_PREFIX
+
+pytest.importorskip('community')
+
+
+@pytest.fixture
+def view():
+    # Three cliques of five genes joined in a ring
+    network = nx.relabel_nodes(nx.connected_caveman_graph(3, 5), lambda node: 'PA{:04d}'.format(node))
+    cyto_network = {'nodes': [{'data': {'id': node}, 'position': {'x': int(node[2:]) * 10, 'y': 0}}
+                              for node in network],
+                    'edges': [{'data': {'source': u, 'target': v}} for u, v in network.edges]}
+    return CommunityView(network, cyto_network)
+
+
+def test_collapsed_communities(view):
+    assert sorted(len(members) for members in view.members.values()) == [5, 5, 5]
+    elements = view.elements()
+    assert all(node['data']['id'].startswith(SUPERNODE_PREFIX) for node in elements['nodes'])
+    assert len(elements['nodes']) == 3
+    # Edges between communities are aggregated, edges inside them are hidden
+    assert sorted(edge['data']['weight'] for edge in elements['edges']) == [1, 1, 1]
+
+
+def test_expanded_community(view):
+    community = view.partition['PA0000']
+    elements = view.elements([community])
+    node_ids = {node['data']['id'] for node in elements['nodes']}
+    assert set(view.members[community]) <= node_ids
+    assert len(node_ids) == 5 + 2
+    assert view.selected_ids(['PA0000', 'PA0007'], [community]) == \
+        sorted(['PA0000', SUPERNODE_PREFIX + str(view.partition['PA0007'])])
+
+
+def test_expand_collapses_first_communities(view, monkeypatch):
+    monkeypatch.setattr(communities, 'MAX_EXPANDED_NODES', 10)
+    first, second, third = sorted(view.members)
+    assert view.expand([first], second) == [first, second]
+    assert view.expand([first, second], third) == [second, third]
+    assert view.expand([first, second], first) == [second, first]
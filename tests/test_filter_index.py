@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dash_app.filter_index import FilterIndex
+
+
+@pytest.fixture
+def network_df():
+    return pd.DataFrame({'shortName': ['dnaA', 'PA0002', 'gyrB', 'lasR', 'rhlR', 'PA0006'],
+                         'localization': ['Cytoplasmic', 'Cytoplasmic', 'Outer Membrane', 'Periplasmic',
+                                          'Cytoplasmic', 'Outer Membrane'],
+                         'regulation': ['up', 'down', 'up', None, 'down', 'up'],
+                         'log2FoldChange': [2.5, -1.0, 0.5, np.nan, -3.0, 1.5],
+                         'padj': [0.001, 0.04, 0.2, np.nan, 1e-10, 0.01]},
+                        index=['PA0001', 'PA0002', 'PA0004', 'PA1430', 'PA3477', 'PA0006'])
+
+
+@pytest.fixture
+def enrichment_results():
+    return pd.DataFrame({'name': ['quorum sensing', 'DNA replication'], 'node_indices': [[3, 4], [0, 2]]})
+
+
+def test_attribute_filters_match_query(network_df):
+    index = FilterIndex(network_df)
+    selected = index.select(filters={'localization': ['Cytoplasmic', 'Periplasmic'], 'regulation': ['down']})
+    expected = network_df.query('localization in ["Cytoplasmic", "Periplasmic"] and regulation == "down"')
+    assert selected == expected.index.tolist()
+
+
+def test_ranges_match_query(network_df):
+    index = FilterIndex(network_df)
+    selected = index.select(ranges={'absLog2FoldChange': (1, 2.5), 'padj': (None, 0.05)})
+    expected = network_df[network_df['log2FoldChange'].abs().between(1, 2.5)].query('padj <= 0.05')
+    assert selected == expected.index.tolist()
+    assert index.bounds('absLog2FoldChange') == (0.5, 3.0)
+
+
+def test_terms_and_names(network_df, enrichment_results):
+    index = FilterIndex(network_df, enrichment_results)
+    assert index.select(filters={'terms': ['quorum sensing']}) == ['PA1430', 'PA3477']
+    # Nodes selected by short name or locus tag are added to the filtered nodes
+    assert index.select(names=['gyrB', 'PA0006'], filters={'terms': ['quorum sensing']}) == \
+        ['PA0004', 'PA1430', 'PA3477', 'PA0006']
+
+
+def test_empty_and_unknown_filters(network_df):
+    index = FilterIndex(network_df)
+    assert index.select() == []
+    assert index.select(filters={'localization': ['Extracellular']}) == []
+    assert index.select(filters={'significanceSource': ['TnSeq']}) == []  # Not a column of this network
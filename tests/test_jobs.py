@@ -0,0 +1,121 @@
+import multiprocessing
+import time
+
+import pytest
+
+pytest.importorskip('dash')
+
+from dash_app import jobs
+from dash_app.jobs import CANCELLED, DONE, FINISHED, INTERRUPTED, JobQueue, RUNNING
+
+
+def add(job, a, b):
+    job.report('Adding', 0.5)
+    return a + b
+
+
+def fail(job):
+    raise ValueError('bad input')
+
+
+def sleep_in_process(job, seconds):
+    return job.run_in_process(time.sleep, seconds)
+
+
+def wait_for(queue, job_id, statuses, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = queue.status(job_id)
+        if status['status'] in statuses:
+            return status
+        time.sleep(0.05)
+    raise AssertionError('Job still {} after {} s'.format(queue.status(job_id)['status'], timeout))
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'jobs.db')
+
+
+def test_jobs_run_and_identical_jobs_are_shared(db_path):
+    queue = JobQueue(max_workers=2, db_path=db_path)
+    job_id = queue.submit(('add', 1, 2), add, 1, 2)
+    assert queue.submit(('add', 1, 2), add, 1, 2) == job_id
+    assert wait_for(queue, job_id, FINISHED)['status'] == DONE
+    assert queue.result(job_id) == 3
+    assert queue.submit(('add', 1, 2), add, 1, 2) == job_id  # Done recently
+    failed_id = queue.submit('fail', fail)
+    assert wait_for(queue, failed_id, FINISHED)['error'] == 'ValueError: bad input'
+    assert queue.result(failed_id) is None and queue.status('unknown') is None
+
+
+def test_job_functions_must_be_importable(db_path):
+    with pytest.raises(ValueError):
+        JobQueue(db_path=db_path).submit('lambda', lambda job: None)
+
+
+def test_database_is_opened_on_first_use(tmp_path):
+    db_path = tmp_path / 'instance' / 'jobs.db'
+    queue = JobQueue(db_path=str(db_path))
+    assert not db_path.exists()
+    queue.status('unknown')
+    assert db_path.exists()
+
+
+def test_cancel_stops_running_worker_process(db_path):
+    queue = JobQueue(max_workers=1, db_path=db_path)
+    job_id = queue.submit('sleep', sleep_in_process, 60)
+    queued_id = queue.submit('add', add, 1, 2)  # Waits for the sleeping job
+    wait_for(queue, job_id, [RUNNING])
+    queue.cancel(queued_id)
+    assert queue.status(queued_id)['status'] == CANCELLED
+    start = time.monotonic()
+    queue.cancel(job_id)
+    assert wait_for(queue, job_id, FINISHED)['status'] == CANCELLED
+    assert time.monotonic() - start < 5
+    assert queue.submit('sleep', sleep_in_process, 0) != job_id  # Cancelled jobs are not reused
+
+
+def test_jobs_are_resumed_after_a_restart(db_path, monkeypatch):
+    stopped = JobQueue(max_workers=0, db_path=db_path)  # Server stopped before running its jobs
+    queued_id = stopped.submit('queued', add, 1, 2)
+    running_id = stopped.submit('running', add, 3, 4)
+    retried_id = stopped.submit('retried', add, 5, 6)
+    with stopped._connect() as db_connection:
+        db_connection.execute('UPDATE job SET status = ?, owner = ?, attempts = 1 WHERE id = ?',
+                              (RUNNING, 'host:1', running_id))
+        db_connection.execute('UPDATE job SET status = ?, owner = ?, attempts = ? WHERE id = ?',
+                              (RUNNING, 'host:1', jobs.MAX_ATTEMPTS, retried_id))
+    monkeypatch.setattr(jobs.socket, 'gethostname', lambda: 'host')
+    monkeypatch.setattr(jobs, '_process_alive', lambda pid: False)
+
+    restarted = JobQueue(db_path=db_path)
+    assert restarted.status(retried_id)['status'] == INTERRUPTED
+    assert wait_for(restarted, queued_id, FINISHED)['status'] == DONE
+    assert wait_for(restarted, running_id, FINISHED)['status'] == DONE
+    assert restarted.result(queued_id) == 3 and restarted.result(running_id) == 7
+
+
+def test_queues_sharing_a_database_run_their_own_jobs(db_path):
+    stopped = JobQueue('api', max_workers=0, db_path=db_path)
+    api_id = stopped.submit(('add', 1, 2), add, 1, 2)
+    queue = JobQueue(db_path=db_path)
+    job_id = queue.submit(('add', 1, 2), add, 1, 2)
+    assert job_id != api_id
+    assert wait_for(queue, job_id, FINISHED)['status'] == DONE
+    assert queue.active() == 0 and stopped.active() == 1
+    assert queue.status(api_id) is None and stopped.status(api_id)['status'] == 'queued'
+
+
+def run_queued_jobs(db_path, job_id):
+    wait_for(JobQueue(db_path=db_path), job_id, FINISHED)
+
+
+def test_jobs_are_shared_by_server_processes(db_path):
+    queue = JobQueue(max_workers=0, db_path=db_path)  # Only submits, another worker process runs the job
+    job_id = queue.submit(('add', 2, 3), add, 2, 3)
+    process = multiprocessing.get_context('spawn').Process(target=run_queued_jobs, args=(db_path, job_id))
+    process.start()
+    process.join(30)
+    assert process.exitcode == 0
+    assert queue.status(job_id)['status'] == DONE and queue.result(job_id) == 5
@@ -0,0 +1,137 @@
+import time
+
+import networkx as nx
+import numpy as np
+
+from dash_app import layouts
+from dash_app.layouts import (compute_layout, concentric_layout, force_directed_layout, global_layout, graph_hash,
+                              inherit_positions, LayoutCache, NODE_SPACING, run_layout_engine)
+
+
+def slow_layout(nodes, edges):
+    time.sleep(60)
+
+
+def failing_layout(nodes, edges):
+    raise RuntimeError('layout failed')
+
+
+def test_graph_hash_ignores_insertion_order():
+    network = nx.Graph([('a', 'b'), ('b', 'c')])
+    reordered = nx.Graph()
+    reordered.add_nodes_from(['c', 'b', 'a'])
+    reordered.add_edges_from([('c', 'b'), ('b', 'a')])
+    assert graph_hash(network, 'graphviz') == graph_hash(reordered, 'graphviz')
+    assert graph_hash(network, 'graphviz') != graph_hash(network, 'concentric')
+    assert graph_hash(network, 'graphviz') != graph_hash(nx.Graph([('a', 'b'), ('a', 'c')]), 'graphviz')
+
+
+def test_layout_cache_evicts_least_recently_used():
+    cache = LayoutCache(max_size=2, cache_dir=None)
+    cache.put('first', {'a': (0, 0)})
+    cache.put('second', {'a': (1, 1)})
+    assert cache.get('first') == {'a': (0.0, 0.0)}
+    cache.put('third', {'a': (2, 2)})  # Evicts 'second', used less recently than 'first'
+    assert cache.get('second') is None
+    assert cache.get('first') is not None and cache.get('third') is not None
+    assert cache.stats() == {'size': 2, 'hits': 3, 'misses': 1}
+
+
+def test_layout_cache_persists_to_disk(tmp_path):
+    LayoutCache(cache_dir=str(tmp_path)).put('key', {'a': (1.5, -2)})
+    assert LayoutCache(cache_dir=str(tmp_path)).get('key') == {'a': (1.5, -2.0)}
+
+
+def _spread(positions):
+    xs = [x for x, _ in positions.values()]
+    ys = [y for _, y in positions.values()]
+    return max(xs) - min(xs), max(ys) - min(ys)
+
+
+def test_force_directed_layout_places_neighbors_closer():
+    network = nx.connected_caveman_graph(4, 6)
+    positions = force_directed_layout(network.nodes, network.edges)
+    assert set(positions) == set(network.nodes)
+    assert all(np.isfinite(position).all() for position in positions.values())
+
+    def mean_distance(pairs):
+        return np.mean([np.hypot(positions[u][0] - positions[v][0], positions[u][1] - positions[v][1])
+                        for u, v in pairs])
+    assert mean_distance(network.edges) < mean_distance(nx.non_edges(network))
+    assert force_directed_layout(network.nodes, network.edges) == positions  # Seeded
+    assert force_directed_layout(['a'], []) == {'a': (0.0, 0.0)}
+
+
+def test_force_directed_layout_time_budget():
+    network = nx.path_graph(100)
+    initial_pos = [(i, i % 7) for i in network.nodes]
+    # Without time, the initial positions are only rescaled
+    assert force_directed_layout(network.nodes, network.edges, initial_pos=initial_pos, time_budget=-1) == \
+        force_directed_layout(network.nodes, network.edges, iterations=0, initial_pos=initial_pos)
+
+
+def test_concentric_layout_puts_hubs_in_the_center():
+    network = nx.star_graph(20)
+    positions = concentric_layout(network.nodes, network.edges)
+    assert positions[0] == (0.0, 0.0)
+    assert len(set(positions.values())) == len(positions)
+    assert all(np.hypot(*positions[node]) >= NODE_SPACING - 1e-9 for node in range(1, 21))
+
+
+def test_global_layout_uses_precomputed_positions(monkeypatch):
+    interactome_positions = {'a': (0.0, 0.0), 'b': (100.0, 0.0), 'c': (100.0, 100.0)}
+    monkeypatch.setattr(layouts, 'load_global_layout', lambda strain: interactome_positions)
+    nodes, edges = ['a', 'b', 'c', 'metabolite'], [('a', 'b'), ('b', 'c'), ('c', 'metabolite')]
+    positions = global_layout(nodes, edges, 'PAO1', time_budget=-1)  # No relaxation
+    assert set(positions) == set(nodes)
+    # Relative placement is kept, and nodes missing from the global layout are put next to their neighbors
+    assert positions['a'][0] < positions['b'][0] == positions['c'][0]
+    assert positions['b'][1] < positions['c'][1]
+    assert np.hypot(positions['metabolite'][0] - positions['c'][0], positions['metabolite'][1] - positions['c'][1]) < \
+        np.hypot(positions['metabolite'][0] - positions['a'][0], positions['metabolite'][1] - positions['a'][1])
+
+    monkeypatch.setattr(layouts, 'load_global_layout', lambda strain: dict())
+    assert global_layout(nodes, edges, 'PAO1') == concentric_layout(nodes, edges)
+
+
+def test_compute_layout_caches_positions(monkeypatch):
+    monkeypatch.setattr(layouts, 'layout_cache', LayoutCache(cache_dir=None))
+    network = nx.cycle_graph(10)
+    positions = compute_layout(network, engine='concentric')
+    assert positions == concentric_layout(network.nodes, network.edges)
+    monkeypatch.setitem(layouts.LAYOUT_ENGINES, 'concentric', None)  # Not called again
+    assert compute_layout(network, engine='concentric') == positions
+
+
+def test_inherit_positions_keeps_parent_positions():
+    parent_positions = {'a': (0.0, 0.0), 'b': (200.0, 0.0)}
+    nodes, edges = ['a', 'b', 'new'], [('a', 'new'), ('b', 'new')]
+    positions = inherit_positions(nodes, edges, parent_positions)
+    assert positions['a'] == parent_positions['a'] and positions['b'] == parent_positions['b']
+    # The new node is refined between its two neighbors
+    assert 0 < positions['new'][0] < 200
+    assert inherit_positions(['x', 'y'], [('x', 'y')], parent_positions) is None
+
+
+def test_run_layout_engine_stops_slow_and_failing_engines(monkeypatch):
+    monkeypatch.setitem(layouts.LAYOUT_ENGINES, 'slow', slow_layout)
+    monkeypatch.setitem(layouts.LAYOUT_ENGINES, 'failing', failing_layout)
+    network = nx.cycle_graph(10)
+    assert run_layout_engine('concentric', list(network.nodes), list(network.edges)) == \
+        concentric_layout(network.nodes, network.edges)
+    start = time.monotonic()
+    assert run_layout_engine('slow', list(network.nodes), list(network.edges), timeout=0.5) is None
+    assert time.monotonic() - start < 10
+    assert run_layout_engine('failing', list(network.nodes), list(network.edges)) is None
+
+
+def test_compute_layout_falls_back_to_the_fastest_engine(monkeypatch):
+    monkeypatch.setattr(layouts, 'layout_cache', LayoutCache(cache_dir=None))
+    monkeypatch.setitem(layouts.LAYOUT_ENGINES, 'slow', slow_layout)
+    monkeypatch.setitem(layouts.LAYOUT_ENGINES, 'failing', failing_layout)
+    large_network = nx.cycle_graph(layouts.INLINE_LAYOUT_NODES)  # Laid out in a worker process
+    assert compute_layout(large_network, engine='slow', timeout=0.5) == \
+        concentric_layout(large_network.nodes, large_network.edges)
+    small_network = nx.cycle_graph(10)  # Laid out inline
+    assert compute_layout(small_network, engine='failing') == \
+        concentric_layout(small_network.nodes, small_network.edges)
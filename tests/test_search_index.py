@@ -0,0 +1,52 @@
+import pandas as pd
+import pytest
+
+from dash_app.search_index import SearchIndex
+
+
+@pytest.fixture
+def index():
+    network_df = pd.DataFrame({'shortName': ['lasR', 'lasI', 'rhlR', 'PA0004', 'gyrB'],
+                               'description': ['transcriptional regulator LasR', 'autoinducer synthesis protein LasI',
+                                               'transcriptional regulator RhlR', 'hypothetical protein',
+                                               'DNA gyrase subunit B']},
+                              index=['PA1430', 'PA1432', 'PA3477', 'PA0004', 'PA4255'])
+    return SearchIndex(network_df)
+
+
+def values(options):
+    return [option['value'] for option in options]
+
+
+def test_prefix_search(index):
+    assert values(index.search('las')) == ['lasI', 'lasR']
+    assert values(index.search('PA14')) == ['PA1430', 'PA1432']  # Locus tags are searched too
+    assert values(index.search('  LAS ')) == ['lasI', 'lasR']
+    assert index.search('') == [] and index.search(None) == []
+
+
+def test_short_queries_only_match_prefixes(index):
+    assert values(index.search('hl')) == []
+    assert values(index.search('rh')) == ['rhlR']
+
+
+def test_substring_search(index):
+    assert values(index.search('hlr')) == ['rhlR']  # Name trigrams
+    # Prefix matches come first, then descriptions, labelled with the description
+    assert index.search('regulator') == [{'label': 'lasR (transcriptional regulator LasR)', 'value': 'lasR'},
+                                         {'label': 'rhlR (transcriptional regulator RhlR)', 'value': 'rhlR'}]
+    assert values(index.search('gyrase')) == ['gyrB']
+    assert index.search('gyrasez') == []
+
+
+def test_search_limit(index):
+    assert values(index.search('pa', limit=2)) == ['PA0004', 'PA1430']
+
+
+def test_missing_names_are_skipped():
+    network_df = pd.DataFrame({'shortName': [float('nan'), 'lasR'], 'description': [float('nan'), 'regulator']},
+                              index=['PA0001', 'PA1430'])
+    index = SearchIndex(network_df)
+    assert index.options == ['PA0001', 'lasR', 'PA1430']
+    assert values(index.search('pa0')) == ['PA0001']  # Still found by locus tag
+    assert values(index.search('regulator')) == ['lasR']
@@ -0,0 +1,82 @@
+import multiprocessing
+import pickle
+
+import pandas as pd
+import pytest
+
+from dash_app import session_store as session_store_module
+from dash_app.session_store import SessionStore
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'sessions.db')
+
+
+def put_network_key(db_path):
+    SessionStore(db_path=db_path).put('session', network_key='from another process')
+
+
+def test_put_get_delete(db_path):
+    store = SessionStore(db_path=db_path)
+    store.put('session', network_key='abc', value=[1, 2, 3])
+    assert store.get('session', 'network_key') == 'abc'
+    assert store.get('session', 'missing', 'default') == 'default'
+    assert store.get('other session', 'network_key') is None
+    assert store.get('session', 'value') == [1, 2, 3]
+    store.delete('session', 'value')
+    assert store.get('session', 'value') is None
+    assert store.stats()['bytes'] == len(pickle.dumps('abc', pickle.HIGHEST_PROTOCOL))
+
+
+def test_sessions_are_shared_by_server_processes(db_path):
+    store = SessionStore(db_path=db_path)
+    store.put('session', network_key='abc')
+    assert store.get('session', 'network_key') == 'abc'  # Now in the local cache of this process
+    process = multiprocessing.get_context('spawn').Process(target=put_network_key, args=(db_path,))
+    process.start()
+    process.join(30)
+    assert process.exitcode == 0
+    assert store.get('session', 'network_key') == 'from another process'
+    assert SessionStore(db_path=db_path).get('session', 'network_key') == 'from another process'
+
+
+def test_memoize_recomputes_for_new_keys(db_path):
+    store = SessionStore(db_path=db_path)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert store.memoize('session', 'index', 'network 1', compute) == 1
+    assert store.memoize('session', 'index', 'network 1', compute) == 1
+    assert store.lookup('session', 'index', 'network 1') == 1
+    assert store.lookup('session', 'index', 'network 2') is None
+    assert store.memoize('session', 'index', 'network 2', compute) == 2
+
+
+def test_idle_sessions_expire(db_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(session_store_module.time, 'time', lambda: now[0])
+    store = SessionStore(ttl=60, db_path=db_path)
+    store.put('idle', value='a')
+    now[0] += 30
+    store.put('active', value='b')
+    now[0] += 40  # 'idle' was last used 70 s ago, 'active' 40 s ago
+    assert store.get('idle', 'value') is None
+    assert store.get('active', 'value') == 'b'
+    assert store.stats()['sessions'] == 1
+
+
+def test_least_recently_used_sessions_are_evicted(db_path, monkeypatch):
+    monkeypatch.setattr(session_store_module, 'TOUCH_INTERVAL', 0)
+    df = pd.DataFrame({'value': range(1000)})
+    store = SessionStore(max_bytes=int(2.5 * len(pickle.dumps(df, pickle.HIGHEST_PROTOCOL))), db_path=db_path)
+    store.put('first', df=df)
+    store.put('second', df=df)
+    store.get('first', 'df')  # 'second' is now the least recently used session
+    store.put('third', df=df)
+    assert store.get('second', 'df') is None
+    assert store.get('first', 'df') is not None and store.get('third', 'df') is not None
+    assert store.stats()['bytes'] <= store.max_bytes